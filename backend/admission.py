@@ -0,0 +1,215 @@
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# --- Adaptive Admission Control ---
+# Caps how many upstream LLM requests a worker has in flight and queues the
+# rest by priority, so a burst of bulk uploads cannot starve chat or trip the
+# provider's rate limit for everyone. The cap adapts AIMD-style: it grows by
+# about one slot per window of successful calls while it is actually in use,
+# shrinks multiplicatively on a 429 (and admissions pause for Retry-After), and
+# shrinks gently when latency exceeds the target. Callers that wait longer
+# than the queue timeout, or arrive at a full queue, are rejected.
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Priority of LLM calls made on behalf of the current request (each request runs in its own context)
+current_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Runs the enclosed calls (and tasks started inside it) at the given priority."""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call could not be admitted; retry_after is a hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class Permit:
+    """Handed to the holder of a slot to report how the upstream call went."""
+
+    __slots__ = ("started", "latency", "throttled", "retry_after", "failed")
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latency: Optional[float] = None
+        self.throttled = False
+        self.retry_after: Optional[float] = None
+        self.failed = False
+
+    def mark_latency(self):
+        """Fixes the observed latency now (e.g. at the first byte of a streamed response)."""
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started
+
+    def throttle(self, retry_after: Optional[float] = None):
+        """Reports a 429 from the upstream."""
+        self.throttled = True
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Priority-queued, AIMD-adjusted limit on concurrent upstream calls within one event loop."""
+
+    def __init__(self, initial_limit: int = 16, min_limit: int = 1, max_limit: int = 64,
+                 latency_target: float = 10.0, backoff: float = 0.5,
+                 max_queue: int = 1000, queue_timeout: float = 30.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: List[list] = []  # heap of [priority, seq, future]
+        self._queued = 0
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._wake_handle: Optional[asyncio.TimerHandle] = None
+        self.admitted: Dict[int, int] = {}
+        self.rejected = 0
+        self.timeouts = 0
+        self.throttled = 0
+        self.slow = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _can_admit(self) -> bool:
+        return self.in_flight < max(int(self.limit), self.min_limit) and time.monotonic() >= self._paused_until
+
+    def _record_admission(self, priority: int, waited: float):
+        self.admitted[priority] = self.admitted.get(priority, 0) + 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    def _dispatch(self):
+        while self._waiters and self._can_admit():
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # timed out or cancelled while queued
+            self._queued -= 1
+            self.in_flight += 1
+            future.set_result(None)
+        if self._waiters and time.monotonic() < self._paused_until and self._wake_handle is None:
+            loop = asyncio.get_running_loop()
+            self._wake_handle = loop.call_later(self._paused_until - time.monotonic(), self._wake)
+
+    def _wake(self):
+        self._wake_handle = None
+        self._dispatch()
+
+    async def acquire(self, priority: Optional[int] = None):
+        """Waits for a slot; higher priority (lower number) first, FIFO within a priority."""
+        priority = current_priority.get() if priority is None else priority
+        started = time.monotonic()
+        if not self._queued and self._can_admit():
+            self.in_flight += 1
+            self._record_admission(priority, 0.0)
+            return
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("LLM request queue is full", self._retry_hint())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._seq), future])
+        self._queued += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # A slot was handed over just as the wait ended; pass it on
+                self.in_flight -= 1
+                self._dispatch()
+            else:
+                future.cancel()
+                self._queued -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                self.rejected += 1
+                raise AdmissionRejected("Timed out waiting for an LLM slot", self._retry_hint())
+            raise
+        # _dispatch has already counted the slot as in flight
+        self._record_admission(priority, time.monotonic() - started)
+
+    def release(self, permit: Permit):
+        """Frees a slot and adapts the limit from the call's outcome."""
+        self.in_flight -= 1
+        now = time.monotonic()
+        latency = permit.latency if permit.latency is not None else now - permit.started
+        if permit.throttled:
+            self.throttled += 1
+            if permit.retry_after:
+                self._paused_until = max(self._paused_until, now + permit.retry_after)
+            # One multiplicative decrease per burst of 429s, not one per rejected call
+            if now - self._last_decrease > 1.0:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_decrease = now
+        elif permit.failed:
+            pass
+        elif self.latency_target and latency > self.latency_target:
+            self.slow += 1
+            if now - self._last_decrease > 1.0:
+                self.limit = max(float(self.min_limit), self.limit * 0.9)
+                self._last_decrease = now
+        elif self.in_flight + 1 >= self.limit / 2:
+            # Only grow while the current limit is actually being used
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None):
+        """async with controller.slot() as permit: ... (releases and adapts on exit)."""
+        await self.acquire(priority)
+        permit = Permit()
+        try:
+            yield permit
+        except BaseException:
+            permit.failed = True
+            raise
+        finally:
+            self.release(permit)
+
+    @property
+    def paused(self) -> bool:
+        """True while admissions are held back after a 429."""
+        return time.monotonic() < self._paused_until
+
+    def _retry_hint(self) -> float:
+        paused = self._paused_until - time.monotonic()
+        return max(1.0, paused)
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = sum(self.admitted.values())
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self._queued,
+            "admitted": admitted,
+            "admitted_interactive": self.admitted.get(PRIORITY_INTERACTIVE, 0),
+            "admitted_bulk": self.admitted.get(PRIORITY_BULK, 0),
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "throttled": self.throttled,
+            "slow": self.slow,
+            "avg_wait_ms": round(self.wait_total / admitted * 1000, 2) if admitted else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 2),
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+        }
@@ -1,16 +1,23 @@
 import os
 import httpx
+import asyncio
 import random
 import re
 import io
 import json
 import hashlib
+import time
 from fastapi import HTTPException
-from datetime import datetime 
-from typing import Optional, List, Dict, Any, Tuple
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple, Union, AsyncIterator, Set
 
 # Import centralized configuration
 from config import config
+from singleflight import SingleFlight
+from cache_store import CacheStore, MemoryLRU
+from chat_history import ChatHistory
+from admission import AdmissionController, AdmissionRejected
+from llm_router import LLMBackend, LLMRouter
 
 # Import Pydantic BaseModel and Field from pydantic library
 from pydantic import BaseModel, Field
@@ -34,12 +41,6 @@ except ImportError:
     Document = None
     print("WARNING: python-docx library not found. Word document generation will be disabled.")
     
-try:
-    from PyPDF2 import PdfReader
-except ImportError:
-    PdfReader = None
-    print("WARNING: PyPDF2 library not found. PDF text extraction will be disabled.")
-
 try:
     from unidecode import unidecode
 except ImportError:
@@ -47,41 +48,8 @@ except ImportError:
         return text.encode('ascii', 'ignore').decode('ascii')
     print("WARNING: unidecode library not found. Using basic ASCII fallback.")
 
-async def extract_text_from_bytes(content: bytes, content_type: str) -> str:
-    """Extracts text from file bytes based on content type."""
-    extracted_text = ""
-    if content_type == "text/plain":
-        extracted_text = content.decode('utf-8', errors='ignore')
-    elif content_type == "application/pdf":
-        if PdfReader is None:
-             raise ValueError("PyPDF2 not installed")
-        try:
-            with io.BytesIO(content) as pdf_file:
-                reader = PdfReader(pdf_file)
-                for page in reader.pages:
-                    text = page.extract_text()
-                    if text:
-                        extracted_text += text + "\n"
-        except Exception as pdf_err:
-             print(f"PDF Extraction Error: {pdf_err}")
-             raise ValueError("Failed to extract text from PDF")
-    elif content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-        if Document is None:
-             raise ValueError("python-docx not installed")
-        try:
-            with io.BytesIO(content) as docx_file:
-                doc = Document(docx_file)
-                for para in doc.paragraphs:
-                    extracted_text += para.text + "\n"
-        except Exception as docx_err:
-            print(f"DOCX Extraction Error: {docx_err}")
-            raise ValueError("Failed to extract text from DOCX")
-    else:
-         # Fallback for other text types or error
-         pass
-         
-    return extracted_text
-
+# Extraction and normalization are shared with the corpus ingestion tool
+from text_processing import extract_text, normalize_text, split_sentences, NormalizedDocument
 
 # --- Internal Groq API Pydantic Models (only used within this module) ---
 # These are kept here as they define the specific structure for Groq's API requests
@@ -98,73 +66,249 @@ class GroqRequest(BaseModel):
 
 # --- Core AI Integration and Fallback Functions ---
 
+# Legacy one-file-per-entry cache directory, imported into AI_CACHE on startup
 AI_CACHE_DIR = "ai_cache"
-os.makedirs(AI_CACHE_DIR, exist_ok=True)
+AI_CACHE = CacheStore(config.AI_CACHE_DB_FILE, "ai_cache", max_bytes=config.AI_CACHE_MAX_BYTES, ttl=config.AI_CACHE_TTL)
+# Hot entries of the AI, plagiarism and upload caches, written through to the persistent tiers
+MEMORY_CACHE = MemoryLRU(config.MEMORY_CACHE_MAX_ENTRIES, config.MEMORY_CACHE_MAX_BYTES)
 
-def get_ai_cache(text: str, prefix: str) -> Optional[str]:
-    text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
-    cache_path = os.path.join(AI_CACHE_DIR, f"{prefix}_{text_hash}.json")
-    if os.path.exists(cache_path):
-        try:
-            with open(cache_path, "r", encoding="utf-8") as f:
-                return json.load(f).get("response")
-        except:
-            return None
-    return None
+def ai_cache_key(text: str, prefix: str) -> str:
+    return f"{prefix}_{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+async def get_ai_cache(text: str, prefix: str) -> Optional[str]:
+    key = ai_cache_key(text, prefix)
+    cached = MEMORY_CACHE.get(f"ai:{key}")
+    if cached is not None:
+        return cached
+    try:
+        cached = await AI_CACHE.aget(key)
+    except Exception as e:
+        print(f"Failed to read AI cache: {e}")
+        return None
+    if cached is not None:
+        MEMORY_CACHE.set(f"ai:{key}", cached, len(cached))
+    return cached
 
-def set_ai_cache(text: str, prefix: str, response: str):
-    text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
-    cache_path = os.path.join(AI_CACHE_DIR, f"{prefix}_{text_hash}.json")
+async def set_ai_cache(text: str, prefix: str, response: str):
+    key = ai_cache_key(text, prefix)
+    MEMORY_CACHE.set(f"ai:{key}", response, len(response))
     try:
-        with open(cache_path, "w", encoding="utf-8") as f:
-            json.dump({"response": response, "timestamp": datetime.now().isoformat()}, f)
+        await AI_CACHE.aset(key, response)
     except Exception as e:
         print(f"Failed to cache AI response: {e}")
 
-async def call_ai_model(system_prompt: str, user_prompt: str, temperature: float = 0.7, max_tokens: int = 2000, response_format: dict = None) -> str:
-    ai_mode = os.environ.get("MODE", "cloud").lower()
-    
-    if ai_mode == "local":
-        local_url = "http://localhost:11434/api/chat"
-        payload = {
-            "model": "llama3",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            "stream": False,
-            "options": {"temperature": temperature, "num_predict": max_tokens}
-        }
-        if response_format:
-            payload["format"] = "json"
-            
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(local_url, json=payload, timeout=60.0)
-            resp.raise_for_status()
-            return resp.json()["message"]["content"]
-    else:
-        groq_request_body = {
-            "model": config.GROQ_MODEL,
-            "messages": [
-                {"role": "system", "content": system_prompt}, 
-                {"role": "user", "content": user_prompt}
-            ],
-            "max_tokens": max_tokens,
-            "temperature": temperature
-        }
-        if response_format:
-            groq_request_body["response_format"] = response_format
-            
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                config.GROQ_API_URL, 
-                headers={"Authorization": f"Bearer {config.GROQ_API_KEY}", "Content-Type": "application/json"}, 
-                json=groq_request_body, 
-                timeout=config.GROQ_API_TIMEOUT
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data["choices"][0]["message"]["content"]
+def migrate_legacy_ai_cache(batch_size: int = 500) -> int:
+    """
+    Imports unexpired ai_cache/*.json entries into the store (keys are the file
+    names) once; a marker file stops later startups from rescanning the directory.
+    Returns the number of entries imported.
+    """
+    marker = os.path.join(AI_CACHE_DIR, ".imported")
+    if not os.path.isdir(AI_CACHE_DIR) or os.path.exists(marker):
+        return 0
+    oldest = datetime.now().timestamp() - config.AI_CACHE_TTL if config.AI_CACHE_TTL else 0
+    imported, batch = 0, []
+    with os.scandir(AI_CACHE_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json"):
+                continue
+            key = entry.name[:-len(".json")]
+            if entry.stat().st_mtime < oldest or AI_CACHE.contains(key):
+                continue
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                created = datetime.fromisoformat(data["timestamp"]).timestamp() if data.get("timestamp") else None
+                batch.append((key, data["response"], created))
+            except Exception as e:
+                print(f"WARNING: Skipping legacy cache file {entry.name}: {e}")
+                continue
+            if len(batch) >= batch_size:
+                AI_CACHE.set_many(batch)
+                imported, batch = imported + len(batch), []
+    if batch:
+        AI_CACHE.set_many(batch)
+        imported += len(batch)
+    if imported:
+        print(f"Imported {imported} legacy AI cache entries from {AI_CACHE_DIR}/.")
+    try:
+        with open(marker, "w") as f:
+            f.write(datetime.now().isoformat())
+    except OSError as e:
+        print(f"WARNING: Could not mark legacy AI cache as imported: {e}")
+    return imported
+
+# Identical LLM calls already in flight are awaited rather than repeated (keyed like the AI cache)
+LLM_SINGLE_FLIGHT = SingleFlight()
+
+async def call_ai_model_cached(text: str, prefix: str, system_prompt: str, user_prompt: str, **kwargs) -> str:
+    """call_ai_model behind the AI cache; concurrent misses for the same key share one call."""
+    cached = await get_ai_cache(text, prefix)
+    if cached:
+        return cached
+
+    async def fetch() -> str:
+        response = await call_ai_model(system_prompt, user_prompt, **kwargs)
+        await set_ai_cache(text, prefix, response)
+        return response
+
+    return await LLM_SINGLE_FLIGHT.do(ai_cache_key(text, prefix), fetch)
+
+# --- Shared LLM HTTP Client ---
+# Created once per worker by the FastAPI lifespan hook (see main.py) so every
+# Groq and Ollama call reuses pooled keep-alive connections instead of paying a
+# TCP + TLS handshake per request. Each upstream host gets its own pool, capped
+# at LLM_MAX_CONNECTIONS_PER_HOST.
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+    print("WARNING: h2 library not found. LLM calls will use HTTP/1.1 keep-alive only.")
+
+_llm_client: Optional[httpx.AsyncClient] = None
+
+def create_llm_client() -> httpx.AsyncClient:
+    http2 = config.LLM_HTTP2 and HTTP2_AVAILABLE
+    per_host = httpx.Limits(
+        max_connections=min(config.LLM_MAX_CONNECTIONS, config.LLM_MAX_CONNECTIONS_PER_HOST),
+        max_keepalive_connections=config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY
+    )
+    mounts = {}
+    for url in {backend.url for backend in LLM_ROUTER.backends} | {config.GROQ_API_URL, config.OLLAMA_API_URL}:
+        origin = httpx.URL(url)
+        mounts[f"{origin.scheme}://{origin.netloc.decode()}"] = httpx.AsyncHTTPTransport(
+            limits=per_host, http2=http2 and origin.scheme == "https"
+        )
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY
+        ),
+        mounts=mounts,
+        timeout=config.GROQ_API_TIMEOUT
+    )
+
+def get_llm_client() -> httpx.AsyncClient:
+    """The process-wide LLM client; created on first use outside the app lifespan (scripts, shells)."""
+    global _llm_client
+    if _llm_client is None or _llm_client.is_closed:
+        _llm_client = create_llm_client()
+    return _llm_client
+
+async def start_llm_client():
+    get_llm_client()
+
+async def close_llm_client():
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.aclose()
+        _llm_client = None
+
+# --- LLM Backends ---
+# Every Groq/Ollama call goes through LLM_ROUTER (see llm_router.py), which picks
+# the fastest healthy backend and fails over between them. Each backend has its
+# own admission controller (see admission.py): interactive requests are admitted
+# ahead of bulk work when that upstream is saturated.
+def llm_backend_specs() -> List[Dict[str, Any]]:
+    """LLM_BACKENDS (a JSON list) if set, else the single backend selected by MODE."""
+    if config.LLM_BACKENDS:
+        return json.loads(config.LLM_BACKENDS)
+    if os.environ.get("MODE", "cloud").lower() == "local":
+        return [{"name": "ollama", "kind": "ollama", "url": config.OLLAMA_API_URL, "model": "llama3"}]
+    return [{"name": "groq", "kind": "groq", "url": config.GROQ_API_URL, "model": config.GROQ_MODEL}]
+
+def build_llm_router() -> LLMRouter:
+    backends = []
+    for spec in llm_backend_specs():
+        kind = spec.get("kind", "groq")
+        backends.append(LLMBackend(
+            name=spec.get("name") or f"{kind}:{spec.get('model')}",
+            kind=kind,
+            url=spec.get("url") or (config.OLLAMA_API_URL if kind == "ollama" else config.GROQ_API_URL),
+            model=spec.get("model") or ("llama3" if kind == "ollama" else config.GROQ_MODEL),
+            api_key=spec.get("api_key", config.GROQ_API_KEY if kind == "groq" else ""),
+            timeout=float(spec.get("timeout", 60.0 if kind == "ollama" else config.GROQ_API_TIMEOUT)),
+            admission=AdmissionController(
+                initial_limit=config.LLM_CONCURRENCY_INITIAL,
+                min_limit=config.LLM_CONCURRENCY_MIN,
+                max_limit=config.LLM_CONCURRENCY_MAX,
+                latency_target=config.LLM_LATENCY_TARGET,
+                max_queue=config.LLM_QUEUE_MAX,
+                queue_timeout=config.LLM_QUEUE_TIMEOUT
+            ),
+            window=config.LLM_ROUTER_WINDOW,
+            cooldown=config.LLM_ROUTER_COOLDOWN,
+            failure_threshold=config.LLM_ROUTER_FAILURE_THRESHOLD,
+            max_error_rate=config.LLM_ROUTER_MAX_ERROR_RATE
+        ))
+    return LLMRouter(
+        backends,
+        client_factory=get_llm_client,
+        max_retries=config.LLM_MAX_RETRIES,
+        hedge_min_delay=config.LLM_HEDGE_MIN_DELAY,
+        hedge_max_delay=config.LLM_HEDGE_MAX_DELAY,
+        retry_after_default=config.LLM_RETRY_AFTER_DEFAULT,
+        retry_after_max=config.LLM_RETRY_AFTER_MAX
+    )
+
+LLM_ROUTER = build_llm_router()
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    """The HTTP error for a call that could not be admitted (busy, not broken)."""
+    return HTTPException(
+        status_code=503,
+        detail="The AI service is busy. Please retry shortly.",
+        headers={"Retry-After": str(int(e.retry_after + 0.999))}
+    )
+
+async def call_ai_model(system_prompt: str, user_prompt: str, temperature: float = 0.7, max_tokens: int = 2000,
+                        response_format: dict = None, hedge: bool = False) -> str:
+    """One completion from the fastest healthy backend; hedge=True races a second backend on slow answers."""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    return await complete_chat(messages, temperature=temperature, max_tokens=max_tokens, response_format=response_format, hedge=hedge)
+
+async def complete_chat(messages: List[Dict[str, str]], hedge: bool = False, **kwargs) -> str:
+    try:
+        return await LLM_ROUTER.complete(messages, hedge=hedge and config.LLM_HEDGE, **kwargs)
+    except AdmissionRejected as e:
+        raise admission_error(e)
+
+async def stream_ai_model(system_prompt: str, user_prompt: str, temperature: float = 0.7, max_tokens: int = 2000, hedge: bool = False) -> AsyncIterator[str]:
+    """Like call_ai_model, but yields the completion in pieces as the upstream generates them."""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    async for delta in stream_chat_completion(messages, temperature=temperature, max_tokens=max_tokens, hedge=hedge):
+        yield delta
+
+async def stream_chat_completion(messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 2000, hedge: bool = False) -> AsyncIterator[str]:
+    """Streams a completion for a full message list (system, history, user) from the best backend."""
+    try:
+        async for delta in LLM_ROUTER.stream(messages, temperature=temperature, max_tokens=max_tokens, hedge=hedge and config.LLM_HEDGE):
+            yield delta
+    except AdmissionRejected as e:
+        raise admission_error(e)
+
+async def stream_ai_model_cached(text: str, prefix: str, system_prompt: str, user_prompt: str, **kwargs) -> AsyncIterator[str]:
+    """stream_ai_model behind the AI cache: a hit is yielded whole, a completed stream is stored."""
+    cached = await get_ai_cache(text, prefix)
+    if cached:
+        yield cached
+        return
+
+    parts = []
+    async for delta in stream_ai_model(system_prompt, user_prompt, **kwargs):
+        parts.append(delta)
+        yield delta
+    await set_ai_cache(text, prefix, "".join(parts))
 
 async def analyze_with_groq_api(text: str, analysis_type: str, language: str = "en", cross_language: bool = False, content_type: str = "other") -> Dict[str, Any]:
     """
@@ -188,23 +332,22 @@ async def analyze_with_groq_api(text: str, analysis_type: str, language: str = "
         system_prompt = "You are an advanced AI Content Detector specialized in distinguishing human writing from machine-generated text. Analyze the text for: lack of personal anecdotes, repetitive sentence structures, overly formal or robotic tone, perfect grammar without stylistic flair, and high perplexity/burstiness indicators suitable for LLMs. Be STRICT. Detect if the text was generated by AI models like GPT-4, Claude, or Llama. Provide a confidence score (0-100%) and extract specific sentences that strongly exhibit AI traits. Format response: 'Confidence: X%'. Then 'AI Sentences:'. Then list each flagged sentence starting with a dash '- '."
         user_prompt = f"Detect if the following text was generated by AI: '{text}'"
 
-    cached_result = get_ai_cache(text, f"analyze_{analysis_type}_{language}_{content_type}")
-    if cached_result:
-        raw_analysis = cached_result
-    else:
-        try:
-            raw_analysis = await call_ai_model(
-                system_prompt, user_prompt, 
-                temperature=0.3 if analysis_type == "plagiarism" else 0.7, 
-                max_tokens=1000
-            )
-            set_ai_cache(text, f"analyze_{analysis_type}_{language}_{content_type}", raw_analysis)
-        except httpx.HTTPStatusError as http_error:
-            print(f"HTTP Error from AI API: {http_error}")
-            raise Exception(f"AI API HTTP Error: {http_error}")
-        except Exception as e:
-            print(f"Generic Error during AI API call: {e}")
-            raise Exception(f"AI API processing error: {e}")
+    try:
+        raw_analysis = await call_ai_model_cached(
+            text, f"analyze_{analysis_type}_{language}_{content_type}",
+            system_prompt, user_prompt, 
+            temperature=0.3 if analysis_type == "plagiarism" else 0.7, 
+            max_tokens=1000
+        )
+    except HTTPException:
+        # Admission rejections keep their 503 + Retry-After
+        raise
+    except httpx.HTTPStatusError as http_error:
+        print(f"HTTP Error from AI API: {http_error}")
+        raise Exception(f"AI API HTTP Error: {http_error}")
+    except Exception as e:
+        print(f"Generic Error during AI API call: {e}")
+        raise Exception(f"AI API processing error: {e}")
 
     if analysis_type == "plagiarism":
         score_match = re.search(r'(\d+)%', raw_analysis)
@@ -245,8 +388,60 @@ async def humanize_with_groq_api(text: str, style: str, complexity: str, target_
         humanized_text, changes = apply_humanization_rules(text, style, complexity)
         return {"humanized_text": humanized_text, "changes": changes}
 
-    model_name = config.GROQ_MODEL
+    system_prompt, user_prompt = humanize_prompts(text, style, complexity, target_language, content_type)
+
+    try:
+        raw_output = await call_ai_model_cached(
+            text, f"humanize_{style}_{complexity}_{target_language}_{content_type}",
+            system_prompt, user_prompt, 
+            temperature=0.7, 
+            max_tokens=2000
+        )
+    except Exception as e:
+        print(f"AI api error during humanization: {e}")
+        humanized_text, changes = apply_humanization_rules(text, style, complexity)
+        return {"humanized_text": humanized_text, "changes": changes}
+
+    humanized_text = clean_humanized_text(raw_output)
+    return {"humanized_text": humanized_text, "changes": humanize_changes(target_language)}
+
+
+async def stream_humanize_with_groq_api(text: str, style: str, complexity: str, target_language: str = "English", content_type: str = "article") -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming humanize_with_groq_api: yields {"delta": text} events with the cleaned
+    output as the model generates it, then one {"humanized_text", "changes"} event
+    identical to what the non-streaming call returns.
+    """
+    prefix = f"humanize_{style}_{complexity}_{target_language}_{content_type}"
+    if config.GROQ_API_KEY:
+        system_prompt, user_prompt = humanize_prompts(text, style, complexity, target_language, content_type)
+        cleaner = HumanizedTextCleaner()
+        emitted = False
+        try:
+            async for delta in stream_ai_model_cached(text, prefix, system_prompt, user_prompt, temperature=0.7, max_tokens=2000, hedge=True):
+                cleaned = cleaner.feed(delta)
+                if cleaned:
+                    emitted = True
+                    yield {"delta": cleaned}
+            cleaned = cleaner.finish()
+            if cleaned:
+                yield {"delta": cleaned}
+            yield {"humanized_text": cleaner.text, "changes": humanize_changes(target_language)}
+            return
+        except Exception as e:
+            # Text already sent cannot be replaced by the local fallback
+            if emitted:
+                raise
+            print(f"AI api error during humanization: {e}")
+    else:
+        print("WARNING: Groq API key not configured for Humanization. Using local fallbacks.")
+
+    humanized_text, changes = apply_humanization_rules(text, style, complexity)
+    yield {"delta": humanized_text}
+    yield {"humanized_text": humanized_text, "changes": changes}
+
 
+def humanize_prompts(text: str, style: str, complexity: str, target_language: str, content_type: str) -> Tuple[str, str]:
     system_prompt = (
         f"You are an expert content writer and translator specializing in humanizing AI-generated text. "
         f"Your goal is to transform robotic AI text into natural, engaging, and human-like writing in {target_language}. "
@@ -259,60 +454,164 @@ async def humanize_with_groq_api(text: str, style: str, complexity: str, target_
         f"Writing style: {style}, Complexity level: {complexity}. "
         f"Original text: '{text}'"
     )
+    return system_prompt, user_prompt
 
-    cached_result = get_ai_cache(text, f"humanize_{style}_{complexity}_{target_language}_{content_type}")
-    if cached_result:
-        raw_output = cached_result
-    else:
-        try:
-            raw_output = await call_ai_model(
-                system_prompt, user_prompt, 
-                temperature=0.7, 
-                max_tokens=2000
-            )
-            set_ai_cache(text, f"humanize_{style}_{complexity}_{target_language}_{content_type}", raw_output)
-        except Exception as e:
-            print(f"AI api error during humanization: {e}")
-            humanized_text, changes = apply_humanization_rules(text, style, complexity)
-            return {"humanized_text": humanized_text, "changes": changes}
 
-    humanized_text = raw_output
-    humanized_text = re.sub(r'^[\'"]|[\'"]$', '', humanized_text).strip()
-    
+def humanize_changes(target_language: str) -> List[str]:
+    return [f"Translated to {target_language}", "Enhanced natural flow", "Improved readability"]
+
+
+def _strip_markdown_artifacts(text: str) -> str:
     # Aggressive cleanup of AI/Markdown artifacts
     # Remove bold/italic markers (*, _)
-    humanized_text = re.sub(r'\*+', '', humanized_text) 
-    humanized_text = re.sub(r'_+', '', humanized_text)
+    text = re.sub(r'\*+', '', text)
+    text = re.sub(r'_+', '', text)
     
     # Remove code blocks/backticks
-    humanized_text = re.sub(r'`+', '', humanized_text)
+    text = re.sub(r'`+', '', text)
     
     # Remove blockquote '>' if at start of line
-    humanized_text = re.sub(r'^>\s?', '', humanized_text, flags=re.MULTILINE)
+    text = re.sub(r'^>\s?', '', text, flags=re.MULTILINE)
     
     # Remove links [text](url) -> text
-    humanized_text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', humanized_text)
+    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
     
     # Note: We PRESERVE '#' characters because they are used by the download 
     # function to identify headings (H1, H2, H3) and apply proper font styles.
-    
-    return {"humanized_text": humanized_text, "changes": [f"Translated to {target_language}", "Enhanced natural flow", "Improved readability"]}
+    return text
+
+
+def clean_humanized_text(raw_output: str) -> str:
+    """Strips wrapping quotes, surrounding whitespace and Markdown artifacts from model output."""
+    humanized_text = re.sub(r'^[\'"]|[\'"]$', '', raw_output).strip()
+    return _strip_markdown_artifacts(humanized_text)
+
+
+# A '[' whose link pattern could still be completed by text that has not arrived yet
+_OPEN_LINK_RE = re.compile(r'\[(?:[^\]]*|[^\]]+\](?:\([^\)]*)?)\Z')
+
+
+class HumanizedTextCleaner:
+    """
+    Incremental clean_humanized_text for streamed output. Raw text is released up
+    to a whitespace boundary once no cleanup rule can reach across it: at least two
+    non-space characters must follow (so the final quote removal and strip cannot
+    touch it) and no Markdown link may still be open. The concatenated output
+    always equals clean_humanized_text() of the whole raw text.
+    """
+
+    __slots__ = ("_pending", "_at_start", "_started", "_line_start", "_parts")
+
+    def __init__(self):
+        self._pending = ""
+        self._at_start = True      # nothing consumed yet (leading quote still possible)
+        self._started = False      # some non-space text released (leading strip done)
+        self._line_start = True    # released text ends with a newline
+        self._parts: List[str] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def _clean(self, raw: str) -> str:
+        if self._at_start:
+            raw = re.sub(r'^[\'"]', '', raw)
+            self._at_start = False
+        if not self._started:
+            raw = raw.lstrip()
+            self._started = bool(raw)
+            line_start = True
+        else:
+            line_start = self._line_start
+        if line_start:
+            return _strip_markdown_artifacts(raw)
+        # A placeholder keeps a mid-line piece from being treated as a line start ('^>')
+        return _strip_markdown_artifacts("\0" + raw)[1:]
+
+    def _release(self, raw: str, cleaned: str) -> str:
+        if raw:
+            self._line_start = raw[-1] == "\n"
+        self._parts.append(cleaned)
+        return cleaned
+
+    def feed(self, delta: str) -> str:
+        """Adds raw model output; returns the newly releasable cleaned text (possibly empty)."""
+        self._pending += delta
+        pending = self._pending
+        # Cut after the last whitespace that still has two non-space characters behind it
+        i, seen = len(pending) - 1, 0
+        while i >= 0:
+            if not pending[i].isspace():
+                seen += 1
+                if seen == 2:
+                    break
+            i -= 1
+        while i > 0 and not pending[i - 1].isspace():
+            i -= 1
+        if i <= 0:
+            return ""
+        raw = pending[:i]
+        state = (self._at_start, self._started)
+        cleaned = self._clean(raw)
+        if _OPEN_LINK_RE.search(cleaned):
+            self._at_start, self._started = state
+            return ""
+        self._pending = pending[i:]
+        return self._release(raw, cleaned)
+
+    def finish(self) -> str:
+        """Releases the held-back tail once the stream has ended."""
+        raw = re.sub(r'[\'"]$', '', self._pending)
+        if self._at_start:
+            raw = re.sub(r'^[\'"]', '', raw)
+            self._at_start = False
+        raw = raw.rstrip()
+        self._pending = ""
+        return self._release(raw, self._clean(raw))
 
 
+CHAT_SYSTEM_PROMPT = "You are an AI assistant specialized in plagiarism checking and content humanization for PlagiarismPro. Answer user questions concisely and helpfully. Maintain a professional and helpful tone. Do not provide information outside your domain."
+
 async def chat_with_groq_api(user_message: str) -> str:
     """Communicates with Groq AI for chatbot responses."""
     if not config.GROQ_API_KEY:
         print("WARNING: Groq API key not configured for Chat. Using local fallback.")
         return get_local_chat_response_fallback(user_message)
 
-    system_prompt = "You are an AI assistant specialized in plagiarism checking and content humanization for PlagiarismPro. Answer user questions concisely and helpfully. Maintain a professional and helpful tone. Do not provide information outside your domain."
     try:
-        reply = await call_ai_model(system_prompt, user_message, max_tokens=500, temperature=0.8)
+        reply = await call_ai_model(CHAT_SYSTEM_PROMPT, user_message, max_tokens=500, temperature=0.8, hedge=True)
         return reply.strip()
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Generic Error during chat API call: {e}")
         raise Exception(f"Chat API processing error: {e}")
 
+async def stream_chat_with_groq_api(user_message: str, history: ChatHistory) -> AsyncIterator[str]:
+    """
+    Multi-turn, streaming chat_with_groq_api: the history window is sent as context,
+    reply pieces are yielded as they arrive, and the completed turn is added to history.
+    """
+    if not config.GROQ_API_KEY:
+        print("WARNING: Groq API key not configured for Chat. Using local fallback.")
+        reply = get_local_chat_response_fallback(user_message)
+        history.add_turn(user_message, reply)
+        yield reply
+        return
+
+    messages = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}, *history.messages(), {"role": "user", "content": user_message}]
+    parts = []
+    try:
+        async for delta in stream_chat_completion(messages, max_tokens=500, temperature=0.8, hedge=True):
+            parts.append(delta)
+            yield delta
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Generic Error during chat API call: {e}")
+        raise Exception(f"Chat API processing error: {e}")
+    history.add_turn(user_message, "".join(parts).strip())
+
 def moderate_message(message: str) -> Dict[str, Any]:
     """Checks if a message contains any sensitive keywords."""
     message_lower = message.lower()
@@ -517,22 +816,17 @@ import string
 import math
 from collections import Counter
 import hashlib
+from corpus_index import CorpusIndexBuilder, ReloadableCorpusIndex
+from fingerprint import fingerprint, split_by_position
 
-# Step 1: Input Normalization
-def normalize_text(text: str) -> str:
-    text = text.lower()
-    text = unidecode(text)
-    text = text.translate(str.maketrans("", "", string.punctuation))
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+# Step 1: Input Normalization (normalize_text lives in text_processing.py)
 
 # Step 2: Local Similarity Heuristics
-def get_ngrams(text: str, n: int) -> list:
-    words = text.split()
-    return [" ".join(words[i:i+n]) for i in range(len(words)-n+1)]
-
-def jaccard_similarity(text1: str, text2: str, n: int = 3) -> float:
-    set1, set2 = set(get_ngrams(text1, n)), set(get_ngrams(text2, n))
+def jaccard_similarity(text1, text2, n: int = 3) -> float:
+    """Jaccard over winnowed n-gram fingerprints; accepts normalized texts or precomputed fingerprints."""
+    if isinstance(text1, str): text1 = fingerprint(text1.split(), n)[0]
+    if isinstance(text2, str): text2 = fingerprint(text2.split(), n)[0]
+    set1, set2 = set(text1), set(text2)
     if not set1 or not set2: return 0.0
     return len(set1.intersection(set2)) / len(set1.union(set2))
 
@@ -553,66 +847,391 @@ MOCK_CORPUS = [
     "global warming and climate change significantly affect weather patterns worldwide"
 ]
 
-def calculate_local_similarity(normalized_text: str) -> float:
+def build_mock_index_builder() -> CorpusIndexBuilder:
+    builder = CorpusIndexBuilder(bands=config.MINHASH_BANDS, rows=config.MINHASH_ROWS)
+    for i, doc in enumerate(MOCK_CORPUS):
+        builder.add_document(normalize_text(doc), {"source_id": f"mock-{i}"})
+    return builder
+
+# Shared read-only mapping; swapped in place when the file is replaced (see main.py for SIGHUP).
+# Nothing is read or written at import: the API maps it in its lifespan hook, other
+# importers on first use (falling back to MOCK_CORPUS in memory if there is no file)
+REFERENCE_INDEX = ReloadableCorpusIndex(
+    config.CORPUS_INDEX_FILE,
+    fallback=lambda: build_mock_index_builder().build(),
+    check_interval=config.CORPUS_INDEX_RELOAD_INTERVAL
+)
+
+def load_reference_index():
+    """Maps the on-disk reference index, seeding it from MOCK_CORPUS if none exists yet."""
+    if not os.path.exists(config.CORPUS_INDEX_FILE):
+        try:
+            build_mock_index_builder().save(config.CORPUS_INDEX_FILE)
+        except Exception as e:
+            print(f"WARNING: Failed to persist corpus index: {e}")
+    REFERENCE_INDEX.reload()
+
+def calculate_local_similarity(document: Union[str, NormalizedDocument]) -> float:
+    if isinstance(document, str):
+        document = NormalizedDocument.from_text(document)
     max_sim = 0.0
-    for doc in MOCK_CORPUS:
-        norm_doc = normalize_text(doc)
-        j_sim = jaccard_similarity(normalized_text, norm_doc, n=3)
-        c_sim = tf_idf_cosine_similarity(normalized_text, norm_doc)
-        max_sim = max(max_sim, j_sim, c_sim)
+    index = REFERENCE_INDEX.current()
+    query_hashes = document.ngram_hashes(index.n)
+    # Near-duplicate tier: LSH buckets give a handful of candidates in sub-linear time.
+    # Only when none collide do we fall back to the shingle posting lists for partial overlap.
+    candidates = index.near_duplicates(query_hashes, limit=config.CORPUS_MAX_CANDIDATES)
+    if not candidates:
+        candidates = index.candidates(
+            query_hashes,
+            limit=config.CORPUS_MAX_CANDIDATES,
+            max_posting_length=config.CORPUS_MAX_POSTING_LENGTH
+        )
+    query_fingerprints = document.fingerprints(index.n)[0]
+    for doc_id, _ in candidates:
+        norm_doc = index.get_text(doc_id)
+        j_sim = jaccard_similarity(query_fingerprints, norm_doc, n=index.n)
+        max_sim = max(max_sim, j_sim)
+
+    # TF-IDF cosine against the retrieved candidates only, so the cost stays independent of corpus size
+    if candidates:
+        rows = [doc_id for doc_id, _ in candidates]
+        max_sim = max(max_sim, index.tfidf.max_cosine(document.term_counts(), rows=rows))
     
     # Baseline simulation if not matching local exact sources
-    base_score = calculate_plagiarism_score(" ".join(normalized_text.split()[:50])) / 100 
+    base_score = calculate_plagiarism_score(document.prefix(50)) / 100 
     return max(max_sim, base_score) * 100.0
 
+def localize_sentence_matches(document: Union[str, NormalizedDocument]) -> List[Dict[str, Any]]:
+    """
+    Sentence-level breakdown of local corpus matches. The document's tokens are
+    aligned against the best candidate documents through the positional
+    postings, and each sentence is scored by the share of its words covered
+    by matched spans of its best source.
+    """
+    if isinstance(document, str):
+        document = NormalizedDocument.from_text(document)
+    index = REFERENCE_INDEX.current()
+    sentences = []  # (start_char, end_char, first_token, end_token)
+    offsets = document.offsets
+    t = 0
+    for start, end in split_sentences(document.source):
+        first = t
+        while t < len(offsets) and offsets[t] < end:
+            t += 1
+        if t > first:
+            sentences.append((start, end, first, t))
+    if not sentences:
+        return []
+
+    query_hashes = document.ngram_hashes(index.n)
+    candidates = index.candidates(
+        query_hashes,
+        limit=config.CORPUS_MATCH_SOURCES,
+        max_posting_length=config.CORPUS_MAX_POSTING_LENGTH
+    )
+    spans = index.match_spans(query_hashes, [doc_id for doc_id, _ in candidates], config.CORPUS_MAX_POSTING_LENGTH)
+
+    # Spans and sentences are both sorted by token, so one forward sweep per source suffices
+    best: Dict[int, Tuple[int, int]] = {}  # sentence -> (covered tokens, doc_id)
+    for doc_id, doc_spans in spans.items():
+        covered = Counter()
+        s = 0
+        for q_start, q_end, _ in doc_spans:
+            while s < len(sentences) and sentences[s][3] <= q_start:
+                s += 1
+            k = s
+            while k < len(sentences) and sentences[k][2] < q_end:
+                covered[k] += min(q_end, sentences[k][3]) - max(q_start, sentences[k][2])
+                k += 1
+        for k, count in covered.items():
+            if count > best.get(k, (0, None))[0]:
+                best[k] = (count, doc_id)
+
+    matches = []
+    for k in sorted(best):
+        count, doc_id = best[k]
+        start, end, first, last = sentences[k]
+        metadata = index.get_metadata(doc_id)
+        matches.append({
+            "start": start,
+            "end": end,
+            "source_id": str(metadata.get("source_id", doc_id)),
+            "source_title": metadata.get("title"),
+            "similarity": round(100.0 * count / (last - first), 2)
+        })
+    return matches
+
 # Step 3: Text Hashing & Cache
+# Legacy whole-file JSON cache, imported once into PLAGIARISM_CACHE
 PLAGIARISM_CACHE_FILE = "plagiarism_cache.json"
+# Incremental, crash-safe store (same SQLite database as the AI cache, own table):
+# O(1) keyed lookups and single-row writes instead of rewriting the whole JSON file
+PLAGIARISM_CACHE = CacheStore(
+    config.AI_CACHE_DB_FILE, "plagiarism_cache",
+    max_bytes=config.PLAGIARISM_CACHE_MAX_BYTES, ttl=config.PLAGIARISM_CACHE_TTL
+)
 
-def get_plagiarism_cache(text_hash: str):
-    if os.path.exists(PLAGIARISM_CACHE_FILE):
+async def get_plagiarism_cache(text_hash: str):
+    # Memory tier holds the serialized entry so callers always get a private copy to modify
+    cached = MEMORY_CACHE.get(f"plagiarism:{text_hash}")
+    if cached is None:
         try:
-            with open(PLAGIARISM_CACHE_FILE, "r") as f:
-                cache = json.load(f)
-                return cache.get(text_hash)
-        except Exception: 
-            pass
-    return None
+            cached = await PLAGIARISM_CACHE.aget(text_hash)
+        except Exception as e:
+            print(f"Failed to read plagiarism cache: {e}")
+            return None
+        if cached is None:
+            return None
+        MEMORY_CACHE.set(f"plagiarism:{text_hash}", cached, len(cached))
+    return json.loads(cached)
 
-def set_plagiarism_cache(text_hash: str, text_length: int, result: dict):
-    cache = {}
-    if os.path.exists(PLAGIARISM_CACHE_FILE):
-        try:
-            with open(PLAGIARISM_CACHE_FILE, "r") as f:
-                cache = json.load(f)
-        except Exception: 
-            pass
-    cache[text_hash] = {
+async def set_plagiarism_cache(text_hash: str, text_length: int, result: dict):
+    serialized = json.dumps({
         "text_length": text_length,
         "result": result,
         "timestamp": datetime.now().isoformat()
+    })
+    MEMORY_CACHE.set(f"plagiarism:{text_hash}", serialized, len(serialized))
+    try:
+        await PLAGIARISM_CACHE.aset(text_hash, serialized)
+    except Exception as e:
+        print(f"Failed to cache plagiarism result: {e}")
+
+def migrate_legacy_plagiarism_cache() -> int:
+    """
+    Imports plagiarism_cache.json into PLAGIARISM_CACHE once (existing keys win);
+    a marker file next to it stops later startups from re-reading it. Returns the count.
+    """
+    marker = PLAGIARISM_CACHE_FILE + ".imported"
+    if not os.path.exists(PLAGIARISM_CACHE_FILE) or os.path.exists(marker):
+        return 0
+    try:
+        with open(PLAGIARISM_CACHE_FILE, "r") as f:
+            legacy = json.load(f)
+    except Exception as e:
+        print(f"WARNING: Could not read legacy plagiarism cache: {e}")
+        return 0
+    batch = []
+    for text_hash, entry in legacy.items():
+        if PLAGIARISM_CACHE.contains(text_hash):
+            continue
+        try:
+            created = datetime.fromisoformat(entry["timestamp"]).timestamp() if entry.get("timestamp") else None
+        except (TypeError, ValueError):
+            created = None
+        batch.append((text_hash, json.dumps(entry), created))
+    if batch:
+        PLAGIARISM_CACHE.set_many(batch)
+        print(f"Imported {len(batch)} legacy plagiarism cache entries from {PLAGIARISM_CACHE_FILE}.")
+    try:
+        with open(marker, "w") as f:
+            f.write(datetime.now().isoformat())
+    except OSError as e:
+        print(f"WARNING: Could not mark legacy plagiarism cache as imported: {e}")
+    return len(batch)
+
+# --- Upload Dedup Cache ---
+# Keyed by the SHA-256 of the raw upload bytes, computed while the upload streams in.
+# A file seen before (a class handout, a template) skips PDF/DOCX extraction, and for
+# the same language and category skips the whole analysis as well.
+UPLOAD_CACHE = CacheStore(
+    config.AI_CACHE_DB_FILE, "upload_cache",
+    max_bytes=config.UPLOAD_CACHE_MAX_BYTES, ttl=config.UPLOAD_CACHE_TTL
+)
+
+async def _get_upload_entry(key: str) -> Optional[str]:
+    cached = MEMORY_CACHE.get(f"upload:{key}")
+    if cached is not None:
+        return cached
+    try:
+        cached = await UPLOAD_CACHE.aget(key)
+    except Exception as e:
+        print(f"Failed to read upload cache: {e}")
+        return None
+    if cached is not None:
+        MEMORY_CACHE.set(f"upload:{key}", cached, len(cached))
+    return cached
+
+async def _set_upload_entry(key: str, value: str):
+    MEMORY_CACHE.set(f"upload:{key}", value, len(value))
+    try:
+        await UPLOAD_CACHE.aset(key, value)
+    except Exception as e:
+        print(f"Failed to cache upload: {e}")
+
+async def extract_upload_text(content: bytes, content_digest: str, content_type: str) -> str:
+    """Extracted text of an upload; only bytes not seen before are parsed (in a worker thread)."""
+    key = f"text:{content_digest}:{content_type}"
+    cached = await _get_upload_entry(key)
+    if cached is not None:
+        return cached
+    extracted_text = await asyncio.to_thread(extract_text, content, content_type)
+    await _set_upload_entry(key, extracted_text)
+    return extracted_text
+
+async def get_upload_result(content_digest: str, content_type: str, language: str, category: str) -> Optional[Dict[str, Any]]:
+    """Stored analysis of an identical upload: {"word_count", "plagiarism", "ai_detection"}."""
+    cached = await _get_upload_entry(f"result:{content_digest}:{content_type}:{language}:{category}")
+    return json.loads(cached) if cached is not None else None
+
+async def set_upload_result(content_digest: str, content_type: str, language: str, category: str, word_count: int,
+                            plagiarism: Dict[str, Any], ai_detection: Dict[str, Any]):
+    await _set_upload_entry(
+        f"result:{content_digest}:{content_type}:{language}:{category}",
+        json.dumps({"word_count": word_count, "plagiarism": plagiarism, "ai_detection": ai_detection})
+    )
+
+def cache_stats() -> Dict[str, Any]:
+    """Per-tier cache metrics for the admin endpoint."""
+    return {
+        "memory": MEMORY_CACHE.stats(),
+        "ai_cache": AI_CACHE.stats(),
+        "plagiarism_cache": PLAGIARISM_CACHE.stats(),
+        "upload_cache": UPLOAD_CACHE.stats()
     }
-    with open(PLAGIARISM_CACHE_FILE, "w") as f:
-        json.dump(cache, f)
 
 # Step 4, 5 & 6: Main Pipeline
-def construct_chunks(normalized_text: str, max_words=500):
+def construct_chunks(normalized_text: Union[str, NormalizedDocument], max_words=500):
+    if isinstance(normalized_text, NormalizedDocument):
+        # Chunk on normalized token boundaries but hand out the original wording
+        return [normalized_text.source_text(start, end) for start, end in normalized_text.chunk_bounds(max_words)]
     words = normalized_text.split()
     return [" ".join(words[i:i+max_words]) for i in range(0, len(words), max_words)]
 
-async def execute_advanced_plagiarism_check(text: str, language: str, content_type: str) -> dict:
-    normalized_text = normalize_text(text)
+def rank_chunks(document: NormalizedDocument, n_chunks: int, max_words=500, limit=2) -> List[int]:
+    """
+    Indices of the chunks whose winnowed fingerprints hit the reference index
+    most often (in document order), so the API sees the most suspicious
+    passages rather than simply the first ones.
+    """
+    if n_chunks <= limit:
+        return list(range(n_chunks))
+    index = REFERENCE_INDEX.current()
+    fingerprints, positions = document.fingerprints(index.n)
+    hits = [sum(1 for h in chunk if len(index.lookup(h))) for chunk in split_by_position(fingerprints, positions, max_words)]
+    hits += [0] * (n_chunks - len(hits))
+    return sorted(sorted(range(n_chunks), key=lambda i: (-hits[i], i))[:limit])
+
+async def analyze_chunk(sys_prompt: str, chunk: str) -> Optional[Dict[str, Any]]:
+    """One chunk verdict from the AI cache or the API, or None if the call or its JSON failed."""
+    cache_text = sys_prompt + "\n" + chunk
+    cached = await get_ai_cache(cache_text, "chunk")
+    if cached:
+        try:
+            return json.loads(cached)
+        except ValueError:
+            pass
+    # Identical chunks (same prompt context) analyzed concurrently share one call
+    return await LLM_SINGLE_FLIGHT.do(ai_cache_key(cache_text, "chunk"), lambda: fetch_chunk_verdict(sys_prompt, chunk))
+
+async def fetch_chunk_verdict(sys_prompt: str, chunk: str) -> Optional[Dict[str, Any]]:
+    messages = [
+        {"role": "system", "content": sys_prompt},
+        {"role": "user", "content": f"Analyze this chunk: '{chunk}'"}
+    ]
+    try:
+        res_content = await complete_chat(messages, temperature=0.2, response_format={"type": "json_object"})
+        verdict = json.loads(res_content)
+    except Exception as e:
+        print(f"API Chunk Analysis Error: {e}")
+        return None
+    # Cached per chunk, so a check that runs out of time still saves the chunks it finished
+    if isinstance(verdict, dict):
+        await set_ai_cache(sys_prompt + "\n" + chunk, "chunk", res_content)
+    return verdict
+
+async def analyze_chunks_concurrently(sys_prompt: str, chunks: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """Fans all chunks out at once, at most PLAGIARISM_CHUNK_CONCURRENCY in flight; results keep chunk order."""
+    semaphore = asyncio.Semaphore(max(1, config.PLAGIARISM_CHUNK_CONCURRENCY))
+
+    async def bounded(chunk: str):
+        async with semaphore:
+            return await analyze_chunk(sys_prompt, chunk)
+
+    return await asyncio.gather(*(bounded(chunk) for chunk in chunks))
+
+ORIGINALITY_LEVELS = ["High", "Medium", "Low"]
+
+def parse_similarity_range(value: Any) -> Optional[Tuple[float, float]]:
+    numbers = [float(n) for n in re.findall(r'\d+(?:\.\d+)?', str(value or ""))[:2]]
+    if not numbers:
+        return None
+    return min(numbers), max(numbers)
+
+def merge_chunk_verdicts(verdicts: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Combines per-chunk verdicts into one document-level verdict. Originality
+    level and similarity range are averaged with each chunk weighted by its
+    word count; patterns and sources are unioned; the reasoning of the most
+    suspicious chunk is kept.
+    """
+    total = sum(weight for weight, _ in verdicts) or 1
+    level_score = 0.0
+    lo_sum = hi_sum = range_weight = 0.0
+    patterns: List[str] = []
+    sources: List[Dict[str, Any]] = []
+    seen_sources = set()
+    worst = None
+    for weight, verdict in verdicts:
+        level = verdict.get("originality_level", "Medium")
+        rank = ORIGINALITY_LEVELS.index(level) if level in ORIGINALITY_LEVELS else 1
+        level_score += rank * weight
+        bounds = parse_similarity_range(verdict.get("similarity_range"))
+        if bounds:
+            lo_sum += bounds[0] * weight
+            hi_sum += bounds[1] * weight
+            range_weight += weight
+        for pattern in verdict.get("suspected_patterns", []) or []:
+            if pattern not in patterns:
+                patterns.append(pattern)
+        for source in verdict.get("mock_sources", verdict.get("sources", [])) or []:
+            key = source.get("url") or source.get("title") if isinstance(source, dict) else str(source)
+            if key not in seen_sources:
+                seen_sources.add(key)
+                sources.append(source)
+        if worst is None or (rank, bounds[1] if bounds else 0) > worst[0]:
+            worst = ((rank, bounds[1] if bounds else 0), verdict)
+
+    merged = {
+        "originality_level": ORIGINALITY_LEVELS[min(2, int(round(level_score / total)))],
+        "similarity_range": f"{round(lo_sum / range_weight)}-{round(hi_sum / range_weight)}%" if range_weight else "30-50%",
+        "reasoning": worst[1].get("reasoning", "Analysis complete against APIs.") if worst else "Analysis complete against APIs.",
+        "suspected_patterns": patterns,
+        "mock_sources": sources
+    }
+    if len(verdicts) > 1:
+        merged["reasoning"] = f"Analyzed {len(verdicts)} chunks. Most similar passage: {merged['reasoning']}"
+    return merged
+
+def local_plagiarism_analysis(document: NormalizedDocument) -> Tuple[float, List[Dict[str, Any]]]:
+    """The CPU-bound part of a plagiarism check: local corpus similarity and sentence matches."""
+    return calculate_local_similarity(document), localize_sentence_matches(document)
+
+def start_local_plagiarism_analysis(document: NormalizedDocument) -> asyncio.Future:
+    """Runs local_plagiarism_analysis in a worker thread; several stages may await the result."""
+    return asyncio.ensure_future(asyncio.to_thread(local_plagiarism_analysis, document))
+
+async def execute_advanced_plagiarism_check(text: Union[str, NormalizedDocument], language: str, content_type: str,
+                                            local: Optional[asyncio.Future] = None) -> dict:
+    # The submission is tokenized once; every step below works from this document
+    document = text if isinstance(text, NormalizedDocument) else NormalizedDocument.from_text(text)
+    normalized_text = document.text
+    if local is None:
+        local = start_local_plagiarism_analysis(document)
     
     # Check cache
     text_hash = hashlib.sha256(normalized_text.encode('utf-8')).hexdigest()
-    cached_result = get_plagiarism_cache(text_hash)
+    cached_result = await get_plagiarism_cache(text_hash)
+    # Shielded: the local result may be shared with run_content_checks' fallback
+    local_sim, sentence_matches = await asyncio.shield(local)
     if cached_result:
         result = cached_result["result"]
         result["api_used"] = False
         result["confidence"] = "High"
         result["analysis_summary"] = "Result retrieved from local cache."
+        # Character offsets refer to the raw text, so sentence matches are never cached
+        result["sentence_matches"] = sentence_matches
         return result
-        
-    local_sim = calculate_local_similarity(normalized_text)
     
     # Rule: If similarity score < 30%, immediately return
     if local_sim < 30.0:
@@ -626,12 +1245,12 @@ async def execute_advanced_plagiarism_check(text: str, language: str, content_ty
             "api_used": False,
             "sources": []
         }
-        set_plagiarism_cache(text_hash, len(normalized_text), result)
-        return result
+        await set_plagiarism_cache(text_hash, len(normalized_text), result)
+        return dict(result, sentence_matches=sentence_matches)
         
     # Chunking
-    chunks = construct_chunks(text, max_words=500)
-    chunks_to_analyze = chunks[:2] 
+    chunks = construct_chunks(document, max_words=500)
+    weights = [end - start for start, end in document.chunk_bounds(500)]
     
     sys_prompt = (
         f"You are an expert content analyst specializing in plagiarism detection. "
@@ -645,26 +1264,20 @@ async def execute_advanced_plagiarism_check(text: str, language: str, content_ty
     )
     
     combined_result = None
-    if config.GROQ_API_KEY:
-        for chunk in chunks_to_analyze:
-            req_body = {
-                "model": config.GROQ_MODEL,
-                "messages": [
-                    {"role": "system", "content": sys_prompt},
-                    {"role": "user", "content": f"Analyze this chunk: '{chunk}'"}
-                ],
-                "response_format": {"type": "json_object"},
-                "temperature": 0.2
-            }
-            async with httpx.AsyncClient() as client:
-                try:
-                    resp = await client.post(config.GROQ_API_URL, headers={"Authorization": f"Bearer {config.GROQ_API_KEY}"}, json=req_body, timeout=config.GROQ_API_TIMEOUT)
-                    resp.raise_for_status()
-                    res_content = resp.json()["choices"][0]["message"]["content"]
-                    combined_result = json.loads(res_content)
-                    break
-                except Exception as e:
-                    print(f"API Chunk Analysis Error: {e}")
+    if config.GROQ_API_KEY and config.PLAGIARISM_PARALLEL_CHUNKS:
+        # Whole document (or the most suspicious PLAGIARISM_MAX_CHUNKS chunks) in about one round-trip
+        picked = rank_chunks(document, len(chunks), max_words=500, limit=config.PLAGIARISM_MAX_CHUNKS or len(chunks))
+        results = await analyze_chunks_concurrently(sys_prompt, [chunks[i] for i in picked])
+        verdicts = [(weights[i], result) for i, result in zip(picked, results) if isinstance(result, dict)]
+        if verdicts:
+            combined_result = merge_chunk_verdicts(verdicts)
+    elif config.GROQ_API_KEY:
+        # Previous behaviour: the first two chunks, one at a time, until one gives a verdict
+        for i in range(min(2, len(chunks))):
+            result = await analyze_chunk(sys_prompt, chunks[i])
+            if isinstance(result, dict) and result:
+                combined_result = result
+                break
                     
     if not combined_result:
          combined_result = {
@@ -686,5 +1299,117 @@ async def execute_advanced_plagiarism_check(text: str, language: str, content_ty
         "sources": combined_result.get("mock_sources", combined_result.get("sources", []))
     }
     
-    set_plagiarism_cache(text_hash, len(normalized_text), final_output)
-    return final_output
\ No newline at end of file
+    await set_plagiarism_cache(text_hash, len(normalized_text), final_output)
+    return dict(final_output, sentence_matches=sentence_matches)
+
+# --- Concurrent Check Pipeline ---
+# Plagiarism scoring and AI detection are independent LLM round-trips, so the
+# check endpoints run them side by side under one shared deadline. A stage that
+# misses the deadline or fails is answered from its local heuristic and listed
+# in partial_stages, so the response still arrives on time. A late plagiarism
+# stage is not cancelled but left to finish in the background, so its chunk
+# verdicts and final result land in the AI and plagiarism caches for the next
+# identical check. A late AI detection stage is cancelled; its upstream call is
+# shielded by single-flight and still lands in the AI cache. The local corpus
+# analysis runs once, in a worker thread, and also serves the fallback.
+
+# Late plagiarism stages still running in the background (referenced so they are not collected)
+BACKGROUND_STAGES: Set[asyncio.Task] = set()
+
+def _finish_in_background(name: str, task: asyncio.Task):
+    BACKGROUND_STAGES.add(task)
+
+    def done(task: asyncio.Task):
+        BACKGROUND_STAGES.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error in late {name} stage: {task.exception()}")
+
+    task.add_done_callback(done)
+
+async def local_plagiarism_result(document: NormalizedDocument, reason: str,
+                                  local: Optional[asyncio.Future] = None) -> dict:
+    """Heuristic-only stand-in for execute_advanced_plagiarism_check."""
+    local_sim, sentence_matches = await (local if local is not None else start_local_plagiarism_analysis(document))
+    return {
+        "score": local_sim,
+        "originality_level": "High" if local_sim < 30.0 else "Medium",
+        "similarity_range": "0-30%" if local_sim < 30.0 else "30-50%",
+        "confidence": "Low",
+        "analysis_summary": f"{reason} Score is from local heuristics only.",
+        "matched_patterns": ["local analysis"],
+        "api_used": False,
+        "sources": [],
+        "sentence_matches": sentence_matches
+    }
+
+async def _timed_stage(coro) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - started
+
+async def run_content_checks(document: NormalizedDocument, language: str, content_type: str,
+                             check_ai: bool = True, deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Runs the plagiarism pipeline and (optionally) AI detection concurrently.
+    Returns {"plagiarism", "ai_detection", "stage_timings", "partial_stages"};
+    timings are seconds per stage plus "total".
+    """
+    deadline = config.CHECK_DEADLINE if deadline is None else deadline
+    started = time.perf_counter()
+    local = start_local_plagiarism_analysis(document)
+    stages = {
+        "plagiarism": asyncio.ensure_future(_timed_stage(
+            execute_advanced_plagiarism_check(document, language=language, content_type=content_type, local=local)))
+    }
+    if check_ai:
+        stages["ai_detection"] = asyncio.ensure_future(_timed_stage(
+            analyze_with_groq_api(document.source, "ai_detection")))
+
+    try:
+        await asyncio.wait(stages.values(), timeout=deadline or None)
+    finally:
+        late = [name for name, task in stages.items() if not task.done()]
+        for name in late:
+            if name == "plagiarism":
+                _finish_in_background(name, stages[name])
+            else:
+                stages[name].cancel()
+
+    results: Dict[str, Any] = {}
+    timings: Dict[str, float] = {}
+    partial: List[str] = []
+    rejections: List[HTTPException] = []
+    for name, task in stages.items():
+        if name in late:
+            print(f"WARNING: {name} stage missed the {deadline}s check deadline. Using local fallback.")
+            reason = "Full analysis did not finish in time."
+        elif task.exception() is not None:
+            error = task.exception()
+            if isinstance(error, HTTPException):
+                rejections.append(error)
+            print(f"Error in {name} stage: {error}. Using local fallback.")
+            reason = "Full analysis is temporarily unavailable."
+        else:
+            results[name], timings[name] = task.result()
+            continue
+        partial.append(name)
+        timings[name] = time.perf_counter() - started
+        if name == "plagiarism":
+            results[name] = await local_plagiarism_result(document, reason, local)
+        else:
+            results[name] = detect_ai_content(document.source)
+
+    # Nothing but admission rejections: keep the 503 + Retry-After instead of a heuristic answer
+    if rejections and len(rejections) == len(stages):
+        raise rejections[0]
+
+    if not check_ai:
+        results["ai_detection"] = {"is_ai": False, "confidence": 0.0}
+    timings = {name: round(seconds, 4) for name, seconds in timings.items()}
+    timings["total"] = round(time.perf_counter() - started, 4)
+    return {
+        "plagiarism": results["plagiarism"],
+        "ai_detection": results["ai_detection"],
+        "stage_timings": timings,
+        "partial_stages": partial
+    }
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+Compares the streaming normalizer against the original four-pass normalize_text.
+
+    python -m benchmark_normalize [--sizes 1 10]
+
+For each size (in MB) a synthetic text mixing accented words, punctuation,
+irregular whitespace and non-Latin scripts is normalized by both versions;
+outputs must be identical and the timings are printed.
+"""
+import re
+import time
+import random
+import string
+import argparse
+from typing import List
+
+from text_processing import unidecode, normalize_text, iter_normalized_tokens
+
+_SAMPLE_WORDS = [
+    "Plagiarism", "détection", "naïve", "Straße", "coöperate", "ÉCOLE", "don't", "e.g.",
+    "state-of-the-art", "“quoted”", "résumé", "Ωmega", "中文", "3.14", "(parenthetical)", "end.Next",
+]
+_SEPARATORS = [" ", " ", " ", "  ", "\n", "\t", " \r\n", " ", "　"]
+
+
+def reference_normalize_text(text: str) -> str:
+    """The original implementation: four full-copy passes over the text."""
+    text = text.lower()
+    text = unidecode(text)
+    text = text.translate(str.maketrans("", "", string.punctuation))
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def make_text(size_bytes: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    words = _SAMPLE_WORDS + ["".join(rng.choice(string.ascii_letters) for _ in range(rng.randint(1, 10))) for _ in range(2000)]
+    parts, total = [], 0
+    while total < size_bytes:
+        part = rng.choice(words) + rng.choice(_SEPARATORS)
+        if rng.random() < 0.05:
+            part += rng.choice(".,;:!?") + " "
+        parts.append(part)
+        total += len(part)
+    return "".join(parts)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark normalize_text against the original implementation.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10], help="Input sizes in MB.")
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        text = make_text(int(size * 1024 * 1024))
+        expected, reference_time = timed(reference_normalize_text, text)
+        joined, joined_time = timed(normalize_text, text)
+        tokens, tokens_time = timed(lambda t: list(iter_normalized_tokens(t)), text)
+        if joined != expected or tokens != expected.split():
+            raise SystemExit(f"{size} MB: streaming output differs from the reference normalizer")
+        print(
+            f"{size:g} MB: reference {reference_time * 1000:.0f} ms, "
+            f"normalize_text {joined_time * 1000:.0f} ms, "
+            f"token stream {tokens_time * 1000:.0f} ms (+ reference split {timed(str.split, expected)[1] * 1000:.0f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import os
+import re
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# --- Persistent Response Cache ---
+# One SQLite database in WAL mode holds cached LLM responses (and other derived
+# results) instead of one JSON file per entry. Entries expire after a TTL and the
+# least recently used ones are evicted once the stored payloads exceed a byte
+# budget. Readers never block behind the writer in WAL mode, and the async
+# helpers run every query in a worker thread so the event loop is never blocked
+# on disk. A MemoryLRU can sit in front of any persistent tier for hot keys.
+# Hits only rewrite an entry's access time once it is touch_interval seconds
+# old, so a read-mostly cache rarely takes SQLite's (cross-worker) write lock;
+# eviction order is LRU to within that interval.
+
+
+class CacheStore:
+    """Key -> text cache in one SQLite table with TTL, LRU-by-bytes eviction and counters."""
+
+    def __init__(self, path: str, name: str = "cache", max_bytes: int = 256 * 1024 * 1024, ttl: float = 0,
+                 touch_interval: float = 60):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name):
+            raise ValueError(f"Invalid cache name: {name!r}")
+        self.path = path
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_accessed ON {name} (accessed)")
+        # Byte totals are kept by triggers so every worker process sharing the file sees the same figure
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache_totals (name TEXT PRIMARY KEY, bytes INTEGER NOT NULL)")
+        self._conn.execute(
+            "INSERT OR IGNORE INTO cache_totals (name, bytes) SELECT ?, COALESCE(SUM(size), 0) FROM " + name, (name,)
+        )
+        self._conn.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS {name}_ins AFTER INSERT ON {name} BEGIN
+                UPDATE cache_totals SET bytes = bytes + NEW.size WHERE name = '{name}';
+            END;
+            CREATE TRIGGER IF NOT EXISTS {name}_del AFTER DELETE ON {name} BEGIN
+                UPDATE cache_totals SET bytes = bytes - OLD.size WHERE name = '{name}';
+            END;
+            CREATE TRIGGER IF NOT EXISTS {name}_upd AFTER UPDATE OF size ON {name} BEGIN
+                UPDATE cache_totals SET bytes = bytes + NEW.size - OLD.size WHERE name = '{name}';
+            END;
+        """)
+
+    @property
+    def total_bytes(self) -> int:
+        row = self._conn.execute("SELECT bytes FROM cache_totals WHERE name = ?", (self.name,)).fetchone()
+        return row[0] if row else 0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, created, accessed FROM {self.name} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created, accessed = row
+            if self.ttl and created + self.ttl < now:
+                self._conn.execute(f"DELETE FROM {self.name} WHERE key = ?", (key,))
+                self.expired += 1
+                self.misses += 1
+                return None
+            if accessed + self.touch_interval <= now:
+                self._conn.execute(f"UPDATE {self.name} SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return value
+
+    def contains(self, key: str) -> bool:
+        """Presence check that neither counts as a lookup nor refreshes recency."""
+        with self._lock:
+            return self._conn.execute(f"SELECT 1 FROM {self.name} WHERE key = ?", (key,)).fetchone() is not None
+
+    def set(self, key: str, value: str, created: Optional[float] = None):
+        self.set_many([(key, value, created)])
+
+    def set_many(self, items: Iterable[Tuple[str, str, Optional[float]]]):
+        """Stores (key, value, created) entries in one transaction; created defaults to now."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, value, created in items:
+                    # Upsert rather than REPLACE so the size triggers see an UPDATE, not a hidden DELETE
+                    self._conn.execute(
+                        f"INSERT INTO {self.name} (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                        "created = excluded.created, accessed = excluded.accessed",
+                        (key, value, len(value.encode("utf-8")), created or now, now)
+                    )
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.name} WHERE key = ?", (key,))
+
+    def _evict(self):
+        """Drops expired entries, then least recently used ones until under max_bytes."""
+        if self.ttl:
+            removed = self._conn.execute(f"DELETE FROM {self.name} WHERE created < ?", (time.time() - self.ttl,)).rowcount
+            self.expired += max(removed, 0)
+        excess = self.total_bytes - self.max_bytes if self.max_bytes else 0
+        while excess > 0:
+            victims = self._conn.execute(f"SELECT key, size FROM {self.name} ORDER BY accessed LIMIT 256").fetchall()
+            if not victims:
+                break
+            for key, size in victims:
+                if excess <= 0:
+                    break
+                self._conn.execute(f"DELETE FROM {self.name} WHERE key = ?", (key,))
+                excess -= size
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+            total_bytes = self.total_bytes
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+    # Event-loop friendly wrappers: SQLite work happens in a worker thread
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str):
+        await asyncio.to_thread(self.set, key, value)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MemoryLRU:
+    """In-process LRU bounded by entry count and total value bytes."""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: str, value: Any, size: int):
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._data[key] = (value, size)
+            self.total_bytes += size
+            while len(self._data) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+
+    def clear(self) -> int:
+        """Drops every entry; returns how many were removed."""
+        with self._lock:
+            count = len(self._data)
+            self._data.clear()
+            self.total_bytes = 0
+            return count
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,91 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# --- Chat Context Window ---
+# Multi-turn chat keeps the conversation server side so clients only send the
+# new message. Each history is a sliding window over the most recent turns,
+# bounded by turn count and total characters, so prompt size (and upstream
+# latency) stays flat however long a conversation runs. Histories live in the
+# worker's memory: a WebSocket owns one for its connection, and SSE clients
+# are given a session id that maps to one here until it idles out.
+
+
+class ChatHistory:
+    """The most recent (user, assistant) turns, bounded by count and total characters."""
+
+    __slots__ = ("max_turns", "max_chars", "_turns", "_chars", "last_used")
+
+    def __init__(self, max_turns: int = 10, max_chars: int = 8000):
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self._turns: Deque[Tuple[str, str]] = deque()
+        self._chars = 0
+        self.last_used = time.time()
+
+    def messages(self) -> List[Dict[str, str]]:
+        """The window as chat-completion messages, oldest first."""
+        messages = []
+        for user_message, reply in self._turns:
+            messages.append({"role": "user", "content": user_message})
+            messages.append({"role": "assistant", "content": reply})
+        return messages
+
+    def add_turn(self, user_message: str, reply: str):
+        self._turns.append((user_message, reply))
+        self._chars += len(user_message) + len(reply)
+        # Oldest turns slide out first
+        while self._turns and (len(self._turns) > self.max_turns or self._chars > self.max_chars):
+            old_message, old_reply = self._turns.popleft()
+            self._chars -= len(old_message) + len(old_reply)
+        self.last_used = time.time()
+
+    def clear(self):
+        self._turns.clear()
+        self._chars = 0
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+
+class ChatSessionStore:
+    """Per-worker LRU of chat histories by session id, dropped after ttl idle seconds."""
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 1800, max_turns: int = 10, max_chars: int = 8000):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self._sessions: "OrderedDict[str, ChatHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def new_history(self) -> ChatHistory:
+        return ChatHistory(self.max_turns, self.max_chars)
+
+    def get(self, session_id: Optional[str] = None) -> Tuple[str, ChatHistory]:
+        """Returns (session_id, history); unknown or expired ids start a fresh session."""
+        now = time.time()
+        with self._lock:
+            history = self._sessions.get(session_id) if session_id else None
+            if history is not None and self.ttl and history.last_used + self.ttl < now:
+                del self._sessions[session_id]
+                history = None
+            if history is None:
+                session_id = uuid.uuid4().hex
+                history = self.new_history()
+                self._sessions[session_id] = history
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            history.last_used = now
+            return session_id, history
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
@@ -0,0 +1,5 @@
+-- Run this in your Supabase SQL Editor to store sentence-level corpus matches
+-- with each check (returned as "sentences" by /api/reports/{id})
+
+ALTER TABLE public.checks
+ADD COLUMN IF NOT EXISTS sentence_matches JSONB NOT NULL DEFAULT '[]'::jsonb;
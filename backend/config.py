@@ -18,6 +18,26 @@ class Config:
     # --- Supabase Settings ---
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_SERVICE_ROLE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
+    # Threads running blocking Supabase calls off the event loop (per worker)
+    SUPABASE_MAX_THREADS: int = int(os.getenv("SUPABASE_MAX_THREADS", 16))
+    # Access tokens are verified locally: HS256 with the project's JWT secret, RS256/ES256
+    # with keys from the JWKS endpoint (re-read every SUPABASE_JWKS_TTL seconds)
+    SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "")
+    SUPABASE_JWKS_URL: str = os.getenv(
+        "SUPABASE_JWKS_URL",
+        f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else ""
+    )
+    SUPABASE_JWT_AUDIENCE: str = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+    SUPABASE_JWKS_TTL: float = float(os.getenv("SUPABASE_JWKS_TTL", 600))
+    # Seconds a verified token is trusted without re-checking (never past its exp; 0 disables)
+    AUTH_TOKEN_CACHE_TTL: float = float(os.getenv("AUTH_TOKEN_CACHE_TTL", 60))
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", 10000))
+    # Per-worker profile cache; profile writes through this worker invalidate it immediately,
+    # writes elsewhere show up after at most PROFILE_CACHE_TTL seconds (0 disables). Quota
+    # checks re-read the plan before refusing, so a stale plan never blocks a user who just
+    # upgraded; a downgrade can keep the old limits for up to this long
+    PROFILE_CACHE_TTL: float = float(os.getenv("PROFILE_CACHE_TTL", 30))
+    PROFILE_CACHE_MAX_ENTRIES: int = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", 10000))
 
 
     # --- Server Settings ---
@@ -90,6 +110,122 @@ class Config:
     # API Timeout (seconds)
     GROQ_API_TIMEOUT: float = 60.0
 
+    # Ollama chat endpoint used when MODE=local
+    OLLAMA_API_URL: str = os.getenv("OLLAMA_API_URL", "http://localhost:11434/api/chat")
+
+    # --- Shared LLM HTTP Client ---
+    # One pooled client per worker process is reused by every Groq/Ollama call
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+    # Connections per upstream host (Groq and Ollama each get their own pool)
+    LLM_MAX_CONNECTIONS_PER_HOST: int = int(os.getenv("LLM_MAX_CONNECTIONS_PER_HOST", 50))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+    # Seconds an idle connection is kept open for reuse
+    LLM_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60))
+    # HTTP/2 multiplexing for HTTPS upstreams (needs the h2 package)
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "True").lower() == "true"
+
+    # --- LLM Router ---
+    # JSON list of backends, e.g. [{"name": "groq", "kind": "groq", "model": "llama-3.1-8b-instant"},
+    # {"name": "ollama", "kind": "ollama", "url": "http://localhost:11434/api/chat", "model": "llama3"}];
+    # optional keys: url, api_key, timeout. Empty = the single backend selected by MODE.
+    LLM_BACKENDS: str = os.getenv("LLM_BACKENDS", "")
+    # Calls kept per backend for rolling p50/p95 latency and error rate
+    LLM_ROUTER_WINDOW: int = int(os.getenv("LLM_ROUTER_WINDOW", 100))
+    # A backend leaves rotation for LLM_ROUTER_COOLDOWN seconds after this many consecutive
+    # failures, or when its error rate over the window exceeds LLM_ROUTER_MAX_ERROR_RATE
+    LLM_ROUTER_FAILURE_THRESHOLD: int = int(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", 3))
+    LLM_ROUTER_MAX_ERROR_RATE: float = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", 0.5))
+    LLM_ROUTER_COOLDOWN: float = float(os.getenv("LLM_ROUTER_COOLDOWN", 30))
+    # Hedged calls (chat, streaming humanizer) start the next backend once the first exceeds
+    # its own p95, clamped to [LLM_HEDGE_MIN_DELAY, LLM_HEDGE_MAX_DELAY] seconds
+    LLM_HEDGE: bool = os.getenv("LLM_HEDGE", "True").lower() == "true"
+    LLM_HEDGE_MIN_DELAY: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", 0.25))
+    LLM_HEDGE_MAX_DELAY: float = float(os.getenv("LLM_HEDGE_MAX_DELAY", 5))
+
+    # --- Usage Counters ---
+    # Seconds a worker trusts its cached monthly totals before re-reading them (usage
+    # recorded by other workers can go unseen for this long), and how often recorded
+    # words are written to the usage_counters table
+    USAGE_CACHE_TTL: float = float(os.getenv("USAGE_CACHE_TTL", 10))
+    USAGE_FLUSH_INTERVAL: float = float(os.getenv("USAGE_FLUSH_INTERVAL", 2))
+    # Once a reservation would take usage past this fraction of the limit, it is taken
+    # atomically in the database (try_reserve_usage) instead of in worker memory
+    USAGE_SYNC_THRESHOLD: float = float(os.getenv("USAGE_SYNC_THRESHOLD", 0.9))
+
+    # --- Check Pipeline ---
+    # Seconds the check endpoints wait for plagiarism scoring and AI detection (run
+    # concurrently) before answering late stages from local heuristics (0 = no limit)
+    CHECK_DEADLINE: float = float(os.getenv("CHECK_DEADLINE", 45))
+
+    # --- LLM Admission Control ---
+    # Concurrent upstream calls per backend and worker: starting point and AIMD bounds
+    LLM_CONCURRENCY_INITIAL: int = int(os.getenv("LLM_CONCURRENCY_INITIAL", 16))
+    LLM_CONCURRENCY_MIN: int = int(os.getenv("LLM_CONCURRENCY_MIN", 1))
+    LLM_CONCURRENCY_MAX: int = int(os.getenv("LLM_CONCURRENCY_MAX", 64))
+    # Calls slower than this many seconds (time to first byte for streams) shrink the limit
+    LLM_LATENCY_TARGET: float = float(os.getenv("LLM_LATENCY_TARGET", 10))
+    # Waiting calls beyond LLM_QUEUE_MAX, or queued longer than LLM_QUEUE_TIMEOUT seconds, get a 503
+    LLM_QUEUE_MAX: int = int(os.getenv("LLM_QUEUE_MAX", 1000))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", 30))
+    # Extra attempts when every backend failed (a lone backend is retried after a 429),
+    # and the pause used when Retry-After is missing (capped at the max)
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", 2))
+    LLM_RETRY_AFTER_DEFAULT: float = float(os.getenv("LLM_RETRY_AFTER_DEFAULT", 1))
+    LLM_RETRY_AFTER_MAX: float = float(os.getenv("LLM_RETRY_AFTER_MAX", 30))
+
+    # --- LLM Response Cache ---
+    # SQLite (WAL) database replacing the one-file-per-entry ai_cache/ directory
+    AI_CACHE_DB_FILE: str = os.getenv("AI_CACHE_DB_FILE", "ai_cache.sqlite3")
+    # Least recently used responses are evicted beyond this many payload bytes
+    AI_CACHE_MAX_BYTES: int = int(os.getenv("AI_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+    # Seconds before a cached response expires (0 = never)
+    AI_CACHE_TTL: float = float(os.getenv("AI_CACHE_TTL", 30 * 24 * 3600))
+
+    # Advanced plagiarism results share the same database (own table and budget)
+    PLAGIARISM_CACHE_MAX_BYTES: int = int(os.getenv("PLAGIARISM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+    PLAGIARISM_CACHE_TTL: float = float(os.getenv("PLAGIARISM_CACHE_TTL", 0))
+    # Upload dedup (raw-bytes hash -> extracted text and analysis) shares it too
+    UPLOAD_CACHE_MAX_BYTES: int = int(os.getenv("UPLOAD_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+    UPLOAD_CACHE_TTL: float = float(os.getenv("UPLOAD_CACHE_TTL", 30 * 24 * 3600))
+    # Bytes read (and hashed) per step while an upload streams in
+    UPLOAD_READ_CHUNK_SIZE: int = int(os.getenv("UPLOAD_READ_CHUNK_SIZE", 1024 * 1024))
+    # In-process LRU in front of the AI, plagiarism and upload caches (0 entries disables it)
+    MEMORY_CACHE_MAX_ENTRIES: int = int(os.getenv("MEMORY_CACHE_MAX_ENTRIES", 10000))
+    MEMORY_CACHE_MAX_BYTES: int = int(os.getenv("MEMORY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+    # --- Streaming Chat ---
+    # Context window kept per conversation: most recent turns, capped by count and characters
+    CHAT_HISTORY_MAX_TURNS: int = int(os.getenv("CHAT_HISTORY_MAX_TURNS", 10))
+    CHAT_HISTORY_MAX_CHARS: int = int(os.getenv("CHAT_HISTORY_MAX_CHARS", 8000))
+    # SSE chat sessions held per worker, and seconds of inactivity before one is dropped
+    CHAT_SESSION_MAX: int = int(os.getenv("CHAT_SESSION_MAX", 10000))
+    CHAT_SESSION_TTL: float = float(os.getenv("CHAT_SESSION_TTL", 1800))
+
+    # --- Chunked Plagiarism Analysis ---
+    # Analyze every 500-word chunk concurrently and merge the verdicts (False = first two chunks, one at a time)
+    PLAGIARISM_PARALLEL_CHUNKS: bool = os.getenv("PLAGIARISM_PARALLEL_CHUNKS", "True").lower() == "true"
+    # Maximum chunk requests in flight per document
+    PLAGIARISM_CHUNK_CONCURRENCY: int = int(os.getenv("PLAGIARISM_CHUNK_CONCURRENCY", 8))
+    # Cap on chunks sent per document, most suspicious first (0 = whole document)
+    PLAGIARISM_MAX_CHUNKS: int = int(os.getenv("PLAGIARISM_MAX_CHUNKS", 0))
+
+    # --- Local Reference Corpus Index ---
+    # Binary inverted index used by the local similarity pre-check
+    CORPUS_INDEX_FILE: str = os.getenv("CORPUS_INDEX_FILE", "corpus_index.aqix")
+    # Maximum number of candidate documents scored exactly per query
+    CORPUS_MAX_CANDIDATES: int = int(os.getenv("CORPUS_MAX_CANDIDATES", 50))
+    # Shingles shared by more documents than this are treated as boilerplate and skipped
+    CORPUS_MAX_POSTING_LENGTH: int = int(os.getenv("CORPUS_MAX_POSTING_LENGTH", 20000))
+    # MinHash LSH precision/recall knob (applied when an index is built).
+    # Documents above roughly (1/bands)^(1/rows) Jaccard similarity become near-duplicate candidates:
+    # more rows per band -> higher precision, more bands -> higher recall.
+    MINHASH_BANDS: int = int(os.getenv("MINHASH_BANDS", 16))
+    MINHASH_ROWS: int = int(os.getenv("MINHASH_ROWS", 4))
+    # Top matching corpus documents that submitted sentences are aligned against
+    CORPUS_MATCH_SOURCES: int = int(os.getenv("CORPUS_MATCH_SOURCES", 5))
+    # Seconds between checks for a replaced index file (0 = only reload on SIGHUP)
+    CORPUS_INDEX_RELOAD_INTERVAL: float = float(os.getenv("CORPUS_INDEX_RELOAD_INTERVAL", 30))
+
     # --- Heuristic/Fallback AI Detection Patterns ---
     # Patterns for basic AI content detection (used if Groq API is unavailable)
     AI_PATTERNS: List[str] = [
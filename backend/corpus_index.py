@@ -0,0 +1,600 @@
+import os
+import json
+import mmap
+import struct
+import shutil
+import heapq
+import time
+import tempfile
+from datetime import datetime
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Optional, List, Dict, Any, Tuple, Iterable, Callable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from minhash import MinHasher, estimate_jaccard
+from fingerprint import ngram_hashes
+from tfidf import TfidfModel, TermTable, MAX_NNZ, smooth_idf, row_norms, float32_array
+
+# --- Reference Corpus Index ---
+# Documents are normalized once, split into word shingles and hashed to 64-bit
+# integers with a rolling hash over per-token hashes (see fingerprint.py).
+# Posting lists keyed by shingle hash let a query retrieve only the documents
+# that share shingles with it before any exact scoring happens.
+# Each posting also records where the shingle first occurs in the document, so
+# matched passages can be localized by walking the query once (match_spans).
+# MinHash signatures bucketed by LSH band (see minhash.py) add a near-duplicate
+# tier whose lookup cost does not depend on corpus size, and a CSR term-count
+# matrix (see tfidf.py) scores TF-IDF cosine against every document at once.
+#
+# File layout (little endian, every section 8-byte aligned):
+#   header   : magic (4s), format version (I), section count (I)
+#   toc      : per section -> name (8s), offset (Q), length in bytes (Q)
+#   sections : raw array data, see SECTION_TYPES
+
+INDEX_MAGIC = b"AQIX"
+INDEX_FORMAT_VERSION = 6
+SHINGLE_SIZE = 3
+DEFAULT_MINHASH_BANDS = 16
+DEFAULT_MINHASH_ROWS = 4
+
+_HEADER = struct.Struct("<4sII")
+_TOC_ENTRY = struct.Struct("<8sQQ")
+
+# Section name -> array typecode ("B" for raw byte blobs)
+SECTION_TYPES: Dict[str, str] = {
+    "info": "B",        # utf-8 JSON build parameters (shingle size, minhash bands/rows/seed)
+    "keys": "Q",        # sorted unique shingle hashes
+    "key_offs": "Q",    # posting list boundaries, len(keys) + 1
+    "postings": "I",    # document ids, grouped by shingle hash
+    "post_pos": "I",    # token position of the shingle's first occurrence, parallel to postings
+    "text_off": "Q",    # normalized text boundaries, n_docs + 1
+    "texts": "B",       # utf-8 normalized document texts
+    "meta_off": "Q",    # metadata boundaries, n_docs + 1
+    "meta": "B",        # utf-8 JSON metadata per document
+    "minhash": "I",     # n_docs x (bands * rows) MinHash signatures
+    "lsh_keys": "Q",    # sorted unique LSH band bucket keys
+    "lsh_offs": "Q",    # bucket boundaries, len(lsh_keys) + 1
+    "lsh_docs": "I",    # document ids, grouped by bucket key
+    "vocab": "B",       # utf-8 terms sorted bytewise, term id = position
+    "vocab_of": "Q",    # term boundaries, n_terms + 1
+    "df": "I",          # document frequency per term id
+    "tf_ptr": "i",      # CSR row pointers, n_docs + 1
+    "tf_idx": "i",      # CSR column (term id) indices
+    "tf_val": "f",      # CSR raw term counts
+    "idf": "f",         # smoothed IDF per term id
+    "norms": "f",       # TF-IDF vector norm per document
+}
+
+
+class CorpusIndexError(Exception):
+    """Raised when an index file is missing sections or has an unknown format."""
+
+
+def shingle_hashes(normalized_text: str, n: int = SHINGLE_SIZE) -> array:
+    """Stable hashes of every word n-gram in an already normalized text, in text order."""
+    return ngram_hashes(normalized_text.split(), n)
+
+
+def _pad8(size: int) -> int:
+    return (8 - size % 8) % 8
+
+
+def _payload_size(payload) -> int:
+    if hasattr(payload, "fileno"):
+        payload.flush()
+        return os.fstat(payload.fileno()).st_size
+    return memoryview(payload).nbytes
+
+
+def _write_payload(f, payload):
+    if hasattr(payload, "fileno"):
+        payload.seek(0)
+        shutil.copyfileobj(payload, f, 1 << 20)
+    else:
+        f.write(payload)
+
+
+def write_index_file(path: str, sections: Dict[str, Any], version: int = INDEX_FORMAT_VERSION):
+    """
+    Atomically writes an index file made of named sections. A section may be an
+    array, any bytes-like object, or an open binary file (copied in chunks, so
+    sections spilled to disk never have to fit in memory).
+    """
+    names = list(sections.keys())
+    sizes = [_payload_size(sections[name]) for name in names]
+
+    offset = _HEADER.size + _TOC_ENTRY.size * len(names)
+    offset += _pad8(offset)
+    toc = []
+    for name, size in zip(names, sizes):
+        toc.append((name, offset, size))
+        offset += size + _pad8(size)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    temp_fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(temp_fd, "wb") as f:
+            f.write(_HEADER.pack(INDEX_MAGIC, version, len(names)))
+            for name, section_offset, length in toc:
+                f.write(_TOC_ENTRY.pack(name.encode("ascii"), section_offset, length))
+            for name, section_offset, length in toc:
+                f.write(b"\0" * (section_offset - f.tell()))
+                _write_payload(f, sections[name])
+            f.write(b"\0" * _pad8(f.tell()))
+        os.replace(temp_path, path)
+    except Exception as e:
+        os.remove(temp_path)
+        raise e
+
+
+def read_index_sections(buffer) -> Tuple[int, Dict[str, memoryview]]:
+    """Parses an index buffer into typed memoryviews without copying section data."""
+    view = memoryview(buffer)
+    if len(view) < _HEADER.size:
+        raise CorpusIndexError("Index file is truncated.")
+    magic, version, n_sections = _HEADER.unpack_from(view, 0)
+    if magic != INDEX_MAGIC:
+        raise CorpusIndexError("Not a corpus index file.")
+    if version != INDEX_FORMAT_VERSION:
+        raise CorpusIndexError(f"Unsupported index format version {version} (expected {INDEX_FORMAT_VERSION}).")
+
+    sections = {}
+    for i in range(n_sections):
+        raw_name, offset, length = _TOC_ENTRY.unpack_from(view, _HEADER.size + i * _TOC_ENTRY.size)
+        name = raw_name.rstrip(b"\0").decode("ascii")
+        typecode = SECTION_TYPES.get(name)
+        if typecode is None:
+            continue
+        section = view[offset:offset + length]
+        sections[name] = section if typecode == "B" else section.cast(typecode)
+
+    missing = [name for name in SECTION_TYPES if name not in sections]
+    if missing:
+        raise CorpusIndexError(f"Index file is missing sections: {', '.join(missing)}")
+    return version, sections
+
+
+def build_posting_table(table: Dict[int, array]) -> Tuple[array, array, array]:
+    """Flattens {key: doc ids} into sorted keys, boundary offsets and concatenated postings."""
+    keys = array("Q", sorted(table))
+    offsets = array("Q", [0])
+    postings = array("I")
+    for key in keys:
+        postings.extend(table[key])
+        offsets.append(len(postings))
+    return keys, offsets, postings
+
+
+def lookup_posting(keys, offsets, postings, key: int):
+    """Binary-searches a flattened posting table; returns an empty slice if key is absent."""
+    i = bisect_left(keys, key)
+    if i == len(keys) or keys[i] != key:
+        return postings[0:0]
+    return postings[offsets[i]:offsets[i + 1]]
+
+
+def map_index_file(path: str) -> Dict[str, memoryview]:
+    """
+    Memory-maps an index file read-only. Every process mapping the same file
+    shares its pages through the OS page cache, so per-process memory does not
+    grow with corpus size and opening is independent of file size.
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _, sections = read_index_sections(buffer)
+    return sections
+
+
+class CorpusIndexBuilder:
+    """Accumulates normalized documents in memory and serializes them as an index."""
+
+    def __init__(self, n: int = SHINGLE_SIZE, bands: int = DEFAULT_MINHASH_BANDS, rows: int = DEFAULT_MINHASH_ROWS, seed: int = 1):
+        self.n = n
+        self.minhasher = MinHasher(bands, rows, seed)
+        self.texts: List[bytes] = []
+        self.metadata: List[bytes] = []
+        self.postings: Dict[int, array] = {}
+        self.positions: Dict[int, array] = {}
+        self.signatures = array("I")
+        self.buckets: Dict[int, array] = {}
+        self.tfidf = TfidfModel()
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def add_document(self, normalized_text: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        doc_id = len(self.texts)
+        self.texts.append(normalized_text.encode("utf-8"))
+        self.metadata.append(json.dumps(metadata or {}).encode("utf-8"))
+
+        self.tfidf.add_document(normalized_text.split())
+
+        hashes = shingle_hashes(normalized_text, self.n)
+        seen = set()
+        for position, h in enumerate(hashes):
+            if h in seen:
+                continue
+            seen.add(h)
+            posting = self.postings.get(h)
+            if posting is None:
+                posting = self.postings[h] = array("I")
+                self.positions[h] = array("I")
+            posting.append(doc_id)
+            self.positions[h].append(position)
+
+        signature = self.minhasher.signature(hashes)
+        self.signatures.extend(signature)
+        if hashes:
+            for key in self.minhasher.band_keys(signature):
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = self.buckets[key] = array("I")
+                bucket.append(doc_id)
+        return doc_id
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "shingle_size": self.n,
+            "minhash_bands": self.minhasher.bands,
+            "minhash_rows": self.minhasher.rows,
+            "minhash_seed": self.minhasher.seed,
+        }
+
+    def to_sections(self) -> Dict[str, Any]:
+        keys, key_offs, postings = build_posting_table(self.postings)
+        post_pos = array("I")
+        for key in keys:
+            post_pos.extend(self.positions[key])
+        lsh_keys, lsh_offs, lsh_docs = build_posting_table(self.buckets)
+
+        text_off, meta_off = array("Q", [0]), array("Q", [0])
+        for text, meta in zip(self.texts, self.metadata):
+            text_off.append(text_off[-1] + len(text))
+            meta_off.append(meta_off[-1] + len(meta))
+
+        sections = {
+            "info": json.dumps(self.info()).encode("utf-8"),
+            "keys": keys,
+            "key_offs": key_offs,
+            "postings": postings,
+            "post_pos": post_pos,
+            "text_off": text_off,
+            "texts": b"".join(self.texts),
+            "meta_off": meta_off,
+            "meta": b"".join(self.metadata),
+            "minhash": self.signatures,
+            "lsh_keys": lsh_keys,
+            "lsh_offs": lsh_offs,
+            "lsh_docs": lsh_docs,
+        }
+        sections.update(self.tfidf.to_sections())
+        return sections
+
+    def save(self, path: str):
+        write_index_file(path, self.to_sections())
+
+    def build(self) -> "CorpusIndex":
+        """Returns a read-only in-memory index without touching disk."""
+        return CorpusIndex(self.to_sections())
+
+
+class CorpusIndex:
+    """Read-only inverted index, LSH table and TF-IDF matrix over a reference corpus."""
+
+    def __init__(self, sections: Dict[str, Any], path: Optional[str] = None):
+        self.path = path
+        self.info = json.loads(bytes(sections["info"]))
+        self.n = self.info["shingle_size"]
+        self.minhasher = MinHasher(self.info["minhash_bands"], self.info["minhash_rows"], self.info["minhash_seed"])
+        self.keys = sections["keys"]
+        self.key_offs = sections["key_offs"]
+        self.postings = sections["postings"]
+        self.post_pos = sections["post_pos"]
+        self.text_off = sections["text_off"]
+        self.texts = sections["texts"]
+        self.meta_off = sections["meta_off"]
+        self.meta = sections["meta"]
+        self.signatures = sections["minhash"]
+        self.lsh_keys = sections["lsh_keys"]
+        self.lsh_offs = sections["lsh_offs"]
+        self.lsh_docs = sections["lsh_docs"]
+        self.tfidf = TfidfModel(sections)
+
+    @classmethod
+    def load(cls, path: str) -> "CorpusIndex":
+        return cls(map_index_file(path), path=path)
+
+    def __len__(self) -> int:
+        return len(self.text_off) - 1
+
+    def get_text(self, doc_id: int) -> str:
+        return bytes(self.texts[self.text_off[doc_id]:self.text_off[doc_id + 1]]).decode("utf-8")
+
+    def get_metadata(self, doc_id: int) -> Dict[str, Any]:
+        return json.loads(bytes(self.meta[self.meta_off[doc_id]:self.meta_off[doc_id + 1]]))
+
+    def get_signature(self, doc_id: int):
+        width = self.minhasher.num_perm
+        return self.signatures[doc_id * width:(doc_id + 1) * width]
+
+    def lookup(self, shingle_hash: int):
+        """Posting list (document ids) for one shingle hash; empty if unseen."""
+        return lookup_posting(self.keys, self.key_offs, self.postings, shingle_hash)
+
+    def candidates(self, query_hashes: Iterable[int], limit: int = 50, max_posting_length: int = 0) -> List[Tuple[int, int]]:
+        """
+        Documents sharing shingles with the query as (doc_id, shared_count),
+        most overlapping first. Shingles whose posting list is longer than
+        max_posting_length (boilerplate phrases) are skipped when it is set.
+        """
+        shared = Counter()
+        for h in set(query_hashes):
+            posting = self.lookup(h)
+            if max_posting_length and len(posting) > max_posting_length:
+                continue
+            shared.update(posting)
+        return shared.most_common(limit)
+
+    def near_duplicates(self, query_hashes: List[int], limit: int = 50, min_similarity: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Documents landing in at least one LSH band bucket with the query, as
+        (doc_id, estimated_jaccard), most similar first. Cost grows with the
+        number of bands, not the corpus size.
+        """
+        if not query_hashes:
+            return []
+        signature = self.minhasher.signature(query_hashes)
+        found = set()
+        for key in self.minhasher.band_keys(signature):
+            found.update(lookup_posting(self.lsh_keys, self.lsh_offs, self.lsh_docs, key))
+
+        scored = []
+        for doc_id in found:
+            estimate = estimate_jaccard(signature, self.get_signature(doc_id))
+            if estimate >= min_similarity:
+                scored.append((doc_id, estimate))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+    def match_spans(self, query_hashes: List[int], doc_ids: Iterable[int], max_posting_length: int = 0) -> Dict[int, List[List[int]]]:
+        """
+        Aligns the query against the given documents in a single pass over its
+        shingles (query_hashes[i] starts at query token i). Overlapping or
+        adjacent matched shingles are merged as they are met, giving per document
+        a sorted list of [query_start, query_end, source_start] token spans.
+        """
+        targets = sorted(set(doc_ids))
+        target_set = set(targets)
+        spans: Dict[int, List[List[int]]] = {doc_id: [] for doc_id in targets}
+        if not targets:
+            return spans
+
+        def extend(doc_id, i, k):
+            doc_spans = spans[doc_id]
+            if doc_spans and i <= doc_spans[-1][1]:
+                doc_spans[-1][1] = i + self.n
+            else:
+                doc_spans.append([i, i + self.n, self.post_pos[k]])
+
+        for i, h in enumerate(query_hashes):
+            slot = bisect_left(self.keys, h)
+            if slot == len(self.keys) or self.keys[slot] != h:
+                continue
+            lo, hi = self.key_offs[slot], self.key_offs[slot + 1]
+            if max_posting_length and hi - lo > max_posting_length:
+                continue
+            if hi - lo <= 4 * len(targets):
+                for k in range(lo, hi):
+                    if self.postings[k] in target_set:
+                        extend(self.postings[k], i, k)
+            else:
+                # Long posting list: binary-search it for each target instead of scanning
+                for doc_id in targets:
+                    k = bisect_left(self.postings, doc_id, lo, hi)
+                    if k < hi and self.postings[k] == doc_id:
+                        extend(doc_id, i, k)
+        return spans
+
+
+class ReloadableCorpusIndex:
+    """
+    Holds the currently mapped index and swaps in a new one when the file on
+    disk is replaced (the ingestion tool renames a complete file into place).
+    The file is mapped by reload() or, failing that, on first access.
+    A swap happens on the next access after request_reload() -- wired to
+    SIGHUP by the API -- or after check_interval seconds notice a new inode.
+    In-flight queries keep the old mapping alive until they finish.
+    """
+
+    def __init__(self, path: str, fallback: Callable[[], CorpusIndex], check_interval: float = 30.0):
+        self.path = path
+        self.fallback = fallback
+        self.check_interval = check_interval
+        self._index: Optional[CorpusIndex] = None
+        self._stamp = None
+        self._reload_requested = False
+        self._next_check = time.monotonic() + check_interval
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def reload(self) -> bool:
+        try:
+            stamp = self._file_stamp()
+            index = CorpusIndex.load(self.path)
+        except Exception as e:
+            print(f"WARNING: Failed to load corpus index '{self.path}': {e}")
+            if self._index is None:
+                print("WARNING: Falling back to built-in corpus.")
+                self._index = self.fallback()
+            return False
+        self._index, self._stamp = index, stamp
+        print(f"Loaded corpus index '{self.path}' ({len(index)} documents).")
+        return True
+
+    def request_reload(self):
+        """Async-signal safe: only flags the reload, the swap happens on next access."""
+        self._reload_requested = True
+
+    def current(self) -> CorpusIndex:
+        if self._index is None:
+            self.reload()
+        now = time.monotonic()
+        if self._reload_requested or (self.check_interval and now >= self._next_check):
+            requested, self._reload_requested = self._reload_requested, False
+            self._next_check = now + self.check_interval
+            try:
+                changed = self._file_stamp() != self._stamp
+            except OSError:
+                changed = False
+            if requested or changed:
+                self.reload()
+        return self._index
+
+
+# --- Segment Merging (used by the offline ingestion tool) ---
+
+_SPILL_ITEMS = 1 << 16
+
+
+def _remap(values, table) -> array:
+    """Maps every value through a lookup table (vectorized when numpy is available)."""
+    if np is not None and len(values):
+        return array("i", np.asarray(table, dtype=np.int32)[np.frombuffer(values, dtype=np.int32)].tobytes())
+    return array("i", (table[v] for v in values))
+
+
+def _merge_posting_tables(tables, doc_bases, keys_out, offs_out, postings_out, values_out=None):
+    """
+    K-way merges sorted (keys, offsets, postings[, values]) tables. Postings of
+    equal keys are concatenated in segment order, so document ids stay ascending;
+    per-posting values (positions) are copied alongside them when values_out is given.
+    """
+    def stream(i, keys):
+        return ((keys[j], i, j) for j in range(len(keys)))
+
+    keys_buf, offs_buf = array("Q"), array("Q", [0])
+    total = 0
+    current = None
+    for key, i, j in heapq.merge(*(stream(i, table[0]) for i, table in enumerate(tables))):
+        if key != current:
+            if current is not None:
+                keys_buf.append(current)
+                offs_buf.append(total)
+            current = key
+        offs, postings = tables[i][1], tables[i][2]
+        chunk = postings[offs[j]:offs[j + 1]]
+        postings_out.write(array("I", (d + doc_bases[i] for d in chunk)))
+        if values_out is not None:
+            values_out.write(tables[i][3][offs[j]:offs[j + 1]])
+        total += len(chunk)
+        if len(keys_buf) >= _SPILL_ITEMS:
+            keys_out.write(keys_buf)
+            offs_out.write(offs_buf)
+            keys_buf, offs_buf = array("Q"), array("Q")
+    if current is not None:
+        keys_buf.append(current)
+        offs_buf.append(total)
+    keys_out.write(keys_buf)
+    offs_out.write(offs_buf)
+
+
+def merge_index_files(segment_paths: List[str], output_path: str, work_dir: Optional[str] = None) -> int:
+    """
+    Streams index segments into a single index, renumbering documents in segment
+    order. Only merge heads, the global document-frequency table and one
+    segment's term remap are held in memory; every other section is spilled to
+    temporary files and copied into the final file. Returns the document count.
+    """
+    segments = [map_index_file(path) for path in segment_paths]
+    infos = [json.loads(bytes(seg["info"])) for seg in segments]
+    build_keys = ("shingle_size", "minhash_bands", "minhash_rows", "minhash_seed")
+    if any(tuple(info.get(k) for k in build_keys) != tuple(infos[0].get(k) for k in build_keys) for info in infos):
+        raise CorpusIndexError("Segments were built with different shingle/MinHash parameters.")
+
+    doc_bases = []
+    n_docs = 0
+    for seg in segments:
+        doc_bases.append(n_docs)
+        n_docs += len(seg["text_off"]) - 1
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as work:
+        def spill(name):
+            return open(os.path.join(work, name), "w+b")
+
+        out = {name: spill(name) for name in SECTION_TYPES if name != "info"}
+
+        # Documents: blobs are concatenated, boundary arrays shifted by the running total
+        for blob, offsets in (("texts", "text_off"), ("meta", "meta_off")):
+            out[offsets].write(array("Q", [0]))
+            base = 0
+            for seg in segments:
+                out[blob].write(seg[blob])
+                out[offsets].write(array("Q", (base + o for o in seg[offsets][1:])))
+                base += seg[offsets][-1]
+        for seg in segments:
+            out["minhash"].write(seg["minhash"])
+
+        _merge_posting_tables(
+            [(seg["keys"], seg["key_offs"], seg["postings"], seg["post_pos"]) for seg in segments],
+            doc_bases, out["keys"], out["key_offs"], out["postings"], out["post_pos"]
+        )
+        _merge_posting_tables([(seg["lsh_keys"], seg["lsh_offs"], seg["lsh_docs"]) for seg in segments], doc_bases, out["lsh_keys"], out["lsh_offs"], out["lsh_docs"])
+
+        # Vocabulary: merge the sorted term tables; each segment's local -> global
+        # term id table is written in local id order and only loaded when its rows are copied
+        remap_files = [spill(f"remap_{i}") for i in range(len(segments))]
+        tables = [TermTable(seg["vocab"], seg["vocab_of"]) for seg in segments]
+
+        def stream(i, table):
+            return ((table[j], i, j) for j in range(len(table)))
+
+        df = array("I")
+        vocab_end = 0
+        out["vocab_of"].write(array("Q", [0]))
+        current = None
+        for term, i, j in heapq.merge(*(stream(i, table) for i, table in enumerate(tables))):
+            if term != current:
+                current = term
+                df.append(0)
+                out["vocab"].write(term)
+                vocab_end += len(term)
+                out["vocab_of"].write(array("Q", [vocab_end]))
+            df[-1] += segments[i]["df"][j]
+            remap_files[i].write(array("i", [len(df) - 1]))
+        out["df"].write(df)
+
+        idf = smooth_idf(df, n_docs)
+        out["idf"].write(float32_array(idf))
+        out["tf_ptr"].write(array("i", [0]))
+        base = 0
+        for seg, remap_file in zip(segments, remap_files):
+            remap_file.seek(0)
+            remap = array("i")
+            remap.frombytes(remap_file.read())
+            indices = _remap(seg["tf_idx"], remap)
+            if base + len(indices) > MAX_NNZ:
+                raise CorpusIndexError("Corpus exceeds the int32 CSR capacity of a single index; split it into several indexes.")
+            out["tf_idx"].write(indices)
+            out["tf_val"].write(seg["tf_val"])
+            out["tf_ptr"].write(array("i", (base + p for p in seg["tf_ptr"][1:])))
+            out["norms"].write(float32_array(row_norms(seg["tf_ptr"], indices, seg["tf_val"], idf, len(df))))
+            base += seg["tf_ptr"][-1]
+
+        info = dict(infos[0])
+        info["documents"] = n_docs
+        info["built_at"] = datetime.now().isoformat()
+        sections = {"info": json.dumps(info).encode("utf-8")}
+        sections.update(out)
+        write_index_file(output_path, sections)
+
+        for f in list(out.values()) + remap_files:
+            f.close()
+    return n_docs
@@ -0,0 +1,126 @@
+import hashlib
+from array import array
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print("WARNING: numpy library not found. Fingerprints will be computed in pure Python.")
+
+# --- Rolling-Hash Fingerprinting ---
+# Every token is hashed once to a stable 64-bit value; word n-gram hashes are
+# then rolled over those integers Rabin-Karp style (polynomial mod 2**64,
+# followed by a bit mixer), so no n-gram string is ever built. Winnowing keeps
+# the minimum hash of every window of consecutive n-grams, a sparse fingerprint
+# set that still catches any shared passage of at least window + n - 1 words
+# regardless of where it sits in either text.
+
+ROLLING_BASE = 0x100000001B3  # odd multiplier; arithmetic wraps at 64 bits
+DEFAULT_WINNOW_WINDOW = 4
+_MASK64 = (1 << 64) - 1
+
+
+@lru_cache(maxsize=1 << 16)
+def token_hash(token: str) -> int:
+    """Stable 64-bit hash of one token (identical across processes and restarts)."""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def token_hashes(tokens: Sequence[str]) -> array:
+    return array("Q", map(token_hash, tokens))
+
+
+def _mix64(h: int) -> int:
+    h ^= h >> 30
+    h = (h * 0xBF58476D1CE4E5B9) & _MASK64
+    h ^= h >> 27
+    h = (h * 0x94D049BB133111EB) & _MASK64
+    return h ^ (h >> 31)
+
+
+def _np_mix64(h):
+    h = h ^ (h >> np.uint64(30))
+    h = h * np.uint64(0xBF58476D1CE4E5B9)
+    h = h ^ (h >> np.uint64(27))
+    h = h * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def rolling_hashes(hashes: Sequence[int], n: int) -> array:
+    """64-bit hash of every window of n token hashes, in order; identical with or without numpy."""
+    count = len(hashes) - n + 1
+    if count <= 0:
+        return array("Q")
+    if np is not None:
+        values = np.frombuffer(hashes, dtype=np.uint64) if isinstance(hashes, array) else np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+        # Horner's rule over n shifted views; uint64 array arithmetic wraps like the loop below
+        rolled = values[:count].copy()
+        for j in range(1, n):
+            rolled = rolled * np.uint64(ROLLING_BASE) + values[j:j + count]
+        return array("Q", _np_mix64(rolled).tobytes())
+
+    top = pow(ROLLING_BASE, n - 1, 1 << 64)
+    h = 0
+    for j in range(n):
+        h = (h * ROLLING_BASE + hashes[j]) & _MASK64
+    out = array("Q", [_mix64(h)])
+    for i in range(1, count):
+        h = ((h - hashes[i - 1] * top) * ROLLING_BASE + hashes[i + n - 1]) & _MASK64
+        out.append(_mix64(h))
+    return out
+
+
+def ngram_hashes(tokens: Sequence[str], n: int) -> array:
+    """Rolling hashes of every word n-gram of a token list."""
+    return rolling_hashes(token_hashes(tokens), n)
+
+
+def winnow(hashes: Sequence[int], window: int = DEFAULT_WINNOW_WINDOW) -> Tuple[array, array]:
+    """
+    Selects the minimum hash of every window of consecutive hashes (the
+    rightmost one on ties), recording each selected position once.
+    Returns (fingerprints, positions) as array('Q') / array('I').
+    """
+    count = len(hashes)
+    if not count:
+        return array("Q"), array("I")
+    window = max(1, min(window, count))
+    if np is not None:
+        values = np.frombuffer(hashes, dtype=np.uint64) if isinstance(hashes, array) else np.asarray(hashes, dtype=np.uint64)
+        windows = np.lib.stride_tricks.sliding_window_view(values, window)
+        picks = np.arange(len(windows)) + (window - 1 - np.argmin(windows[:, ::-1], axis=1))
+        keep = np.ones(len(picks), dtype=bool)
+        keep[1:] = picks[1:] != picks[:-1]
+        picks = picks[keep]
+        return array("Q", values[picks].tobytes()), array("I", picks.astype(np.uint32).tobytes())
+
+    fingerprints, positions = array("Q"), array("I")
+    last = -1
+    for start in range(count - window + 1):
+        pick = start
+        for i in range(start + 1, start + window):
+            if hashes[i] <= hashes[pick]:
+                pick = i
+        if pick != last:
+            fingerprints.append(hashes[pick])
+            positions.append(pick)
+            last = pick
+    return fingerprints, positions
+
+
+def fingerprint(tokens: Sequence[str], n: int, window: int = DEFAULT_WINNOW_WINDOW) -> Tuple[array, array]:
+    """Winnowed n-gram fingerprints of a token list as (hashes, n-gram positions)."""
+    return winnow(ngram_hashes(tokens, n), window)
+
+
+def split_by_position(fingerprints: Sequence[int], positions: Sequence[int], chunk_size: int) -> List[array]:
+    """Groups fingerprints into consecutive chunk_size-token chunks by their start position."""
+    chunks: List[array] = []
+    for h, position in zip(fingerprints, positions):
+        chunk = position // chunk_size
+        while len(chunks) <= chunk:
+            chunks.append(array("Q"))
+        chunks[chunk].append(h)
+    return chunks
@@ -0,0 +1,124 @@
+"""
+Builds the local plagiarism reference index from directories of TXT/PDF/DOCX files.
+
+    python -m ingest_corpus /data/corpus [/more/dirs ...] --output corpus_index.aqix --workers 32
+
+Files are discovered lazily, grouped into shards and processed by a pool of
+worker processes. Each worker extracts and normalizes its shard with the same
+code the API uses and writes a small index segment to disk; the segments are
+then stream-merged into one versioned, memory-mappable index file that is
+atomically renamed into place. Neither the file list nor the corpus text is
+ever held in memory as a whole.
+
+Running API workers memory-map the new file within CORPUS_INDEX_RELOAD_INTERVAL
+seconds, or immediately when the worker processes receive SIGHUP.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, List, Tuple
+
+from config import config
+from corpus_index import CorpusIndexBuilder, merge_index_files
+from text_processing import EXTENSION_CONTENT_TYPES, extract_text, normalize_text
+
+
+def iter_corpus_files(roots: List[str]) -> Iterator[str]:
+    """Yields supported files under the given roots, walking directories lazily."""
+    for root in roots:
+        if os.path.isfile(root):
+            yield root
+            continue
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if os.path.splitext(filename)[1].lower() in EXTENSION_CONTENT_TYPES:
+                    yield os.path.join(dirpath, filename)
+
+
+def iter_shards(paths: Iterator[str], shard_size: int) -> Iterator[List[str]]:
+    shard = []
+    for path in paths:
+        shard.append(path)
+        if len(shard) >= shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def build_segment(paths: List[str], segment_path: str, bands: int, rows: int) -> Tuple[str, int, int]:
+    """Worker: indexes one shard of files into a segment file. Returns (path, indexed, failed)."""
+    builder = CorpusIndexBuilder(bands=bands, rows=rows)
+    failed = 0
+    for path in paths:
+        content_type = EXTENSION_CONTENT_TYPES.get(os.path.splitext(path)[1].lower())
+        try:
+            with open(path, "rb") as f:
+                normalized = normalize_text(extract_text(f.read(), content_type))
+        except Exception as e:
+            print(f"WARNING: Skipping {path}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        if not normalized:
+            failed += 1
+            continue
+        builder.add_document(normalized, {"source_id": path, "title": os.path.basename(path)})
+    builder.save(segment_path)
+    return segment_path, len(builder), failed
+
+
+def ingest(roots: List[str], output: str, workers: int, shard_size: int, work_dir: str = None) -> int:
+    started = time.time()
+    indexed = failed = 0
+    segment_paths = []
+
+    with tempfile.TemporaryDirectory(dir=work_dir, prefix="corpus_segments_") as segment_dir:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            shards = iter_shards(iter_corpus_files(roots), shard_size)
+            for shard_no, shard in enumerate(shards):
+                # Bound in-flight shards so the file list is never materialized
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        segment_path, ok, bad = future.result()
+                        segment_paths.append(segment_path)
+                        indexed, failed = indexed + ok, failed + bad
+                        print(f"Indexed {indexed} documents ({failed} skipped)...")
+                segment_path = os.path.join(segment_dir, f"segment_{shard_no:06d}.aqix")
+                pending.add(pool.submit(build_segment, shard, segment_path, config.MINHASH_BANDS, config.MINHASH_ROWS))
+            for future in pending:
+                segment_path, ok, bad = future.result()
+                segment_paths.append(segment_path)
+                indexed, failed = indexed + ok, failed + bad
+
+        if not segment_paths:
+            print("No supported documents found; index left unchanged.")
+            return 0
+
+        # Document ids follow shard order regardless of completion order
+        segment_paths.sort()
+        print(f"Merging {len(segment_paths)} segments into {output}...")
+        total = merge_index_files(segment_paths, output, work_dir=work_dir or segment_dir)
+
+    print(f"Done: {total} documents indexed, {failed} skipped in {time.time() - started:.1f}s.")
+    return total
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Build the local plagiarism reference corpus index.")
+    parser.add_argument("roots", nargs="+", help="Directories (or files) containing TXT, PDF or DOCX documents.")
+    parser.add_argument("--output", "-o", default=config.CORPUS_INDEX_FILE, help="Index file to write (atomically replaced).")
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1, help="Worker processes.")
+    parser.add_argument("--shard-size", type=int, default=2000, help="Documents per worker shard.")
+    parser.add_argument("--work-dir", default=None, help="Directory for temporary segment files (defaults to the system temp dir).")
+    args = parser.parse_args(argv)
+
+    ingest(args.roots, args.output, args.workers, args.shard_size, args.work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import time
+import json
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+from admission import AdmissionController, AdmissionRejected, PRIORITY_INTERACTIVE, current_priority
+
+# --- Multi-Backend LLM Router ---
+# Holds every configured LLM backend (Groq models, Ollama endpoints) and sends
+# each call to the fastest healthy one. Every backend keeps a rolling window of
+# latencies (full completions and stream time-to-first-token separately) and
+# outcomes; repeated failures or a high error rate take it out of rotation for
+# a cooldown. A failed attempt (transport error, 5xx, 429, admission rejection)
+# fails over to the next backend; hedged calls also start the runner-up once
+# the first choice has been slower than its own p95, and the first answer wins.
+# Each backend has its own admission controller, so a 429 from Groq only
+# pauses Groq. llm_stub_server.py can stand in for both providers locally.
+
+
+class BackendError(Exception):
+    """A backend failed in a way another backend (or a later retry) might not."""
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0, maximum: float = 30.0) -> float:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), capped at maximum."""
+    seconds = default
+    if value:
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                pass
+    return min(max(seconds, 0.0), maximum)
+
+
+def _percentile(values: Deque[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LLMBackend:
+    """One upstream (a Groq model or an Ollama endpoint) with its health and latency statistics."""
+
+    KINDS = ("groq", "ollama")
+
+    def __init__(self, name: str, kind: str, url: str, model: str, api_key: str = "", timeout: float = 30.0,
+                 admission: Optional[AdmissionController] = None, window: int = 100, cooldown: float = 30.0,
+                 failure_threshold: int = 3, max_error_rate: float = 0.5):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown LLM backend kind: {kind!r}")
+        self.name = name
+        self.kind = kind
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.admission = admission or AdmissionController()
+        self.cooldown = cooldown
+        self.failure_threshold = failure_threshold
+        self.max_error_rate = max_error_rate
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.first_token_latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.trips = 0
+
+    # --- Wire format ---
+    def request(self, messages: List[Dict[str, str]], temperature: float, max_tokens: Optional[int],
+                response_format: Optional[dict], stream: bool) -> Dict[str, Any]:
+        """Keyword arguments for client.post / client.stream."""
+        if self.kind == "ollama":
+            payload = {"model": self.model, "messages": messages, "stream": stream, "options": {"temperature": temperature}}
+            if max_tokens:
+                payload["options"]["num_predict"] = max_tokens
+            if response_format:
+                payload["format"] = "json"
+            return {"url": self.url, "json": payload, "timeout": self.timeout}
+
+        body = {"model": self.model, "messages": messages, "temperature": temperature}
+        if max_tokens:
+            body["max_tokens"] = max_tokens
+        if response_format:
+            body["response_format"] = response_format
+        if stream:
+            body["stream"] = True
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        return {"url": self.url, "headers": headers, "json": body, "timeout": self.timeout}
+
+    def parse_completion(self, data: Dict[str, Any]) -> str:
+        if self.kind == "ollama":
+            return data["message"]["content"]
+        return data["choices"][0]["message"]["content"]
+
+    def parse_stream_line(self, line: str) -> Tuple[Optional[str], bool]:
+        """(delta, done) for one line of a streamed response (Groq SSE / Ollama NDJSON)."""
+        if self.kind == "ollama":
+            if not line.strip():
+                return None, False
+            data = json.loads(line)
+            return (data.get("message") or {}).get("content"), bool(data.get("done"))
+        if not line.startswith("data:"):
+            return None, False
+        payload = line[5:].strip()
+        if payload == "[DONE]":
+            return None, True
+        choices = json.loads(payload).get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content"), False
+
+    # --- Health ---
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until and not self.admission.paused
+
+    def record_success(self, latency: float, streaming: bool):
+        (self.first_token_latencies if streaming else self.latencies).append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.requests += 1
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self.requests += 1
+        self.failures += 1
+        if self.consecutive_failures >= self.failure_threshold or (len(self.outcomes) >= 5 and self.error_rate > self.max_error_rate):
+            self.unhealthy_until = time.monotonic() + self.cooldown
+            self.trips += 1
+
+    def _window(self, streaming: bool) -> Deque[float]:
+        window = self.first_token_latencies if streaming else self.latencies
+        return window if window else (self.latencies if streaming else self.first_token_latencies)
+
+    def score(self, streaming: bool) -> float:
+        """Rolling p50 latency; untried backends score 0 so they get measured."""
+        p50 = _percentile(self._window(streaming), 0.5)
+        return p50 if p50 is not None else 0.0
+
+    def hedge_delay(self, streaming: bool, minimum: float, maximum: float) -> float:
+        """How long to wait before hedging: this backend's p95, within [minimum, maximum]."""
+        window = self._window(streaming)
+        if len(window) < 5:
+            return maximum
+        return min(max(_percentile(window, 0.95), minimum), maximum)
+
+    def stats(self) -> Dict[str, Any]:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "kind": self.kind,
+            "model": self.model,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 4),
+            "trips": self.trips,
+            "latency_p50_ms": ms(_percentile(self.latencies, 0.5)),
+            "latency_p95_ms": ms(_percentile(self.latencies, 0.95)),
+            "first_token_p50_ms": ms(_percentile(self.first_token_latencies, 0.5)),
+            "first_token_p95_ms": ms(_percentile(self.first_token_latencies, 0.95)),
+            "admission": self.admission.stats(),
+        }
+
+
+class LLMRouter:
+    """Routes completions to the fastest healthy backend, with failover and optional hedging."""
+
+    def __init__(self, backends: List[LLMBackend], client_factory: Callable[[], httpx.AsyncClient],
+                 max_retries: int = 2, hedge_min_delay: float = 0.25, hedge_max_delay: float = 5.0,
+                 retry_after_default: float = 1.0, retry_after_max: float = 30.0):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = backends
+        self.client_factory = client_factory
+        self.max_retries = max_retries
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.retry_after_default = retry_after_default
+        self.retry_after_max = retry_after_max
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def ranked(self, streaming: bool = False) -> List[LLMBackend]:
+        """Healthy backends first, fastest first; configuration order breaks ties."""
+        order = {id(backend): i for i, backend in enumerate(self.backends)}
+        return sorted(self.backends, key=lambda b: (not b.healthy, b.score(streaming), order[id(b)]))
+
+    def _plan(self, streaming: bool) -> List[LLMBackend]:
+        # Each backend once in rank order; a lone backend is retried (e.g. after its Retry-After pause)
+        ranked = self.ranked(streaming)
+        attempts = max(len(ranked), self.max_retries + 1)
+        return [ranked[i % len(ranked)] for i in range(attempts)]
+
+    def _upstream_failure(self, backend: LLMBackend, permit, response: httpx.Response):
+        """Raises BackendError for a 429 / 5xx (recording it); other 4xx are the request's fault."""
+        if response.status_code == 429:
+            permit.throttle(parse_retry_after(response.headers.get("Retry-After"), self.retry_after_default, self.retry_after_max))
+            backend.record_failure()
+            raise BackendError(f"{backend.name}: rate limited (429)")
+        if response.status_code >= 500:
+            backend.record_failure()
+            raise BackendError(f"{backend.name}: HTTP {response.status_code}")
+        response.raise_for_status()
+
+    async def _complete_on(self, backend: LLMBackend, messages, temperature, max_tokens, response_format) -> str:
+        async with backend.admission.slot() as permit:
+            try:
+                response = await self.client_factory().post(**backend.request(messages, temperature, max_tokens, response_format, stream=False))
+            except httpx.TransportError as e:
+                backend.record_failure()
+                raise BackendError(f"{backend.name}: {e!r}") from e
+            permit.mark_latency()
+            self._upstream_failure(backend, permit, response)
+            content = backend.parse_completion(response.json())
+            backend.record_success(permit.latency, streaming=False)
+            return content
+
+    async def _stream_on(self, backend: LLMBackend, messages, temperature, max_tokens) -> AsyncIterator[str]:
+        async with backend.admission.slot() as permit:
+            try:
+                async with self.client_factory().stream("POST", **backend.request(messages, temperature, max_tokens, None, stream=True)) as response:
+                    self._upstream_failure(backend, permit, response)
+                    async for line in response.aiter_lines():
+                        delta, done = backend.parse_stream_line(line)
+                        if delta:
+                            if permit.latency is None:
+                                # A stream's latency is its time to first token
+                                permit.mark_latency()
+                                backend.record_success(permit.latency, streaming=True)
+                            yield delta
+                        if done:
+                            break
+                    if permit.latency is None:
+                        permit.mark_latency()
+                        backend.record_success(permit.latency, streaming=True)
+            except httpx.TransportError as e:
+                backend.record_failure()
+                raise BackendError(f"{backend.name}: {e!r}") from e
+
+    async def _open_stream(self, backend: LLMBackend, messages, temperature, max_tokens) -> Tuple[AsyncIterator[str], Optional[str]]:
+        """Starts a stream and waits for its first token, so failover and hedging can act before output."""
+        stream = self._stream_on(backend, messages, temperature, max_tokens)
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            return stream, None
+        except BaseException:
+            await stream.aclose()
+            raise
+        return stream, first
+
+    async def _failover(self, plan: List[LLMBackend], run: Callable[[LLMBackend], Awaitable[Any]], streaming: bool,
+                        hedge: bool, discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> Any:
+        """Runs run(backend) down the plan until one succeeds, hedging with the next backend if asked."""
+        hedge = hedge and current_priority.get() == PRIORITY_INTERACTIVE
+        plan = list(plan)
+        last_error: Optional[BaseException] = None
+        while plan:
+            backend = plan.pop(0)
+            runs = {asyncio.ensure_future(run(backend)): backend}
+            hedge_with = plan[0] if hedge and plan and plan[0] is not backend and plan[0].healthy else None
+            try:
+                while runs:
+                    delay = backend.hedge_delay(streaming, self.hedge_min_delay, self.hedge_max_delay) if hedge_with else None
+                    done, _ = await asyncio.wait(runs, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        # The first choice is slower than its p95: race the runner-up
+                        self.hedges += 1
+                        plan.pop(0)
+                        runs[asyncio.ensure_future(run(hedge_with))] = hedge_with
+                        hedge_with = None
+                        continue
+                    winners = []
+                    for task in done:
+                        finished = runs.pop(task)
+                        error = task.exception()
+                        if error is None:
+                            winners.append((task, finished))
+                        elif isinstance(error, (BackendError, AdmissionRejected)):
+                            print(f"WARNING: LLM backend '{finished.name}' failed: {error}")
+                            last_error = error
+                            self.failovers += 1
+                        else:
+                            raise error
+                    if winners:
+                        for task, _ in winners[1:]:
+                            if discard:
+                                await discard(task.result())
+                        task, finished = winners[0]
+                        if finished is not backend:
+                            self.hedge_wins += 1
+                        return task.result()
+                    # The first choice failed before a hedge started: the next backend gets its own turn
+                    hedge_with = None
+            finally:
+                for task in runs:
+                    task.cancel()
+        raise last_error
+
+    async def complete(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: Optional[int] = None,
+                       response_format: Optional[dict] = None, hedge: bool = False) -> str:
+        """The completion text from the first backend that answers."""
+        return await self._failover(
+            self._plan(streaming=False),
+            lambda backend: self._complete_on(backend, messages, temperature, max_tokens, response_format),
+            streaming=False, hedge=hedge
+        )
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: Optional[int] = None,
+                     hedge: bool = False) -> AsyncIterator[str]:
+        """Yields completion pieces; failover and hedging apply until the first token has arrived."""
+        async def discard(opened):
+            await opened[0].aclose()
+
+        stream, first = await self._failover(
+            self._plan(streaming=True),
+            lambda backend: self._open_stream(backend, messages, temperature, max_tokens),
+            streaming=True, hedge=hedge, discard=discard
+        )
+        try:
+            if first is not None:
+                yield first
+            async for delta in stream:
+                yield delta
+        finally:
+            await stream.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "backends": {backend.name: backend.stats() for backend in self.backends},
+        }
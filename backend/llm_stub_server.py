@@ -0,0 +1,110 @@
+"""
+Local stand-in for the LLM providers, for exercising the router without network access.
+
+    python -m llm_stub_server --port 9100 --latency 0.2 --jitter 0.1 --error-rate 0.05
+
+Serves Groq's OpenAI-style /openai/v1/chat/completions (JSON, or Server-Sent
+Events with "stream": true) and Ollama's /api/chat (JSON, or NDJSON when
+streaming) from the same process, with configurable latency, failures and 429s.
+Point LLM_BACKENDS at one or more instances, e.g.
+
+    LLM_BACKENDS='[{"name": "groq-stub", "kind": "groq", "url": "http://127.0.0.1:9100/openai/v1/chat/completions", "model": "stub", "api_key": "x"},
+                   {"name": "ollama-stub", "kind": "ollama", "url": "http://127.0.0.1:9101/api/chat", "model": "stub"}]'
+"""
+import json
+import random
+import asyncio
+import argparse
+from typing import List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(latency: float = 0.2, jitter: float = 0.0, token_delay: float = 0.02,
+               error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 1.0) -> FastAPI:
+    app = FastAPI(title="LLM stub")
+    app.state.requests = 0
+
+    def reply_tokens(body: dict) -> List[str]:
+        user = next((m["content"] for m in reversed(body.get("messages", [])) if m.get("role") == "user"), "")
+        if body.get("response_format") or body.get("format") == "json":
+            # Same schema as a plagiarism chunk verdict (see fetch_chunk_verdict / merge_chunk_verdicts)
+            return [json.dumps({"originality_level": "High", "similarity_range": "0-10%", "reasoning": "Stub verdict.",
+                                "suspected_patterns": [], "mock_sources": []})]
+        words = f"Stub reply ({len(body.get('messages', []))} messages) to: {user[:60]}".split(" ")
+        return [word + " " for word in words[:-1]] + words[-1:]
+
+    async def failure():
+        """Waits out the simulated latency; returns an error response or None."""
+        app.state.requests += 1
+        await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+        roll = random.random()
+        if roll < rate_limit_rate:
+            return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": str(retry_after)})
+        if roll < rate_limit_rate + error_rate:
+            return JSONResponse({"error": "stub failure"}, status_code=503)
+        return None
+
+    @app.post("/openai/v1/chat/completions")
+    async def groq_chat(request: Request):
+        body = await request.json()
+        error = await failure()
+        if error:
+            return error
+        tokens = reply_tokens(body)
+        if not body.get("stream"):
+            return {"choices": [{"message": {"role": "assistant", "content": "".join(tokens)}}]}
+
+        async def events():
+            for token in tokens:
+                yield "data: " + json.dumps({"choices": [{"delta": {"content": token}}]}) + "\n\n"
+                await asyncio.sleep(token_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        body = await request.json()
+        error = await failure()
+        if error:
+            return error
+        tokens = reply_tokens(body)
+        if not body.get("stream", True):
+            return {"message": {"role": "assistant", "content": "".join(tokens)}, "done": True}
+
+        async def lines():
+            for token in tokens:
+                yield json.dumps({"message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+                await asyncio.sleep(token_delay)
+            yield json.dumps({"message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Stub Groq/Ollama server for testing the LLM router.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the response (or first token).")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- seconds added to the latency.")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed tokens.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 503.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429.")
+    args = parser.parse_args(argv)
+
+    app = create_app(args.latency, args.jitter, args.token_delay, args.error_rate, args.rate_limit_rate, args.retry_after)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
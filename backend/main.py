@@ -1,32 +1,42 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Header, Request as FastAPIRequest, Query, Form, BackgroundTasks
+from fastapi import FastAPI, HTTPException, UploadFile, File, Header, Request as FastAPIRequest, Query, Form, BackgroundTasks, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional, List, Dict, Any
-from supabase_client import supabase
+from typing import Optional, List, Dict, Any, Tuple
 from models import PlagiarismResult, PlagiarismRequest, HumanizeRequest, HumanizeResult
 import uvicorn
 import os
 import json
+import signal
+import asyncio
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, StreamingResponse, RedirectResponse
-import io
-from PyPDF2 import PdfReader
-from docx import Document
+from starlette.background import BackgroundTask
+from fastapi.encoders import jsonable_encoder
+import hashlib
 from config import config
 from models import (
     UserCreate, UserLogin, PlagiarismRequest, PlagiarismResult, HumanizeRequest,
-    HumanizeResult, ChatRequest, ChatResponse, Token, PasswordReset,
+    HumanizeResult, ChatRequest, ChatResponse, ChatStreamRequest, Token, PasswordReset,
     SubscriptionRequest, RefundRequestModel, DownloadHumanizedRequest, APIResponse,
     RiskPredictionRequest, RiskPredictionResult, LogActivityRequest, UserSettingsModel, ContactFormRequest
 )
 from ai_model import (
-    analyze_with_groq_api, humanize_with_groq_api, chat_with_groq_api,
+    analyze_with_groq_api, humanize_with_groq_api, stream_humanize_with_groq_api, chat_with_groq_api, stream_chat_with_groq_api,
     calculate_plagiarism_score, detect_ai_content, find_potential_sources,
     apply_humanization_rules, calculate_improvement_score, get_local_chat_response_fallback,
-    moderate_message, generate_humanized_doc, extract_text_from_bytes, execute_advanced_plagiarism_check
+    moderate_message, generate_humanized_doc, run_content_checks,
+    extract_upload_text, get_upload_result, set_upload_result,
+    REFERENCE_INDEX, load_reference_index, start_llm_client, close_llm_client, migrate_legacy_ai_cache, migrate_legacy_plagiarism_cache,
+    MEMORY_CACHE, cache_stats, LLM_ROUTER
 )
+from text_processing import NormalizedDocument
+from chat_history import ChatSessionStore
+from admission import request_priority, PRIORITY_BULK
 from email_utils import send_contact_emails
-from supabase_client import supabase
+import repositories as db
+from token_auth import TOKEN_VERIFIER
+from usage_meter import USAGE_METER, NO_RESERVATION, Reservation, QuotaExceeded
 from pydantic import BaseModel
 
 class FileCheckRequest(BaseModel):
@@ -40,17 +50,48 @@ class ProfileUpdate(BaseModel):
 
 
 
-def get_user_safely(token: str):
+async def get_user_safely(token: str):
+    # Verified locally against the project's signing keys and cached briefly (token_auth.py)
+    return await TOKEN_VERIFIER.verify(token)
+
+# --- Corpus Index Hot Reload ---
+def register_index_reload_signal():
+    # After the index file is atomically replaced, `kill -HUP <worker pid>` swaps it in
+    # immediately; otherwise workers notice within CORPUS_INDEX_RELOAD_INTERVAL seconds.
+    if not hasattr(signal, "SIGHUP"):
+        return
     try:
-        return supabase.auth.get_user(token)
-    except Exception as e:
-        print(f'Auth Error: {e}')
-        return None
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, REFERENCE_INDEX.request_reload)
+    except (NotImplementedError, RuntimeError) as e:
+        print(f"WARNING: Could not register SIGHUP index reload: {e}")
+
+# --- Application Lifespan ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Map (or first seed) the reference corpus index before serving
+    await asyncio.to_thread(load_reference_index)
+    register_index_reload_signal()
+    # Pooled keep-alive client shared by every LLM call in this worker
+    await start_llm_client()
+    USAGE_METER.start()
+    # One-off import of the old ai_cache/ files and plagiarism_cache.json, off the event loop
+    await asyncio.to_thread(migrate_legacy_plagiarism_cache)
+    migration = asyncio.create_task(asyncio.to_thread(migrate_legacy_ai_cache))
+    try:
+        yield
+    finally:
+        if not migration.done():
+            migration.cancel()
+        await close_llm_client()
+        # Write out usage recorded since the last flush before the data-access pool goes away
+        await USAGE_METER.close()
+        db.shutdown_db_executor()
 
 app = FastAPI(
     title=config.APP_TITLE,
     description=config.APP_DESCRIPTION,
-    version=config.APP_VERSION
+    version=config.APP_VERSION,
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -115,7 +156,7 @@ async def handle_contact_form(contact_data: ContactFormRequest, background_tasks
             "message": contact_data.message
         }
         # Assuming the 'contact_messages' table is created
-        supabase.table("contact_messages").insert(db_payload).execute()
+        await db.contact_messages.insert(db_payload)
 
         # 2. Send emails via BackgroundTask so it doesn't block the API response
         background_tasks.add_task(
@@ -136,10 +177,7 @@ async def handle_contact_form(contact_data: ContactFormRequest, background_tasks
 async def register_user(user_data: UserCreate):
     try:
         # Create user inside Supabase Auth
-        auth_response = supabase.auth.sign_up({
-            "email": user_data.email, 
-            "password": user_data.password
-        })
+        auth_response = await db.auth.sign_up(user_data.email, user_data.password)
         
         if not auth_response.user:
             raise ValueError("Failed to create user in Supabase")
@@ -155,7 +193,7 @@ async def register_user(user_data: UserCreate):
             "role": "user",
             "is_verified": False # Managed by Supabase internally, but mapped here as backup
         }
-        supabase.table("profiles").insert(profile_data).execute()
+        await db.profiles.insert(profile_data)
         
         return {
             "message": "User registered successfully", 
@@ -175,18 +213,14 @@ async def register_user(user_data: UserCreate):
 async def login_user(user_data: UserLogin):
     try:
         # Check Supabase
-        auth_response = supabase.auth.sign_in_with_password({
-            "email": user_data.email,
-            "password": user_data.password
-        })
+        auth_response = await db.auth.sign_in(user_data.email, user_data.password)
         
         session = auth_response.session
         user = auth_response.user
         
         if session and user:
             # Fetch complete profile to match Authentic models
-            profile_response = supabase.table("profiles").select("*").eq("id", user.id).execute()
-            profile = profile_response.data[0] if profile_response.data else {}
+            profile = await db.profiles.get(user.id) or {}
             
             combined_user = {
                 "id": user.id,
@@ -231,15 +265,14 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
     
     try:
         # Get user from Supabase Auth
-        auth_response = get_user_safely(token)
+        auth_response = await get_user_safely(token)
         if not auth_response or not auth_response.user:
             raise HTTPException(status_code=401, detail="Invalid session")
             
         user = auth_response.user
         
         # Hydrate user data from public.profiles
-        profile_response = supabase.table("profiles").select("*").eq("id", user.id).execute()
-        profile = profile_response.data[0] if profile_response.data else {}
+        profile = await db.profiles.get(user.id) or {}
         
         return {
             "id": user.id,
@@ -258,7 +291,7 @@ async def subscribe_user(request: SubscriptionRequest, authorization: Optional[s
     try:
         # Extract user from token
         token = authorization.split(" ")[1] if " " in authorization else authorization
-        auth_response = get_user_safely(token)
+        auth_response = await get_user_safely(token)
         if not auth_response or not auth_response.user:
             raise HTTPException(status_code=401, detail="Invalid session")
             
@@ -274,10 +307,10 @@ async def subscribe_user(request: SubscriptionRequest, authorization: Optional[s
             "order_id": request.order_id,
         }
         
-        supabase.table("transactions").insert(transaction_data).execute()
+        await db.transactions.insert(transaction_data)
         
         # Update user profile subscription plan
-        supabase.table("profiles").update({"plan": request.plan_id}).eq("id", user.id).execute()
+        await db.profiles.update(user.id, {"plan": request.plan_id})
         
         return {"status": "success", "message": "Subscription activated", "plan": request.plan_id}
             
@@ -293,7 +326,7 @@ async def request_refund(request: RefundRequestModel, authorization: Optional[st
         user_id = None
         if authorization:
             token = authorization.replace("Bearer ", "")
-            auth_response = get_user_safely(token)
+            auth_response = await get_user_safely(token)
             if auth_response and auth_response.user:
                 user_id = auth_response.user.id
 
@@ -305,7 +338,7 @@ async def request_refund(request: RefundRequestModel, authorization: Optional[st
         if user_id:
             refund_data["user_id"] = user_id
             
-        supabase.table("refunds").insert(refund_data).execute()
+        await db.refunds.insert(refund_data)
         return {"status": "success", "message": "Refund request received and logged in database"}
     except Exception as e:
         print(f"Refund Error: {e}")
@@ -320,40 +353,47 @@ PLAN_LIMITS = {
     "enterprise": {"plagiarism": 99999999, "humanizer": 99999999, "bulk": 99999}
 }
 
-def check_user_limits(user, action: str, check_cost: int = 1) -> dict:
+async def reserve_user_quota(user, action: str, check_cost: int = 1) -> Tuple[dict, Reservation]:
+    """
+    Holds check_cost words of the user's monthly quota for this request. The
+    caller commits the reservation once the work is done and releases it in a
+    finally block (a no-op after commit), so failed requests cost nothing.
+    """
     if not user:
-        return {"plan": "anonymous", "limit": 0, "used_words": 0, "remaining_words": 0}
+        return {"plan": "anonymous", "limit": 0, "used_words": 0, "remaining_words": 0}, NO_RESERVATION
         
     user_id = user.id
-    profile_response = supabase.table("profiles").select("plan").eq("id", user_id).execute()
-    plan = profile_response.data[0].get("plan", "free") if profile_response.data else "free"
-    limits = PLAN_LIMITS.get(plan, PLAN_LIMITS["free"])
-    
-    now = datetime.now()
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0).isoformat()
-    
-    if action == "plagiarism":
-        limit = limits.get("plagiarism", 5000)
-        usage_res = supabase.table("checks").select("words_count").eq("user_id", user_id).gte("created_at", start_of_month).execute()
-        used = sum(item.get("words_count") or 0 for item in usage_res.data) if usage_res.data else 0
-        
-        if used + check_cost > limit:
-            raise HTTPException(status_code=402, detail=f"Monthly plagiarism word limit reached for {plan.upper()} plan. Upgrade required.")
-        return {"plan": plan, "limit": limit, "used_words": used, "remaining_words": limit - used}
-        
-    elif action == "humanize":
-        limit = limits.get("humanizer", 0)
+    if action not in ("plagiarism", "humanize"):
+        plan = await db.profiles.get_plan(user_id)
+        return {"plan": plan, "limit": 0, "used_words": 0, "remaining_words": 0}, NO_RESERVATION
+
+    # The plan and this month's usage counter are independent lookups, so fetch them together
+    plan, _ = await asyncio.gather(db.profiles.get_plan(user_id), USAGE_METER.used(user_id, action))
+    label = "plagiarism" if action == "plagiarism" else "humanizer"
+    limit, reservation = await reserve_for_plan(user_id, action, plan, check_cost)
+    if reservation is None:
+        # The cached plan may predate an upgrade made through another worker: re-read it before refusing
+        fresh_plan = await db.profiles.get_plan(user_id, fresh=True)
+        if fresh_plan != plan:
+            plan = fresh_plan
+            limit, reservation = await reserve_for_plan(user_id, action, plan, check_cost)
+    if reservation is None:
         if limit == 0:
             raise HTTPException(status_code=403, detail=f"AI Humanizer is not available on your {plan.upper()} plan.")
-            
-        usage_res = supabase.table("humanize_requests").select("input_text").eq("user_id", user_id).gte("created_at", start_of_month).execute()
-        used = sum(len((item.get("input_text") or "").split()) for item in usage_res.data) if usage_res.data else 0
-        
-        if used + check_cost > limit:
-            raise HTTPException(status_code=402, detail=f"Monthly humanizer word limit reached for {plan.upper()} plan. Upgrade required.")
-        return {"plan": plan, "limit": limit, "used_words": used, "remaining_words": limit - used}
-        
-    return {"plan": plan, "limit": 0, "used_words": 0, "remaining_words": 0}
+        raise HTTPException(status_code=402, detail=f"Monthly {label} word limit reached for {plan.upper()} plan. Upgrade required.")
+    used = reservation.used
+    return {"plan": plan, "limit": limit, "used_words": used, "remaining_words": limit - used}, reservation
+
+async def reserve_for_plan(user_id: str, action: str, plan: str, check_cost: int) -> Tuple[int, Optional[Reservation]]:
+    """The plan's monthly limit for action and a reservation, or None if the plan does not allow the words."""
+    limits = PLAN_LIMITS.get(plan, PLAN_LIMITS["free"])
+    limit = limits.get("plagiarism", 5000) if action == "plagiarism" else limits.get("humanizer", 0)
+    if limit == 0:
+        return limit, None
+    try:
+        return limit, await USAGE_METER.reserve(user_id, action, check_cost, limit)
+    except QuotaExceeded:
+        return limit, None
 
 def log_audit_async(user_id: str, text_length: int, text_hash: str, api_used: bool, result_summary: str):
     # Log securely to a file in a non-blocking background task (Step 8)
@@ -371,6 +411,18 @@ def log_audit_async(user_id: str, text_length: int, text_hash: str, api_used: bo
     except Exception as e:
         print(f"Failed to write audit log: {e}")
 
+async def read_upload(file: UploadFile) -> Tuple[bytes, str]:
+    """Reads an upload in chunks, hashing the raw bytes as they arrive. Returns (content, sha256 hex)."""
+    digest = hashlib.sha256()
+    chunks = []
+    while True:
+        chunk = await file.read(config.UPLOAD_READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
 # --- Core API Endpoints (calling ai_model functions) ---
 @app.post("/api/check-plagiarism", response_model=APIResponse[PlagiarismResult])
 async def check_plagiarism_endpoint(
@@ -378,35 +430,32 @@ async def check_plagiarism_endpoint(
     fastapi_request: FastAPIRequest,
     background_tasks: BackgroundTasks
 ):
+    reservation = NO_RESERVATION
     try:
         user = None
         auth_header = fastapi_request.headers.get("Authorization")
         if auth_header:
             token = auth_header.replace("Bearer ", "")
-            auth_response = get_user_safely(token)
+            auth_response = await get_user_safely(token)
             if auth_response and auth_response.user:
                 user = auth_response.user
             
-        word_count = len(request_data.text.split())
+        # Tokenized once here and reused by the whole plagiarism pipeline
+        document = NormalizedDocument.from_text(request_data.text)
+        word_count = document.raw_word_count
         
-        usage_meta = {"plan": "anonymous", "limit": 0, "used_words": 0, "remaining_words": 0}
-        # Step 7: Usage limit hook
-        if user:
-            usage_meta = check_user_limits(user, "plagiarism", check_cost=word_count)
+        # Step 7: Usage limit hook (the words are held until the check is stored)
+        usage_meta, reservation = await reserve_user_quota(user, "plagiarism", check_cost=word_count)
             
-        start_time = datetime.now()
-        
-        # Step 4, 5, 6: Switch to advanced pipeline
-        adv_plag_result = await execute_advanced_plagiarism_check(
-            text=request_data.text,
+        # Step 4, 5, 6: Advanced plagiarism pipeline and AI detection, run concurrently
+        checks = await run_content_checks(
+            document,
             language=request_data.language or "en",
-            content_type=request_data.category or "other"
+            content_type=request_data.category or "other",
+            check_ai=request_data.check_ai_content
         )
-        
-        # Keep AI detection as is for backwards compatibility
-        ai_detection_result = await analyze_with_groq_api(request_data.text, "ai_detection") if request_data.check_ai_content else {"is_ai": False, "confidence": 0.0}
-        
-        processing_time = (datetime.now() - start_time).total_seconds()
+        adv_plag_result = checks["plagiarism"]
+        ai_detection_result = checks["ai_detection"]
         plagiarism_score = adv_plag_result.get("score", 0.0)
         
         result_obj = PlagiarismResult(
@@ -415,7 +464,9 @@ async def check_plagiarism_endpoint(
             ai_confidence=ai_detection_result.get("confidence", 0.0),
             sources_found=adv_plag_result.get("sources", []),
             word_count=word_count,
-            analysis_time=processing_time,
+            analysis_time=checks["stage_timings"]["total"],
+            stage_timings=checks["stage_timings"],
+            partial_stages=checks["partial_stages"],
             unique_content_percentage=100 - plagiarism_score,
             ai_flagged_segments=ai_detection_result.get("ai_sentences", []),
             
@@ -425,11 +476,11 @@ async def check_plagiarism_endpoint(
             confidence=adv_plag_result.get("confidence"),
             analysis_summary=adv_plag_result.get("analysis_summary"),
             matched_patterns=adv_plag_result.get("matched_patterns", []),
-            api_used=adv_plag_result.get("api_used", False)
+            api_used=adv_plag_result.get("api_used", False),
+            sentence_matches=adv_plag_result.get("sentence_matches", [])
         )
         
         # Step 8: Logging & Audit (Non-blocking)
-        import hashlib
         text_hash = hashlib.sha256(request_data.text.encode('utf-8')).hexdigest()
         user_id = user.email if user else "anonymous"
         background_tasks.add_task(
@@ -449,23 +500,25 @@ async def check_plagiarism_endpoint(
                     "original_text": request_data.text,
                     "language": request_data.language or "en"
                 }
-                doc_ins = supabase.table("documents").insert(doc_data).execute()
-                doc_id = doc_ins.data[0]['id'] if doc_ins.data else None
+                doc_row = await db.documents.insert(doc_data)
+                doc_id = doc_row['id'] if doc_row else None
             except Exception as e:
                 print(f"Error inserting document: {e}")
                 doc_id = None
                 
+            reservation.commit()
             check_data = {
                 "user_id": user.id,
                 "document_id": doc_id,
                 "similarity": plagiarism_score,
                 "words_count": word_count,
-                "status": "completed"
+                "status": "completed",
+                "sentence_matches": [match.model_dump() for match in result_obj.sentence_matches]
             }
             try:
-                ins = supabase.table("checks").insert(check_data).execute()
+                check_row = await db.checks.insert(check_data)
                 import uuid
-                result_obj.id = str(ins.data[0]['id']) if ins.data else str(uuid.uuid4())
+                result_obj.id = str(check_row['id']) if check_row else str(uuid.uuid4())
             except Exception as e:
                 print(f"Error inserting check: {e}")
                 import uuid
@@ -484,6 +537,8 @@ async def check_plagiarism_endpoint(
     except Exception as e:
         print(f"CRITICAL ERROR in check_plagiarism_endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        reservation.release()
 
 @app.post("/api/check-file-plagiarism", response_model=APIResponse[PlagiarismResult])
 async def check_file_plagiarism_endpoint(
@@ -493,40 +548,55 @@ async def check_file_plagiarism_endpoint(
     language: Optional[str] = Form("en"),
     category: Optional[str] = Form("other")
 ):
+    reservation = NO_RESERVATION
     try:
         user = None
         auth_header = fastapi_request.headers.get("Authorization")
         if auth_header:
             token = auth_header.replace("Bearer ", "")
-            auth_response = get_user_safely(token)
+            auth_response = await get_user_safely(token)
             if auth_response and auth_response.user:
                 user = auth_response.user
             
-        content = await file.read()
-        extracted_text = await extract_text_from_bytes(content, file.content_type)
+        content, content_digest = await read_upload(file)
+        extracted_text = await extract_upload_text(content, content_digest, file.content_type)
 
         if not extracted_text.strip():
             raise HTTPException(status_code=400, detail="Could not extract text from file.")
-             
-        word_count = len(extracted_text.split())
 
-        # Step 7: Usage limit hook
-        usage_meta = {"plan": "anonymous", "limit": 0, "used_words": 0, "remaining_words": 0}
-        if user:
-            usage_meta = check_user_limits(user, "plagiarism", check_cost=word_count)
-
-        start_time = datetime.now()
-        
-        # Step 4, 5, 6: Switch to advanced pipeline
-        adv_plag_result = await execute_advanced_plagiarism_check(
-            text=extracted_text, 
-            language=language or "en",
-            content_type=category or "other"
-        )
-        
-        ai_detection_result = await analyze_with_groq_api(extracted_text, "ai_detection")
-        
-        processing_time = (datetime.now() - start_time).total_seconds()
+        language = language or "en"
+        category = category or "other"
+        # Repeat uploads of identical bytes reuse the stored analysis outright
+        cached_analysis = await get_upload_result(content_digest, file.content_type, language, category)
+        if cached_analysis:
+            word_count = cached_analysis["word_count"]
+        else:
+            document = NormalizedDocument.from_text(extracted_text)
+            word_count = document.raw_word_count
+
+        # Step 7: Usage limit hook (the words are held until the check is stored)
+        usage_meta, reservation = await reserve_user_quota(user, "plagiarism", check_cost=word_count)
+
+        if cached_analysis:
+            checks = {
+                "plagiarism": cached_analysis["plagiarism"],
+                "ai_detection": cached_analysis["ai_detection"],
+                "stage_timings": {"upload_cache": 0.0, "total": 0.0},
+                "partial_stages": []
+            }
+        else:
+            # Step 4, 5, 6: Advanced plagiarism pipeline and AI detection, run concurrently.
+            # Uploaded files are bulk work: their LLM calls queue behind chat and single checks
+            with request_priority(PRIORITY_BULK):
+                checks = await run_content_checks(document, language=language, content_type=category)
+            # Heuristic stand-ins for late stages are not worth remembering
+            if not checks["partial_stages"]:
+                await set_upload_result(
+                    content_digest, file.content_type, language, category,
+                    word_count, checks["plagiarism"], checks["ai_detection"]
+                )
+        adv_plag_result = checks["plagiarism"]
+        ai_detection_result = checks["ai_detection"]
         plagiarism_score = adv_plag_result.get("score", 0.0)
         
         result_obj = PlagiarismResult(
@@ -535,7 +605,9 @@ async def check_file_plagiarism_endpoint(
             ai_confidence=ai_detection_result.get("confidence", 0.0),
             sources_found=adv_plag_result.get("sources", []),
             word_count=word_count,
-            analysis_time=processing_time,
+            analysis_time=checks["stage_timings"]["total"],
+            stage_timings=checks["stage_timings"],
+            partial_stages=checks["partial_stages"],
             unique_content_percentage=100 - plagiarism_score,
             ai_flagged_segments=ai_detection_result.get("ai_sentences", []),
             
@@ -545,11 +617,11 @@ async def check_file_plagiarism_endpoint(
             confidence=adv_plag_result.get("confidence"),
             analysis_summary=adv_plag_result.get("analysis_summary"),
             matched_patterns=adv_plag_result.get("matched_patterns", []),
-            api_used=adv_plag_result.get("api_used", False)
+            api_used=adv_plag_result.get("api_used", False),
+            sentence_matches=adv_plag_result.get("sentence_matches", [])
         )
         
         # Step 8: Logging & Audit (Non-blocking)
-        import hashlib
         text_hash = hashlib.sha256(extracted_text.encode('utf-8')).hexdigest()
         user_id = user.email if user else "anonymous"
         background_tasks.add_task(
@@ -567,25 +639,27 @@ async def check_file_plagiarism_endpoint(
                     "user_id": user.id,
                     "title": file.filename or "File Upload",
                     "original_text": extracted_text,
-                    "language": language or "en"
+                    "language": language
                 }
-                doc_ins = supabase.table("documents").insert(doc_data).execute()
-                doc_id = doc_ins.data[0]['id'] if doc_ins.data else None
+                doc_row = await db.documents.insert(doc_data)
+                doc_id = doc_row['id'] if doc_row else None
             except Exception as e:
                 print(f"Error inserting document: {e}")
                 doc_id = None
                 
+            reservation.commit()
             check_data = {
                 "user_id": user.id,
                 "document_id": doc_id,
                 "similarity": plagiarism_score,
                 "words_count": word_count,
-                "status": "completed"
+                "status": "completed",
+                "sentence_matches": [match.model_dump() for match in result_obj.sentence_matches]
             }
             try:
-                ins = supabase.table("checks").insert(check_data).execute()
+                check_row = await db.checks.insert(check_data)
                 import uuid
-                result_obj.id = str(ins.data[0]['id']) if ins.data else str(uuid.uuid4())
+                result_obj.id = str(check_row['id']) if check_row else str(uuid.uuid4())
             except Exception as e:
                 print(f"Error inserting check: {e}")
                 import uuid
@@ -604,6 +678,22 @@ async def check_file_plagiarism_endpoint(
     except Exception as e:
         print(f"CRITICAL ERROR in check_file_plagiarism_endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        reservation.release()
+
+def report_sentences(check: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The check's stored sentence matches with their text and a highlight level for the report view."""
+    text = (check.get("documents") or {}).get("original_text") or ""
+    sentences = []
+    for match in check.get("sentence_matches") or []:
+        similarity = float(match.get("similarity", 0))
+        sentences.append(dict(
+            match,
+            text=text[match.get("start", 0):match.get("end", 0)],
+            similarity=round(similarity),
+            level="high" if similarity > 50 else ("medium" if similarity > 20 else "safe")
+        ))
+    return sentences
 
 @app.get("/api/reports/{report_id}")
 async def get_report(report_id: str, authorization: Optional[str] = Header(None)):
@@ -613,16 +703,14 @@ async def get_report(report_id: str, authorization: Optional[str] = Header(None)
     """
     try:
         if report_id != "1":
-            res = supabase.table("checks").select("*, documents(title)").eq("id", report_id).execute()
-            if res.data:
-                check = res.data[0]
+            check = await db.checks.get_with_title(report_id)
+            if check:
                 doc_title = check.get("documents", {}).get("title") if check.get("documents") else "Checked Document"
                 
                 score = float(check.get("similarity", 0))
                 status = "high" if score > 50 else ("moderate" if score > 20 else "safe")
                 
-                sources_res = supabase.table("check_sources").select("*").eq("check_id", report_id).execute()
-                sources = sources_res.data if sources_res.data else []
+                sources = await db.check_sources.list_for_check(report_id)
                 
                 return {
                     "id": check["id"],
@@ -639,7 +727,7 @@ async def get_report(report_id: str, authorization: Optional[str] = Header(None)
                         "aiDetectionProbability": 15,
                     },
                     "sources": sources,
-                    "sentences": []
+                    "sentences": report_sentences(check)
                 }
         
         # Fallback for demo/mock IDs
@@ -663,7 +751,7 @@ async def get_report(report_id: str, authorization: Optional[str] = Header(None)
                         {"id": 1, "url": "https://example.com/climate", "title": "Climate Change Study 2024", "similarity": 8, "category": "academic"},
                          {"id": 2, "url": "https://example.com/env", "title": "Environmental Impact", "similarity": 4, "category": "journal"}
                     ],
-                    "sentences": [] # Mock sentences would go here
+                    "sentences": []
                 }
             raise HTTPException(status_code=404, detail="Report not found")
 
@@ -679,7 +767,7 @@ async def update_profile(
     authorization: Optional[str] = Header(None)
 ):
     try:
-        user = verify_token(authorization)
+        user = await verify_token(authorization)
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
         
@@ -687,11 +775,11 @@ async def update_profile(
     if not update_dict:
         return {"user": user}
         
-    res = supabase.table("profiles").update(update_dict).eq("id", user["id"]).execute()
-    if not res.data:
+    updated_user = await db.profiles.update(user["id"], update_dict)
+    if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
         
-    return {"user": res.data[0]}
+    return {"user": updated_user}
 
 @app.post("/api/profile/avatar")
 async def upload_avatar(
@@ -699,7 +787,7 @@ async def upload_avatar(
     authorization: Optional[str] = Header(None)
 ):
     try:
-        user = verify_token(authorization)
+        user = await verify_token(authorization)
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
         
@@ -711,37 +799,35 @@ async def upload_avatar(
     encoded_string = base64.b64encode(content).decode("utf-8")
     data_uri = f"data:{mime_type};base64,{encoded_string}"
     
-    res = supabase.table("profiles").update({"avatar_url": data_uri}).eq("id", user["id"]).execute()
-    updated_user = res.data[0] if res.data else user
+    updated_user = await db.profiles.update(user["id"], {"avatar_url": data_uri}) or user
     
     return {"user": updated_user, "avatar_url": data_uri}
 
 @app.get("/api/settings")
 async def get_user_settings(authorization: Optional[str] = Header(None)):
     try:
-        user = verify_token(authorization)
-        res = supabase.table("user_settings").select("*").eq("user_id", user["id"]).execute()
-        if res.data:
-            return res.data[0]
+        user = await verify_token(authorization)
+        settings = await db.user_settings.get(user["id"])
+        if settings:
+            return settings
         else:
             # Create default settings if not exists
             default_settings = {"user_id": user["id"]}
-            ins = supabase.table("user_settings").insert(default_settings).execute()
-            return ins.data[0] if ins.data else default_settings
+            return await db.user_settings.insert(default_settings) or default_settings
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
 
 @app.post("/api/settings")
 async def update_user_settings(settings: UserSettingsModel, authorization: Optional[str] = Header(None)):
     try:
-        user = verify_token(authorization)
+        user = await verify_token(authorization)
         update_dict = settings.model_dump(exclude_unset=True)
-        res = supabase.table("user_settings").update(update_dict).eq("user_id", user["id"]).execute()
-        if not res.data:
+        updated = await db.user_settings.update(user["id"], update_dict)
+        if not updated:
             # Insert if missing
             update_dict["user_id"] = user["id"]
-            res = supabase.table("user_settings").insert(update_dict).execute()
-        return res.data[0] if res.data else update_dict
+            updated = await db.user_settings.insert(update_dict)
+        return updated or update_dict
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
 
@@ -751,15 +837,14 @@ async def delete_report(report_id: str, authorization: Optional[str] = Header(No
         raise HTTPException(status_code=401, detail="Authentication required")
     
     token = authorization.replace("Bearer ", "")
-    auth_response = get_user_safely(token)
+    auth_response = await get_user_safely(token)
     if not auth_response or not auth_response.user:
         raise HTTPException(status_code=401, detail="Invalid session")
     
     user = auth_response.user
     
     # Delete from checks table
-    res = supabase.table("checks").delete().eq("user_id", user.id).eq("id", report_id).execute()
-    if not res.data:
+    if not await db.checks.delete(user.id, report_id):
         raise HTTPException(status_code=404, detail="Report not found or could not be deleted")
         
     return {"status": "success", "message": "Report deleted"}
@@ -770,15 +855,14 @@ async def get_user_history(authorization: Optional[str] = Header(None)):
         raise HTTPException(status_code=401, detail="Authentication required")
     
     token = authorization.replace("Bearer ", "")
-    auth_response = get_user_safely(token)
+    auth_response = await get_user_safely(token)
     if not auth_response or not auth_response.user:
         raise HTTPException(status_code=401, detail="Invalid session")
     
     user = auth_response.user
     
     # Retrieve their activity logs filtered by plagiarism checks
-    res = supabase.table("checks").select("*, documents(title)").eq("user_id", user.id).execute()
-    logs = res.data if res.data else []
+    logs = await db.checks.list_for_user(user.id)
     
     reports = []
     for log in logs:
@@ -805,22 +889,51 @@ async def get_user_history(authorization: Optional[str] = Header(None)):
     reports.sort(key=lambda x: x["date"], reverse=True)
     return reports
 
+def build_humanize_result(request_data: HumanizeRequest, humanize_result: Dict[str, Any], start_time: datetime) -> HumanizeResult:
+    humanized_text = humanize_result.get("humanized_text", "")
+    improvement_data = calculate_improvement_score(request_data.text, humanized_text)
+    return HumanizeResult(
+        original_text=request_data.text,
+        humanized_text=humanized_text,
+        improvement_score=improvement_data["improvement"],
+        changes_made=humanize_result.get("changes", []),
+        word_count=len(humanized_text.split()),
+        processing_time=(datetime.now() - start_time).total_seconds(),
+        original_ai_score=improvement_data["original_score"],
+        humanized_ai_score=improvement_data["humanized_score"]
+    )
+
+async def save_humanize_request(user, request_data: HumanizeRequest, humanized_text: str):
+    # ===== Supabase Save: Humanizer =====
+    try:
+        hum_data = {
+            "user_id": user.id,
+            "level": request_data.complexity_level,
+            "input_text": request_data.text,
+            "output_text": humanized_text
+        }
+        await db.humanize_requests.insert(hum_data)
+    except Exception as err:
+        print("SUPABASE ERROR (HUMANIZER): ", err)
+
+def sse_event(event: str, data: Any) -> str:
+    """One Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
 @app.post("/api/humanizer", response_model=APIResponse[HumanizeResult])
 async def humanize_text_endpoint(request_data: HumanizeRequest, fastapi_request: FastAPIRequest):
+    reservation = NO_RESERVATION
     try:
         user = None
         auth_header = fastapi_request.headers.get("Authorization")
         if auth_header:
             token = auth_header.replace("Bearer ", "")
-            auth_response = get_user_safely(token)
+            auth_response = await get_user_safely(token)
             if auth_response and auth_response.user:
                 user = auth_response.user
 
         doc_word_count = len(request_data.text.split())
-        usage_meta = {"plan": "anonymous", "limit": 0, "used_words": 0, "remaining_words": 0}
-        
-        if user:
-            usage_meta = check_user_limits(user, "humanize", check_cost=doc_word_count)
+        usage_meta, reservation = await reserve_user_quota(user, "humanize", check_cost=doc_word_count)
 
         start_time = datetime.now()
         humanize_result = await humanize_with_groq_api(
@@ -830,34 +943,11 @@ async def humanize_text_endpoint(request_data: HumanizeRequest, fastapi_request:
             request_data.target_language,
             request_data.content_type
         )
-        improvement_data = calculate_improvement_score(request_data.text, humanize_result.get("humanized_text", ""))
-        word_count = len(humanize_result.get("humanized_text", "").split())
-        processing_time = (datetime.now() - start_time).total_seconds()
-        
-        result_obj = HumanizeResult(
-            original_text=request_data.text,
-            humanized_text=humanize_result.get("humanized_text", ""),
-            improvement_score=improvement_data["improvement"],
-            changes_made=humanize_result.get("changes", []),
-            word_count=word_count,
-            processing_time=processing_time,
-            original_ai_score=improvement_data["original_score"],
-            humanized_ai_score=improvement_data["humanized_score"]
-        )
+        result_obj = build_humanize_result(request_data, humanize_result, start_time)
+        reservation.commit()
 
-        # ===== Supabase Save: Humanizer =====
         if user:
-            try:
-                hum_data = {
-                    "user_id": user.id,
-                    "level": request_data.complexity_level,
-                    "input_text": request_data.text,
-                    "output_text": humanize_result.get("humanized_text", "")
-                }
-                supabase.table("humanize_requests").insert(hum_data).execute()
-            except Exception as err:
-                print("SUPABASE ERROR (HUMANIZER): ", err)
-        # ===== END Supabase Humanizer Save =====
+            await save_humanize_request(user, request_data, result_obj.humanized_text)
 
         return APIResponse(
             success=True,
@@ -872,6 +962,73 @@ async def humanize_text_endpoint(request_data: HumanizeRequest, fastapi_request:
     except Exception as e:
         print(f"CRITICAL ERROR in humanize_text_endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        reservation.release()
+
+@app.post("/api/humanizer/stream")
+async def humanize_text_stream_endpoint(request_data: HumanizeRequest, fastapi_request: FastAPIRequest):
+    """
+    Server-Sent Events variant of /api/humanizer. "delta" events carry cleaned text
+    as the model generates it; a final "result" event carries the same APIResponse
+    the non-streaming endpoint returns, or an "error" event if generation fails.
+    """
+    user = None
+    auth_header = fastapi_request.headers.get("Authorization")
+    if auth_header:
+        token = auth_header.replace("Bearer ", "")
+        auth_response = await get_user_safely(token)
+        if auth_response and auth_response.user:
+            user = auth_response.user
+
+    # Limits are enforced before the stream starts so they still surface as HTTP errors;
+    # the words stay reserved until the stream finishes. The response's background task
+    # releases them if the client disconnects or the stream never starts (no-op after commit)
+    doc_word_count = len(request_data.text.split())
+    usage_meta, reservation = await reserve_user_quota(user, "humanize", check_cost=doc_word_count)
+
+    start_time = datetime.now()
+
+    async def events():
+        try:
+            humanize_result = {}
+            async for event in stream_humanize_with_groq_api(
+                request_data.text,
+                request_data.writing_style,
+                request_data.complexity_level,
+                request_data.target_language,
+                request_data.content_type
+            ):
+                if "delta" in event:
+                    yield sse_event("delta", {"text": event["delta"]})
+                else:
+                    humanize_result = event
+
+            result_obj = build_humanize_result(request_data, humanize_result, start_time)
+            reservation.commit()
+            if user:
+                await save_humanize_request(user, request_data, result_obj.humanized_text)
+
+            yield sse_event("result", APIResponse(
+                success=True,
+                plan=usage_meta.get("plan", "anonymous"),
+                used_words=usage_meta.get("used_words", 0),
+                remaining_words=usage_meta.get("remaining_words", 0),
+                limit=usage_meta.get("limit", 0),
+                data=result_obj
+            ))
+        except Exception as e:
+            print(f"CRITICAL ERROR in humanize_text_stream_endpoint: {e}")
+            yield sse_event("error", {"detail": f"Internal server error: {str(e)}"})
+        finally:
+            reservation.release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Disable proxy buffering (nginx) so every event is flushed immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(reservation.release)
+    )
 
 @app.post("/api/ai-chat", response_model=ChatResponse)
 async def ai_chat_endpoint(request_data: ChatRequest):
@@ -884,6 +1041,85 @@ async def ai_chat_endpoint(request_data: ChatRequest):
     chat_reply = await chat_with_groq_api(user_message)
     return ChatResponse(reply=chat_reply)
 
+# Multi-turn history for the streaming chat endpoints (per worker)
+CHAT_SESSIONS = ChatSessionStore(
+    max_sessions=config.CHAT_SESSION_MAX, ttl=config.CHAT_SESSION_TTL,
+    max_turns=config.CHAT_HISTORY_MAX_TURNS, max_chars=config.CHAT_HISTORY_MAX_CHARS
+)
+
+@app.post("/api/ai-chat/stream")
+async def ai_chat_stream_endpoint(request_data: ChatStreamRequest):
+    """
+    Server-Sent Events variant of /api/ai-chat with server-side history. Emits a
+    "session" event (send its id back to continue the conversation), "delta" events
+    as the reply is generated, then "done" with the full reply (or "error").
+    """
+    user_message = request_data.message.strip()
+    if not user_message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty.")
+    session_id, history = CHAT_SESSIONS.get(request_data.session_id)
+
+    async def events():
+        yield sse_event("session", {"session_id": session_id})
+        moderation_result = moderate_message(user_message)
+        if moderation_result["flagged"]:
+            yield sse_event("done", {"reply": moderation_result["reason"], "session_id": session_id})
+            return
+        try:
+            parts = []
+            async for delta in stream_chat_with_groq_api(user_message, history):
+                parts.append(delta)
+                yield sse_event("delta", {"text": delta})
+            yield sse_event("done", {"reply": "".join(parts).strip(), "session_id": session_id})
+        except Exception as e:
+            print(f"ERROR in ai_chat_stream_endpoint: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/api/ai-chat/ws")
+async def ai_chat_websocket(websocket: WebSocket):
+    """
+    WebSocket chat: each {"message": ...} frame is answered with {"type": "delta"}
+    frames and a final {"type": "done"} (or {"type": "error"}). The conversation
+    history lives as long as the connection.
+    """
+    await websocket.accept()
+    history = CHAT_SESSIONS.new_history()
+    try:
+        while True:
+            frame = await websocket.receive_text()
+            try:
+                data = json.loads(frame)
+            except ValueError:
+                # Plain-text frames are taken as the message itself
+                data = {"message": frame}
+            user_message = str(data.get("message", "")).strip() if isinstance(data, dict) else ""
+            if not user_message:
+                await websocket.send_json({"type": "error", "detail": "Message cannot be empty."})
+                continue
+            moderation_result = moderate_message(user_message)
+            if moderation_result["flagged"]:
+                await websocket.send_json({"type": "done", "reply": moderation_result["reason"]})
+                continue
+            try:
+                parts = []
+                async for delta in stream_chat_with_groq_api(user_message, history):
+                    parts.append(delta)
+                    await websocket.send_json({"type": "delta", "text": delta})
+                await websocket.send_json({"type": "done", "reply": "".join(parts).strip()})
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                print(f"ERROR in ai_chat_websocket: {e}")
+                await websocket.send_json({"type": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+
 
 
 # ------------------------------------------------------------------
@@ -894,17 +1130,16 @@ def is_valid_text(text: str, min_words: int = 20) -> bool:
     words = text.split()
     return len(words) >= min_words
 
-def verify_token(authorization: Optional[str]) -> Dict[str, Any]:
+async def verify_token(authorization: Optional[str]) -> Dict[str, Any]:
     if not authorization:
         raise HTTPException(status_code=401, detail="Authentication required")
     token = authorization.replace("Bearer ", "")
-    auth_response = get_user_safely(token)
+    auth_response = await get_user_safely(token)
     if not auth_response or not auth_response.user:
         raise HTTPException(status_code=401, detail="Invalid session")
         
     user = auth_response.user
-    profile_response = supabase.table("profiles").select("*").eq("id", user.id).execute()
-    profile = profile_response.data[0] if profile_response.data else {}
+    profile = await db.profiles.get(user.id) or {}
     
     return {
         "id": user.id,
@@ -912,6 +1147,38 @@ def verify_token(authorization: Optional[str]) -> Dict[str, Any]:
         **profile
     }
 
+async def require_admin(authorization: Optional[str]) -> Dict[str, Any]:
+    user = await verify_token(authorization)
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+# ------------------------------------------------------------------
+# Admin: Cache Inspection
+# ------------------------------------------------------------------
+
+@app.get("/api/admin/cache")
+async def get_cache_stats(authorization: Optional[str] = Header(None)):
+    """Hit rates and sizes of the in-memory LRU, the persistent caches behind it, and the auth caches."""
+    await require_admin(authorization)
+    stats = await asyncio.to_thread(cache_stats)
+    stats["auth_tokens"] = TOKEN_VERIFIER.stats()
+    stats["profiles"] = db.profiles.stats()
+    stats["usage"] = USAGE_METER.stats()
+    return stats
+
+@app.post("/api/admin/cache/flush")
+async def flush_memory_cache(authorization: Optional[str] = Header(None)):
+    """Empties the in-memory LRU of this worker; persistent caches are left intact."""
+    await require_admin(authorization)
+    return {"success": True, "flushed_entries": MEMORY_CACHE.clear()}
+
+@app.get("/api/admin/llm")
+async def get_llm_router_stats(authorization: Optional[str] = Header(None)):
+    """Per-backend health, p50/p95 latency and admission metrics (limit, queue depth, waits, 429s) for this worker."""
+    await require_admin(authorization)
+    return LLM_ROUTER.stats()
+
 # ------------------------------------------------------------------
 # Authentication Endpoints (LocalDB)
 # ------------------------------------------------------------------
@@ -964,31 +1231,15 @@ async def upload_file_endpoint(file: UploadFile = File(...)):
         if file.content_type not in allowed_types:
             raise HTTPException(status_code=400, detail="Unsupported file type. Please upload PDF, DOCX, or TXT files. (Legacy .doc files are not supported)")
         
-        content = await file.read()
-        extracted_text = ""
-
-        if file.content_type == "text/plain":
-            extracted_text = content.decode('utf-8', errors='ignore')
-        elif file.content_type == "application/pdf":
-            try:
-                with io.BytesIO(content) as pdf_file:
-                    reader = PdfReader(pdf_file)
-                    for page in reader.pages:
-                        text = page.extract_text()
-                        if text:
-                            extracted_text += text + "\n"
-            except Exception as pdf_err:
-                print(f"PDF Extraction Error: {pdf_err}")
+        content, content_digest = await read_upload(file)
+        try:
+            # Identical bytes uploaded before are served without re-parsing the PDF/DOCX
+            extracted_text = await extract_upload_text(content, content_digest, file.content_type)
+        except ValueError as extract_err:
+            print(f"Extraction Error: {extract_err}")
+            if file.content_type == "application/pdf":
                 raise HTTPException(status_code=400, detail="Failed to extract text from PDF. The file might be corrupted or password protected.")
-        elif file.content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            try:
-                with io.BytesIO(content) as docx_file:
-                    doc = Document(docx_file)
-                    for para in doc.paragraphs:
-                        extracted_text += para.text + "\n"
-            except Exception as docx_err:
-                print(f"DOCX Extraction Error: {docx_err}")
-                raise HTTPException(status_code=400, detail="Failed to extract text from DOCX.")
+            raise HTTPException(status_code=400, detail="Failed to extract text from DOCX.")
 
         return {
             "filename": file.filename,
@@ -1010,17 +1261,17 @@ async def download_humanized_content(request_data: DownloadHumanizedRequest, fas
         auth_header = fastapi_request.headers.get("Authorization")
         if auth_header:
             token = auth_header.replace("Bearer ", "")
-            auth_response = get_user_safely(token)
+            auth_response = await get_user_safely(token)
             if auth_response and auth_response.user:
                 user = auth_response.user
-                supabase.table("activity_logs").insert({
+                await db.activity_logs.insert({
                     "user_id": user.id,
                     "action": "file_download",
                     "details": json.dumps({
                         "format": download_format,
                         "word_count": len(text_content.split())
                     })
-                }).execute()
+                })
         # =================================
 
         # Calls the generate_humanized_doc function from ai_model.py
@@ -1040,14 +1291,14 @@ async def log_generic_activity(request_data: LogActivityRequest, authorization:
     
     try:
         token = authorization.replace("Bearer ", "")
-        auth_response = get_user_safely(token)
+        auth_response = await get_user_safely(token)
         if auth_response and auth_response.user:
             user = auth_response.user
-            supabase.table("activity_logs").insert({
+            await db.activity_logs.insert({
                 "user_id": user.id,
                 "action": request_data.action,
                 "details": json.dumps(request_data.details)
-            }).execute()
+            })
             return {"status": "logged"}
     except Exception as err:
         print(f"Stats Log Error: {err}") # Fail silently for logging
@@ -1059,25 +1310,23 @@ async def get_dashboard_stats(authorization: Optional[str] = Header(None)):
         raise HTTPException(status_code=401, detail="Authentication required")
     
     token = authorization.replace("Bearer ", "")
-    auth_response = get_user_safely(token)
+    auth_response = await get_user_safely(token)
     if not auth_response or not auth_response.user:
         raise HTTPException(status_code=401, detail="Invalid session")
         
     user = auth_response.user
     
-    # Fetch from dedicated new table for dashboard stats
-    db_stats = supabase.table("user_dashboard_stats").select("*").eq("user_id", user.id).execute()
-    data = db_stats.data[0] if db_stats.data else None
+    # Dashboard totals and recent history are independent lookups, so fetch them together
+    data, history = await asyncio.gather(
+        db.dashboard_stats.get(user.id),
+        db.checks.list_for_user(user.id, limit=50)
+    )
     
     total_checks = data.get("total_checks", 0) if data else 0
     total_words = data.get("total_words_scanned", 0) if data else 0
     ai_detects = data.get("high_risk_count", 0) if data else 0
     avg_sim = round(data.get("average_similarity", 0), 1) if data else 0
 
-    # Get recent history logs separate
-    hist_res = supabase.table("checks").select("*, documents(title)").eq("user_id", user.id).order("created_at", desc=True).limit(50).execute()
-    history = hist_res.data if hist_res.data else []
-
     # Map recent activity for frontend
     mapped_history = []
     for h in history[:10]: # Return top 10 for dashboard
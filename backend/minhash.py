@@ -0,0 +1,80 @@
+import random
+import hashlib
+from array import array
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print("WARNING: numpy library not found. MinHash signatures will be computed in pure Python.")
+
+# --- MinHash Signatures & Banded LSH ---
+# A signature keeps, for each of (bands x rows) universal hash permutations,
+# the minimum permuted value over a document's shingle hashes. Two documents
+# agree on a signature slot with probability equal to their Jaccard similarity,
+# so grouping slots into bands and bucketing on each band finds near-duplicates
+# without comparing against every document. More rows per band raise precision,
+# more bands raise recall.
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+_MASK64 = (1 << 64) - 1
+
+
+def make_permutations(num_perm: int, seed: int = 1) -> Tuple[List[int], List[int]]:
+    """Deterministic (a, b) coefficients; identical with or without numpy."""
+    rng = random.Random(seed)
+    a = [rng.randrange(1, MERSENNE_PRIME) for _ in range(num_perm)]
+    b = [rng.randrange(0, MERSENNE_PRIME) for _ in range(num_perm)]
+    return a, b
+
+
+class MinHasher:
+    """Computes fixed-width uint32 MinHash signatures from 64-bit shingle hashes."""
+
+    def __init__(self, bands: int, rows: int, seed: int = 1):
+        self.bands = bands
+        self.rows = rows
+        self.seed = seed
+        self.num_perm = bands * rows
+        self._a, self._b = make_permutations(self.num_perm, seed)
+        if np is not None:
+            self._np_a = np.array(self._a, dtype=np.uint64)
+            self._np_b = np.array(self._b, dtype=np.uint64)
+
+    def signature(self, shingle_hashes: Sequence[int]) -> List[int]:
+        if not shingle_hashes:
+            return [MAX_HASH] * self.num_perm
+        if np is not None:
+            if isinstance(shingle_hashes, array):
+                hv = np.frombuffer(shingle_hashes, dtype=np.uint64) & np.uint64(MAX_HASH)
+            else:
+                hv = np.fromiter(shingle_hashes, dtype=np.uint64, count=len(shingle_hashes)) & np.uint64(MAX_HASH)
+            # Unsigned 64-bit arithmetic wraps, mirrored by the _MASK64 in the fallback below
+            permuted = (hv[:, None] * self._np_a + self._np_b) % np.uint64(MERSENNE_PRIME)
+            return (permuted & np.uint64(MAX_HASH)).min(axis=0).astype(np.uint32).tolist()
+
+        signature = []
+        values = [h & MAX_HASH for h in set(shingle_hashes)]
+        for a, b in zip(self._a, self._b):
+            signature.append(min((((v * a + b) & _MASK64) % MERSENNE_PRIME) & MAX_HASH for v in values))
+        return signature
+
+    def band_keys(self, signature: Sequence[int]) -> List[int]:
+        """One 64-bit bucket key per band, salted with the band number."""
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(
+                b"".join(v.to_bytes(4, "little") for v in chunk),
+                digest_size=8, salt=band.to_bytes(4, "little")
+            ).digest()
+            keys.append(int.from_bytes(digest, "little"))
+        return keys
+
+
+def estimate_jaccard(sig1: Sequence[int], sig2: Sequence[int]) -> float:
+    if not sig1 or len(sig1) != len(sig2):
+        return 0.0
+    return sum(1 for x, y in zip(sig1, sig2) if x == y) / len(sig1)
@@ -38,6 +38,13 @@ class RiskPredictionResult(BaseModel):
     risk_level: str
     overall_risk: int
 
+class SentenceMatch(BaseModel):
+    start: int = Field(..., ge=0, description="Character offset where the sentence starts in the submitted text.")
+    end: int = Field(..., ge=0, description="Character offset just past the end of the sentence.")
+    source_id: Optional[str] = Field(None, description="Identifier of the best matching reference document.")
+    source_title: Optional[str] = Field(None, description="Title of the matching reference document, if known.")
+    similarity: float = Field(..., ge=0, le=100, description="Percentage of the sentence's words covered by matched passages.")
+
 class PlagiarismResult(BaseModel):
     id: Optional[str] = Field(None, description="Unique identifier for the report.")
     plagiarism_score: float = Field(..., ge=0, le=100, description="Percentage of plagiarism detected.")
@@ -46,6 +53,8 @@ class PlagiarismResult(BaseModel):
     sources_found: List[Dict[str, Any]] = Field(default_factory=list, description="List of potential matching sources.")
     word_count: int = Field(..., ge=0, description="Word count of the analyzed text.")
     analysis_time: float = Field(..., ge=0, description="Time taken for analysis in seconds.")
+    stage_timings: Dict[str, float] = Field(default_factory=dict, description="Seconds spent per analysis stage (run concurrently), plus the total.")
+    partial_stages: List[str] = Field(default_factory=list, description="Stages that missed the deadline or failed and were answered by local heuristics.")
     unique_content_percentage: float = Field(..., ge=0, le=100, description="Percentage of unique content.")
     ai_flagged_segments: List[str] = Field(default_factory=list, description="List of text segments flagged as AI-generated.")
     
@@ -56,6 +65,7 @@ class PlagiarismResult(BaseModel):
     analysis_summary: Optional[str] = Field(None, description="Summary reasoning of the analysis")
     matched_patterns: Optional[List[str]] = Field(default_factory=list, description="Array of matching patterns")
     api_used: Optional[bool] = Field(None, description="Whether the external API was used")
+    sentence_matches: List[SentenceMatch] = Field(default_factory=list, description="Sentences matching the local reference corpus, with character offsets.")
 
 class HumanizeRequest(BaseModel):
     text: str = Field(..., min_length=1, description="AI-generated text to humanize.")
@@ -81,6 +91,10 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     reply: str = Field(..., description="AI chatbot's response.")
 
+class ChatStreamRequest(BaseModel):
+    message: str = Field(..., min_length=1, description="User's message to the AI chatbot.")
+    session_id: Optional[str] = Field(None, description="Conversation to continue; omit to start a new one.")
+
 class DownloadHumanizedRequest(BaseModel):
     text: str = Field(..., min_length=1, description="Humanized text content to download.")
     format: str = Field(..., pattern="^(txt|word|pdf)$", description="Desired download format (txt, word, pdf).")
@@ -0,0 +1,240 @@
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from config import config
+from cache_store import MemoryLRU
+from supabase_client import supabase
+
+# --- Async Data Access ---
+# supabase-py's client is synchronous: every .execute() and auth call is a
+# blocking HTTP round-trip. Endpoints go through the repositories below, which
+# run those calls on a bounded thread pool so the event loop keeps serving other
+# requests (and LLM streams) in the meantime. The pool size caps how many
+# Supabase calls one worker has in flight; the shared client's connection pool
+# is reused across threads.
+
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=config.SUPABASE_MAX_THREADS, thread_name_prefix="supabase")
+
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Runs a blocking Supabase call on the data-access pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DB_EXECUTOR, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_db_executor():
+    DB_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+
+def _rows(query) -> List[Dict[str, Any]]:
+    return query.execute().data or []
+
+
+def _first(query) -> Optional[Dict[str, Any]]:
+    rows = _rows(query)
+    return rows[0] if rows else None
+
+
+class TableRepository:
+    """Async access to one table; subclasses add the queries endpoints need."""
+
+    def __init__(self, table: str):
+        self.table = table
+
+    def _query(self):
+        return supabase.table(self.table)
+
+    async def insert(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Inserts a row and returns it as stored (None if nothing came back)."""
+        return await run_db(lambda: _first(self._query().insert(row)))
+
+
+class AuthRepository:
+    """Supabase Auth calls."""
+
+    async def get_user(self, token: str):
+        """The auth response for a bearer token, or None if it is invalid or Auth is unreachable."""
+        try:
+            return await run_db(supabase.auth.get_user, token)
+        except Exception as e:
+            print(f'Auth Error: {e}')
+            return None
+
+    async def sign_up(self, email: str, password: str):
+        return await run_db(supabase.auth.sign_up, {"email": email, "password": password})
+
+    async def sign_in(self, email: str, password: str):
+        return await run_db(supabase.auth.sign_in_with_password, {"email": email, "password": password})
+
+
+class ProfilesRepository(TableRepository):
+    """Profiles, read through a short-TTL per-worker cache that writes here refresh."""
+
+    def __init__(self, cache_ttl: float = 300, cache_max_entries: int = 10000):
+        super().__init__("profiles")
+        self.cache_ttl = cache_ttl
+        self._cache = MemoryLRU(cache_max_entries, cache_max_entries)
+
+    def _remember(self, user_id: str, row: Optional[Dict[str, Any]]):
+        if row and self.cache_ttl > 0:
+            self._cache.set(user_id, (dict(row), time.time() + self.cache_ttl), 1)
+        else:
+            self._cache.delete(user_id)
+
+    def invalidate(self, user_id: str):
+        self._cache.delete(user_id)
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(user_id)
+        if entry is not None and entry[1] > time.time():
+            return dict(entry[0])
+        row = await run_db(lambda: _first(self._query().select("*").eq("id", user_id)))
+        self._remember(user_id, row)
+        return row
+
+    async def get_plan(self, user_id: str, fresh: bool = False) -> str:
+        """The user's plan; fresh=True bypasses (and refreshes) the cached profile."""
+        if fresh:
+            self.invalidate(user_id)
+        row = await self.get(user_id)
+        return row.get("plan", "free") if row else "free"
+
+    async def insert(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        stored = await super().insert(row)
+        self.invalidate(row["id"])
+        return stored
+
+    async def update(self, user_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Applies values and returns the updated profile (None if there is no such user)."""
+        self.invalidate(user_id)
+        row = await run_db(lambda: _first(self._query().update(values).eq("id", user_id)))
+        # The returned row is the profile as now stored, so it replaces the cached one
+        self._remember(user_id, row)
+        return row
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+class ChecksRepository(TableRepository):
+
+    def __init__(self):
+        super().__init__("checks")
+        self._stores_sentence_matches = True
+
+    async def insert(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Inserts a check; sentence_matches is dropped if check_sentence_matches_schema.sql has not been run."""
+        if "sentence_matches" in row and self._stores_sentence_matches:
+            try:
+                return await super().insert(row)
+            except Exception as e:
+                if "sentence_matches" not in str(e):
+                    raise
+                print(f"WARNING: checks.sentence_matches missing ({e}). Run check_sentence_matches_schema.sql.")
+                self._stores_sentence_matches = False
+        row = {key: value for key, value in row.items() if key != "sentence_matches"}
+        return await super().insert(row)
+
+    async def get_with_title(self, check_id: str) -> Optional[Dict[str, Any]]:
+        """A check with its document's title and text (for the sentence matches' offsets)."""
+        return await run_db(lambda: _first(self._query().select("*, documents(title, original_text)").eq("id", check_id)))
+
+    async def list_for_user(self, user_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """A user's checks with document titles; newest first when a limit is given."""
+        def query():
+            q = self._query().select("*, documents(title)").eq("user_id", user_id)
+            if limit is not None:
+                q = q.order("created_at", desc=True).limit(limit)
+            return _rows(q)
+        return await run_db(query)
+
+    async def delete(self, user_id: str, check_id: str) -> bool:
+        """Deletes one of the user's checks; False if nothing matched."""
+        return bool(await run_db(lambda: _rows(self._query().delete().eq("user_id", user_id).eq("id", check_id))))
+
+    async def words_since(self, user_id: str, since: str) -> int:
+        rows = await run_db(lambda: _rows(self._query().select("words_count").eq("user_id", user_id).gte("created_at", since)))
+        return sum(row.get("words_count") or 0 for row in rows)
+
+
+class CheckSourcesRepository(TableRepository):
+
+    def __init__(self):
+        super().__init__("check_sources")
+
+    async def list_for_check(self, check_id: str) -> List[Dict[str, Any]]:
+        return await run_db(lambda: _rows(self._query().select("*").eq("check_id", check_id)))
+
+
+class HumanizeRequestsRepository(TableRepository):
+
+    def __init__(self):
+        super().__init__("humanize_requests")
+
+    async def words_since(self, user_id: str, since: str) -> int:
+        rows = await run_db(lambda: _rows(self._query().select("input_text").eq("user_id", user_id).gte("created_at", since)))
+        return sum(len((row.get("input_text") or "").split()) for row in rows)
+
+
+class UserSettingsRepository(TableRepository):
+
+    def __init__(self):
+        super().__init__("user_settings")
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await run_db(lambda: _first(self._query().select("*").eq("user_id", user_id)))
+
+    async def update(self, user_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Applies values and returns the updated settings (None if the user has none yet)."""
+        return await run_db(lambda: _first(self._query().update(values).eq("user_id", user_id)))
+
+
+class UsageCountersRepository(TableRepository):
+    """Per-user monthly word counters (see usage_counters_schema.sql)."""
+
+    def __init__(self):
+        super().__init__("usage_counters")
+
+    async def get(self, user_id: str, action: str, period: str) -> int:
+        row = await run_db(lambda: _first(
+            self._query().select("words").eq("user_id", user_id).eq("action", action).eq("period", period)))
+        return int(row["words"]) if row else 0
+
+    async def increment(self, user_id: str, action: str, period: str, words: int) -> int:
+        """Atomically adds words to the counter and returns its new total."""
+        params = {"p_user_id": user_id, "p_action": action, "p_period": period, "p_words": words}
+        response = await run_db(lambda: supabase.rpc("increment_usage", params).execute())
+        return int(response.data or 0)
+
+    async def try_reserve(self, user_id: str, action: str, period: str, words: int, limit: int) -> Optional[int]:
+        """Adds words only if the total stays within limit; the new total, or None if they did not fit."""
+        params = {"p_user_id": user_id, "p_action": action, "p_period": period, "p_words": words, "p_limit": limit}
+        response = await run_db(lambda: supabase.rpc("try_reserve_usage", params).execute())
+        return None if response.data is None else int(response.data)
+
+
+class DashboardStatsRepository(TableRepository):
+
+    def __init__(self):
+        super().__init__("user_dashboard_stats")
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await run_db(lambda: _first(self._query().select("*").eq("user_id", user_id)))
+
+
+auth = AuthRepository()
+profiles = ProfilesRepository(config.PROFILE_CACHE_TTL, config.PROFILE_CACHE_MAX_ENTRIES)
+documents = TableRepository("documents")
+checks = ChecksRepository()
+check_sources = CheckSourcesRepository()
+humanize_requests = HumanizeRequestsRepository()
+activity_logs = TableRepository("activity_logs")
+user_settings = UserSettingsRepository()
+usage_counters = UsageCountersRepository()
+dashboard_stats = DashboardStatsRepository()
+contact_messages = TableRepository("contact_messages")
+transactions = TableRepository("transactions")
+refunds = TableRepository("refunds")
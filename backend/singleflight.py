@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+# --- Request Coalescing (Single-Flight) ---
+# Concurrent callers asking for the same key share one in-flight task instead
+# of each starting their own (e.g. fifty identical submissions arriving before
+# the first LLM response has been cached). The key is forgotten as soon as the
+# task finishes, so later callers go back to the cache or start a new call.
+
+
+class SingleFlight:
+    """Deduplicates concurrent async calls by key within one event loop."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Awaits fn() for the first caller of key; concurrent callers with the same
+        key await the same result (or exception). The shared task is shielded, so
+        one caller being cancelled (e.g. a client disconnect) does not cancel it
+        for the others.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self.started += 1
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter was cancelled
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Backend modules are flat and import each other by name
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# supabase_client builds its client at import; no request ever reaches this URL in tests
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service-role-key")
+
+# Module-level caches and the corpus index go to a scratch directory, not the working tree
+_SCRATCH_DIR = tempfile.mkdtemp(prefix="authentiq-tests-")
+os.environ.setdefault("AI_CACHE_DB_FILE", os.path.join(_SCRATCH_DIR, "ai_cache.sqlite3"))
+os.environ.setdefault("CORPUS_INDEX_FILE", os.path.join(_SCRATCH_DIR, "corpus_index.aqix"))
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Repositories backed by an in-memory FakeSupabase, with a fresh profile cache and usage meter."""
+    import main
+    import repositories
+    import usage_meter
+    from fake_supabase import FakeSupabase
+
+    fake = FakeSupabase()
+    monkeypatch.setattr(repositories, "supabase", fake)
+    monkeypatch.setattr(repositories, "profiles", repositories.ProfilesRepository(cache_ttl=300))
+    fake.meter = usage_meter.UsageMeter(cache_ttl=60, flush_interval=60, sync_threshold=0.9)
+    monkeypatch.setattr(usage_meter, "USAGE_METER", fake.meter)
+    monkeypatch.setattr(main, "USAGE_METER", fake.meter)
+    return fake
@@ -0,0 +1,126 @@
+"""In-memory stand-in for the slice of the supabase-py client the repositories use."""
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.filters = []
+        self.action = ("select",)
+
+    def select(self, *_columns):
+        self.action = ("select",)
+        return self
+
+    def insert(self, row: Dict[str, Any]):
+        self.action = ("insert", row)
+        return self
+
+    def update(self, values: Dict[str, Any]):
+        self.action = ("update", values)
+        return self
+
+    def delete(self):
+        self.action = ("delete",)
+        return self
+
+    def eq(self, column: str, value: Any):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gte(self, column: str, value: Any):
+        self.filters.append(lambda row: str(row.get(column, "")) >= str(value))
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def limit(self, *_args):
+        return self
+
+    def execute(self):
+        self.client.calls.append((self.table, self.action[0]))
+        if self.table in self.client.fail_tables:
+            raise RuntimeError(f"relation {self.table} does not exist")
+        rows = self.client.tables.setdefault(self.table, [])
+        if self.action[0] == "insert":
+            row = dict(self.action[1])
+            row.setdefault("id", f"{self.table}-{len(rows) + 1}")
+            rows.append(row)
+            return SimpleNamespace(data=[dict(row)])
+        matched = [row for row in rows if all(f(row) for f in self.filters)]
+        if self.action[0] == "update":
+            for row in matched:
+                row.update(self.action[1])
+        elif self.action[0] == "delete":
+            self.client.tables[self.table] = [row for row in rows if row not in matched]
+        return SimpleNamespace(data=[dict(row) for row in matched])
+
+
+class FakeRpc:
+    def __init__(self, client: "FakeSupabase", name: str, params: Dict[str, Any]):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.client.calls.append(("rpc", self.name))
+        if "usage_counters" in self.client.fail_tables:
+            raise RuntimeError("function does not exist")
+        p = self.params
+        key = (p["p_user_id"], p["p_action"], p["p_period"])
+        counters = self.client.counters
+        if self.name == "increment_usage":
+            counters[key] = counters.get(key, 0) + p["p_words"]
+            return SimpleNamespace(data=counters[key])
+        if self.name == "try_reserve_usage":
+            total = counters.get(key, 0) + p["p_words"]
+            if total > p["p_limit"]:
+                return SimpleNamespace(data=None)
+            counters[key] = total
+            return SimpleNamespace(data=total)
+        raise ValueError(f"unknown rpc {self.name}")
+
+
+class FakeSupabase:
+    """Tables are lists of row dicts; usage counters live in a dict keyed like the table's primary key."""
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.counters: Dict[tuple, int] = {}
+        self.fail_tables = set()
+        self.calls = []
+
+    def table(self, name: str) -> FakeQuery:
+        if name == "usage_counters":
+            return CountersQuery(self)
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> FakeRpc:
+        return FakeRpc(self, name, params)
+
+    def counter(self, user_id: str, action: str, period: str) -> int:
+        return self.counters.get((user_id, action, period), 0)
+
+
+class CountersQuery(FakeQuery):
+    """usage_counters reads go to FakeSupabase.counters so the RPCs and selects agree."""
+
+    def __init__(self, client: FakeSupabase):
+        super().__init__(client, "usage_counters")
+        self.values = {}
+
+    def eq(self, column: str, value: Any):
+        self.values[column] = value
+        return self
+
+    def execute(self):
+        self.client.calls.append(("usage_counters", "select"))
+        if "usage_counters" in self.client.fail_tables:
+            raise RuntimeError("relation usage_counters does not exist")
+        key = (self.values["user_id"], self.values["action"], self.values["period"])
+        if key not in self.client.counters:
+            return SimpleNamespace(data=[])
+        return SimpleNamespace(data=[{"words": self.client.counters[key]}])
@@ -0,0 +1,126 @@
+import pytest
+
+from cache_store import CacheStore, MemoryLRU
+
+
+@pytest.fixture
+def store(tmp_path):
+    stores = []
+
+    def make(**kwargs):
+        cache = CacheStore(str(tmp_path / "cache.sqlite3"), "cache", **kwargs)
+        stores.append(cache)
+        return cache
+
+    yield make
+    for cache in stores:
+        cache.close()
+
+
+def column(cache, sql, *params):
+    return cache._conn.execute(sql, params).fetchone()[0]
+
+
+def accessed(cache, key):
+    return column(cache, "SELECT accessed FROM cache WHERE key = ?", key)
+
+
+def summed_sizes(cache):
+    return column(cache, "SELECT COALESCE(SUM(size), 0) FROM cache")
+
+
+def test_get_returns_stored_value_and_counts_hits(store):
+    cache = store()
+    cache.set("k", "value")
+    assert cache.get("k") == "value"
+    assert cache.get("missing") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_get_expires_entries_past_ttl(store):
+    cache = store(ttl=60)
+    cache.set("fresh", "a")
+    cache.set("stale", "b", created=1.0)
+    assert cache.get("fresh") == "a"
+    assert cache.get("stale") is None
+    assert cache.expired == 1
+    assert not cache.contains("stale")
+
+
+def test_evicts_least_recently_used_by_bytes(store):
+    cache = store(max_bytes=30, touch_interval=0)
+    for key in ("a", "b", "c"):
+        cache.set(key, "x" * 10)
+    # Make "a" the most recently used, then overflow the budget
+    cache._conn.execute("UPDATE cache SET accessed = accessed - 100 WHERE key IN ('b', 'c')")
+    cache._conn.execute("UPDATE cache SET accessed = accessed - 200 WHERE key = 'c'")
+    cache.set("d", "y" * 10)
+    assert not cache.contains("c")
+    assert all(cache.contains(key) for key in ("a", "b", "d"))
+    assert cache.evictions == 1
+    assert cache.total_bytes <= 30
+
+
+def test_totals_follow_upsert_delete_and_eviction(store):
+    cache = store(max_bytes=100)
+    cache.set("a", "x" * 10)
+    cache.set("b", "é" * 10)  # sizes are utf-8 bytes
+    assert cache.total_bytes == summed_sizes(cache) == 30
+
+    cache.set("a", "x" * 25)  # upsert replaces the size instead of adding to it
+    assert cache.total_bytes == summed_sizes(cache) == 45
+
+    cache.delete("b")
+    assert cache.total_bytes == summed_sizes(cache) == 25
+
+    cache.set_many([(f"k{i}", "z" * 30, None) for i in range(4)])
+    assert cache.evictions > 0
+    assert cache.total_bytes == summed_sizes(cache) <= 100
+
+
+def test_totals_are_shared_between_connections(store):
+    writer, reader = store(), store()
+    writer.set("a", "x" * 12)
+    assert reader.total_bytes == 12
+
+
+def test_hits_skip_recency_writes_within_touch_interval(store):
+    cache = store(touch_interval=60)
+    cache.set("k", "v")
+    cache._conn.execute("UPDATE cache SET accessed = accessed - 30")
+    before = accessed(cache, "k")
+    assert cache.get("k") == "v"
+    assert accessed(cache, "k") == before
+
+    cache._conn.execute("UPDATE cache SET accessed = accessed - 60")
+    stale = accessed(cache, "k")
+    assert cache.get("k") == "v"
+    assert accessed(cache, "k") > stale + 60
+
+
+def test_memory_lru_bounds_entries():
+    lru = MemoryLRU(max_entries=2, max_bytes=1000)
+    lru.set("a", 1, 1)
+    lru.set("b", 2, 1)
+    assert lru.get("a") == 1  # "b" is now least recently used
+    lru.set("c", 3, 1)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.evictions == 1
+
+
+def test_memory_lru_bounds_bytes():
+    lru = MemoryLRU(max_entries=100, max_bytes=10)
+    lru.set("a", "a", 4)
+    lru.set("b", "b", 4)
+    lru.set("c", "c", 4)
+    assert lru.get("a") is None
+    assert lru.total_bytes == 8
+    lru.set("b", "b", 6)  # replacing an entry re-counts its size
+    assert lru.total_bytes == 10
+    lru.set("huge", "h", 11)  # larger than the whole budget: not stored
+    assert lru.get("huge") is None
+    lru.delete("b")
+    assert lru.total_bytes == 4
+    assert lru.clear() == 1
+    assert lru.total_bytes == 0
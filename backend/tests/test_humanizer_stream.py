@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from ai_model import HumanizedTextCleaner, clean_humanized_text
+
+SAMPLES = [
+    "",
+    "   ",
+    '"Quoted reply with **bold** text."',
+    "'Single quoted' and trailing quote'",
+    "  Leading and trailing whitespace  \n",
+    "> Blockquote line\nNext line > not a quote\n> another quote",
+    "A [link text](https://example.com/path) in the middle, and [another](x).",
+    "Unclosed [bracket and (paren without link",
+    "Code `inline` and ```fenced``` blocks with __underscores__ and *stars*",
+    "# Heading\n\n## Subheading\nBody text with _emphasis_.",
+    '"[Link at start](u) then text"',
+    "Multi\n\nparagraph\r\nwith\tmixed   whitespace.",
+    "Nested [[brackets]](url) and [a](b)(c) oddities",
+    '"',
+    "''",
+    '">',
+]
+
+PIECES = ["*", "_", "`", ">", "[", "]", "(", ")", '"', "'", " ", "\n", "#", "word", "x", "link", "url", ".", "\t"]
+
+
+def random_samples(count: int, seed: int):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(PIECES) for _ in range(rng.randint(0, 30))) for _ in range(count)]
+
+
+def stream(raw: str, rng: random.Random) -> str:
+    cleaner = HumanizedTextCleaner()
+    out, i = [], 0
+    while i < len(raw):
+        step = rng.randint(1, 6)
+        out.append(cleaner.feed(raw[i:i + step]))
+        i += step
+    out.append(cleaner.finish())
+    assert "".join(out) == cleaner.text
+    return "".join(out)
+
+
+@pytest.mark.parametrize("raw", SAMPLES + random_samples(400, seed=17))
+@pytest.mark.parametrize("seed", range(5))
+def test_streamed_output_matches_clean_humanized_text(raw, seed):
+    assert stream(raw, random.Random(seed)) == clean_humanized_text(raw)
+
+
+@pytest.mark.parametrize("raw", SAMPLES)
+def test_character_by_character_stream_matches(raw):
+    cleaner = HumanizedTextCleaner()
+    out = "".join(cleaner.feed(ch) for ch in raw) + cleaner.finish()
+    assert out == clean_humanized_text(raw)
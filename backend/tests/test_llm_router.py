@@ -0,0 +1,175 @@
+import json
+import time
+import socket
+import asyncio
+import threading
+
+import httpx
+import pytest
+import uvicorn
+
+from ai_model import merge_chunk_verdicts
+from llm_router import LLMBackend, LLMRouter, BackendError
+from llm_stub_server import create_app
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class StubServer:
+    """llm_stub_server app served over real HTTP from a background thread."""
+
+    def __init__(self, **options):
+        self.app = create_app(**options)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(self.app, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, kwargs={"sockets": [self.sock]}, daemon=True)
+
+    @property
+    def requests(self) -> int:
+        return self.app.state.requests
+
+    def backend(self, name: str, kind: str = "groq", **kwargs) -> LLMBackend:
+        path = "/api/chat" if kind == "ollama" else "/openai/v1/chat/completions"
+        return LLMBackend(name, kind, f"http://127.0.0.1:{self.port}{path}", "stub", api_key="x", **kwargs)
+
+    def start(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("stub server did not start")
+            time.sleep(0.01)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**options) -> StubServer:
+        server = StubServer(**{"latency": 0.01, **options})
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def run_router(backends, coro_fn, **router_options):
+    async def main():
+        async with httpx.AsyncClient() as client:
+            router = LLMRouter(backends, lambda: client, **router_options)
+            return router, await coro_fn(router)
+    return asyncio.run(main())
+
+
+def test_fails_over_to_second_backend_on_5xx(stub):
+    broken, healthy = stub(error_rate=1.0), stub()
+    router, reply = run_router(
+        [broken.backend("broken"), healthy.backend("healthy", kind="ollama")],
+        lambda router: router.complete(MESSAGES)
+    )
+    assert reply.startswith("Stub reply")
+    assert (broken.requests, healthy.requests) == (1, 1)
+    assert router.failovers == 1
+    assert router.backends[0].failures == 1
+
+
+def test_fails_over_to_second_backend_on_timeout(stub):
+    slow, fast = stub(latency=2.0), stub()
+    started = time.monotonic()
+    router, reply = run_router(
+        [slow.backend("slow", timeout=0.3), fast.backend("fast")],
+        lambda router: router.complete(MESSAGES)
+    )
+    assert reply.startswith("Stub reply")
+    assert time.monotonic() - started < 1.5
+    assert router.failovers == 1
+    assert fast.requests == 1
+
+
+def test_stream_fails_over_before_first_token(stub):
+    broken, healthy = stub(error_rate=1.0), stub(token_delay=0.0)
+
+    async def collect(router):
+        return "".join([piece async for piece in router.stream(MESSAGES)])
+
+    router, reply = run_router([broken.backend("broken"), healthy.backend("healthy")], collect)
+    assert reply.startswith("Stub reply")
+    assert router.failovers == 1
+
+
+def test_hedges_with_runner_up_after_hedge_delay(stub):
+    slow, fast = stub(latency=1.5), stub(latency=0.05)
+    started = time.monotonic()
+    router, reply = run_router(
+        [slow.backend("slow"), fast.backend("fast")],
+        lambda router: router.complete(MESSAGES, hedge=True),
+        hedge_min_delay=0.1, hedge_max_delay=0.2
+    )
+    elapsed = time.monotonic() - started
+    assert reply.startswith("Stub reply")
+    # The runner-up starts only once the hedge delay has passed, and then wins
+    assert 0.2 <= elapsed < 1.0
+    assert (router.hedges, router.hedge_wins) == (1, 1)
+    assert (slow.requests, fast.requests) == (1, 1)
+
+
+def test_no_hedge_when_first_backend_answers_in_time(stub):
+    quick, other = stub(latency=0.01), stub()
+    router, _ = run_router(
+        [quick.backend("quick"), other.backend("other")],
+        lambda router: router.complete(MESSAGES, hedge=True),
+        hedge_min_delay=0.1, hedge_max_delay=0.5
+    )
+    assert router.hedges == 0
+    assert other.requests == 0
+
+
+def test_rate_limited_backend_is_paused_for_retry_after(stub):
+    limited, healthy = stub(rate_limit_rate=1.0, retry_after=5), stub()
+
+    async def two_calls(router):
+        first = await router.complete(MESSAGES)
+        second = await router.complete(MESSAGES)
+        return first, second
+
+    router, replies = run_router([limited.backend("limited"), healthy.backend("healthy")], two_calls)
+    assert all(reply.startswith("Stub reply") for reply in replies)
+    limited_backend = router.backends[0]
+    # The 429 paused the backend, so the second call went straight to the healthy one
+    assert limited.requests == 1
+    assert healthy.requests == 2
+    assert not limited_backend.healthy
+    assert 4.0 < limited_backend.admission.stats()["paused_for"] <= 5.0
+
+
+def test_lone_backend_retries_only_after_retry_after(stub):
+    limited = stub(rate_limit_rate=1.0, retry_after=0.4)
+    started = time.monotonic()
+    with pytest.raises(BackendError):
+        run_router([limited.backend("limited")], lambda router: router.complete(MESSAGES), max_retries=1)
+    assert limited.requests == 2
+    assert time.monotonic() - started >= 0.4
+
+
+@pytest.mark.parametrize("kind", ["groq", "ollama"])
+def test_stub_json_reply_is_a_chunk_verdict(stub, kind):
+    server = stub()
+    _, reply = run_router(
+        [server.backend("stub", kind=kind)],
+        lambda router: router.complete(MESSAGES, response_format={"type": "json_object"})
+    )
+    verdict = json.loads(reply)
+    merged = merge_chunk_verdicts([(100, verdict)])
+    assert merged["originality_level"] == "High"
+    assert merged["similarity_range"] == "0-10%"
+    assert merged["reasoning"] == "Stub verdict."
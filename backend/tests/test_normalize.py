@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from benchmark_normalize import reference_normalize_text, make_text
+from text_processing import normalize_text, iter_normalized_tokens, NormalizedDocument
+
+CASES = [
+    "",
+    "   ",
+    "Plain ASCII words, with punctuation!",
+    "Straße naïve résumé ÉCOLE coöperate",
+    "“Curly quotes” and — dashes… end.Next",
+    "中文 Ωmega 3.14 e.g. state-of-the-art",
+    "nbsp separated words",
+    "ideographic　space　here",
+    "thin and en em spaces",
+    "next\u0085line and line para sep",
+    "file\x1cgroup\x1drecord\x1eunit\x1fseparators",
+    "tabs\tnewlines\nreturns\r\nvertical\x0bform\x0cfeed",
+    "trailing separators 　 \x1f\u0085",
+    "\u0085\x1c leading separators",
+    "word\u0085\u0085word   word",
+]
+
+RANDOM_ALPHABET = list("aZé中 .,!?'\"-\t\n\r\x0b\x0c 　 \u0085 \x1c\x1d\x1e\x1fΩß…")
+
+
+def random_cases(count: int, seed: int = 11):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(RANDOM_ALPHABET) for _ in range(rng.randint(0, 40))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("text", CASES + random_cases(300))
+def test_normalize_text_matches_reference(text):
+    assert normalize_text(text) == reference_normalize_text(text)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+@pytest.mark.parametrize("text", CASES + random_cases(100, seed=12))
+def test_chunked_tokens_match_reference(text, chunk_size):
+    # Small chunks force chunk boundaries in the middle of the text
+    assert list(iter_normalized_tokens(text, chunk_size=chunk_size)) == reference_normalize_text(text).split()
+
+
+@pytest.mark.parametrize("text", CASES + random_cases(300, seed=13))
+def test_normalized_document_text_matches_reference(text):
+    assert NormalizedDocument.from_text(text).text == reference_normalize_text(text)
+
+
+def test_large_mixed_text_matches_reference():
+    text = make_text(256 * 1024)
+    expected = reference_normalize_text(text)
+    assert normalize_text(text) == expected
+    assert list(iter_normalized_tokens(text, chunk_size=4096)) == expected.split()
+    assert NormalizedDocument.from_text(text).text == expected
@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import main
+from usage_meter import current_period
+
+USER = SimpleNamespace(id="user-1", email="user@example.com")
+
+
+def set_plan(fake_db, plan: str):
+    fake_db.tables["profiles"] = [{"id": USER.id, "plan": plan}]
+
+
+def test_stale_cached_plan_is_reread_before_refusing(fake_db, monkeypatch):
+    monkeypatch.setitem(main.PLAN_LIMITS, "tiny", {"plagiarism": 100, "humanizer": 0, "bulk": 0})
+    set_plan(fake_db, "tiny")
+
+    async def scenario():
+        # Caches the old plan, then the user upgrades through another worker
+        await main.reserve_user_quota(USER, "plagiarism", check_cost=10)
+        set_plan(fake_db, "professional")
+        meta, reservation = await main.reserve_user_quota(USER, "plagiarism", check_cost=500)
+        reservation.release()
+        return meta
+
+    meta = asyncio.run(scenario())
+    assert meta["plan"] == "professional"
+    assert meta["limit"] == main.PLAN_LIMITS["professional"]["plagiarism"]
+
+
+def test_refusal_stands_when_the_plan_is_current(fake_db, monkeypatch):
+    monkeypatch.setitem(main.PLAN_LIMITS, "tiny", {"plagiarism": 100, "humanizer": 0, "bulk": 0})
+    set_plan(fake_db, "tiny")
+
+    async def scenario():
+        with pytest.raises(HTTPException) as over_limit:
+            await main.reserve_user_quota(USER, "plagiarism", check_cost=500)
+        with pytest.raises(HTTPException) as no_humanizer:
+            await main.reserve_user_quota(USER, "humanize", check_cost=1)
+        return over_limit.value, no_humanizer.value
+
+    over_limit, no_humanizer = asyncio.run(scenario())
+    assert over_limit.status_code == 402
+    assert no_humanizer.status_code == 403
+
+
+@pytest.fixture
+def signed_in(fake_db, monkeypatch):
+    async def verified(token):
+        return SimpleNamespace(user=USER)
+
+    monkeypatch.setattr(main, "get_user_safely", verified)
+    set_plan(fake_db, "professional")
+
+
+def check(text: str):
+    """POSTs a check through the ASGI app (no lifespan: the meter's flush loop stays off)."""
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.post("/api/check-plagiarism", json={"text": text, "check_ai_content": False},
+                                   headers={"Authorization": "Bearer test"})
+    return asyncio.run(post())
+
+
+def usage(fake_db) -> int:
+    return asyncio.run(fake_db.meter.used(USER.id, "plagiarism"))
+
+
+def test_failed_check_releases_its_reservation(signed_in, fake_db, monkeypatch):
+    async def broken_checks(*args, **kwargs):
+        raise RuntimeError("pipeline exploded")
+
+    monkeypatch.setattr(main, "run_content_checks", broken_checks)
+    before = usage(fake_db)
+    response = check("one two three four five")
+    assert response.status_code == 500
+    assert fake_db.meter.stats()["reserved_words"] == 0
+    assert fake_db.meter.stats()["pending_words"] == 0
+    assert usage(fake_db) == before
+
+
+def test_counters_do_not_drift_across_failures_and_successes(signed_in, fake_db, monkeypatch):
+    real_checks = main.run_content_checks
+    outcomes = iter([True, False, True, False, True])
+
+    async def flaky_checks(*args, **kwargs):
+        if not next(outcomes):
+            raise RuntimeError("upstream failure")
+        return await real_checks(*args, **kwargs)
+
+    monkeypatch.setattr(main, "run_content_checks", flaky_checks)
+    statuses = [check("alpha beta gamma delta").status_code for _ in range(5)]
+    assert statuses == [200, 500, 200, 500, 200]
+
+    # Only the three successful checks are counted, in memory and once flushed
+    assert usage(fake_db) == 3 * 4
+    assert fake_db.meter.stats()["reserved_words"] == 0
+    asyncio.run(fake_db.meter.flush())
+    assert fake_db.counter(USER.id, "plagiarism", current_period()) == 3 * 4
+    assert usage(fake_db) == 3 * 4
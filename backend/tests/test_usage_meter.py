@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import usage_meter
+from usage_meter import QuotaExceeded, current_period
+
+USER = "user-1"
+LIMIT = 100  # the fixture's meter syncs with the database past 90 words
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def reserve_calls(fake_db):
+    return fake_db.calls.count(("rpc", "try_reserve_usage"))
+
+
+def test_release_after_failure_returns_the_words(fake_db):
+    meter = fake_db.meter
+    reservation = run(meter.reserve(USER, "plagiarism", 40, LIMIT))
+    assert meter.stats()["reserved_words"] == 40
+
+    reservation.release()
+
+    assert meter.stats()["reserved_words"] == 0
+    assert run(meter.used(USER, "plagiarism")) == 0
+    # The returned words fit again
+    run(meter.reserve(USER, "plagiarism", 80, LIMIT)).commit()
+    assert run(meter.used(USER, "plagiarism")) == 80
+
+
+def test_double_release_is_a_no_op(fake_db):
+    meter = fake_db.meter
+    held = run(meter.reserve(USER, "plagiarism", 30, LIMIT))
+    other = run(meter.reserve(USER, "plagiarism", 20, LIMIT))
+
+    held.release()
+    held.release()
+
+    # The second release must not give back the other request's hold
+    assert meter.stats()["reserved_words"] == 20
+    other.commit()
+    assert meter.stats()["reserved_words"] == 0
+    assert run(meter.used(USER, "plagiarism")) == 20
+
+
+def test_release_after_commit_is_a_no_op(fake_db):
+    meter = fake_db.meter
+    reservation = run(meter.reserve(USER, "plagiarism", 30, LIMIT))
+
+    reservation.commit(25)
+    reservation.release()
+    reservation.commit()
+
+    assert meter.stats()["reserved_words"] == 0
+    assert run(meter.used(USER, "plagiarism")) == 25
+
+
+def test_reserve_stays_local_below_the_sync_threshold(fake_db):
+    meter = fake_db.meter
+    run(meter.reserve(USER, "plagiarism", 50, LIMIT)).commit()
+    reservation = run(meter.reserve(USER, "plagiarism", 40, LIMIT))
+
+    assert reserve_calls(fake_db) == 0
+    assert not reservation.stored
+    assert fake_db.counter(USER, "plagiarism", current_period()) == 0
+
+
+def test_reserve_goes_to_the_database_past_the_sync_threshold(fake_db):
+    meter = fake_db.meter
+    period = current_period()
+    fake_db.counters[(USER, "plagiarism", period)] = 50
+
+    reservation = run(meter.reserve(USER, "plagiarism", 41, LIMIT))
+
+    assert reserve_calls(fake_db) == 1
+    assert reservation.stored
+    assert fake_db.counter(USER, "plagiarism", period) == 91
+    assert meter.stats()["reserved_words"] == 0
+
+
+def test_stored_reservation_release_and_commit_adjust_the_counter(fake_db):
+    meter = fake_db.meter
+    period = current_period()
+    fake_db.counters[(USER, "plagiarism", period)] = 60
+
+    failed = run(meter.reserve(USER, "plagiarism", 35, LIMIT))
+    failed.release()
+    failed.release()
+    run(meter.flush())
+    assert fake_db.counter(USER, "plagiarism", period) == 60
+
+    done = run(meter.reserve(USER, "plagiarism", 35, LIMIT))
+    done.commit(32)
+    done.release()
+    run(meter.flush())
+    assert fake_db.counter(USER, "plagiarism", period) == 92
+    assert run(meter.used(USER, "plagiarism")) == 92
+
+
+def test_database_refusal_raises_quota_exceeded(fake_db):
+    meter = fake_db.meter
+    period = current_period()
+    fake_db.counters[(USER, "plagiarism", period)] = 95
+
+    with pytest.raises(QuotaExceeded):
+        run(meter.reserve(USER, "plagiarism", 10, LIMIT))
+
+    assert reserve_calls(fake_db) == 1
+    assert fake_db.counter(USER, "plagiarism", period) == 95
+    assert meter.stats()["reserved_words"] == 0
+
+
+def test_unwritten_local_usage_counts_against_the_database_limit(fake_db):
+    meter = fake_db.meter
+    period = current_period()
+    run(meter.reserve(USER, "plagiarism", 85, LIMIT)).commit()  # pending, not flushed
+
+    with pytest.raises(QuotaExceeded):
+        run(meter.reserve(USER, "plagiarism", 20, LIMIT))
+    assert fake_db.counter(USER, "plagiarism", period) == 0
+
+    reservation = run(meter.reserve(USER, "plagiarism", 10, LIMIT))
+    assert reservation.stored
+    assert fake_db.counter(USER, "plagiarism", period) == 10
+
+
+def test_current_period_is_the_utc_month(monkeypatch):
+    class ClockAheadOfUtc(datetime):
+        """Local time is already November while UTC is still October."""
+
+        @classmethod
+        def now(cls, tz=None):
+            if tz is None:
+                return datetime(2026, 11, 1, 1, 30)
+            return datetime(2026, 10, 31, 23, 30, tzinfo=timezone.utc).astimezone(tz)
+
+    monkeypatch.setattr(usage_meter, "datetime", ClockAheadOfUtc)
+
+    assert current_period() == "2026-10-01"
@@ -0,0 +1,297 @@
+import io
+import re
+import string
+from array import array
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from fingerprint import DEFAULT_WINNOW_WINDOW, rolling_hashes, token_hash, winnow
+
+# --- Text Extraction & Normalization ---
+# Shared by the API (ai_model.py) and the offline corpus ingestion tool
+# (ingest_corpus.py) so indexed documents and submissions are processed identically.
+
+try:
+    from docx import Document
+except ImportError:
+    Document = None
+    print("WARNING: python-docx library not found. DOCX text extraction will be disabled.")
+
+try:
+    from PyPDF2 import PdfReader
+except ImportError:
+    PdfReader = None
+    print("WARNING: PyPDF2 library not found. PDF text extraction will be disabled.")
+
+try:
+    from unidecode import unidecode
+except ImportError:
+    def unidecode(text):
+        return text.encode('ascii', 'ignore').decode('ascii')
+    print("WARNING: unidecode library not found. Using basic ASCII fallback.")
+
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# File extension -> content type understood by extract_text
+EXTENSION_CONTENT_TYPES = {
+    ".txt": "text/plain",
+    ".pdf": "application/pdf",
+    ".docx": DOCX_CONTENT_TYPE,
+}
+
+
+def extract_text(content: bytes, content_type: str) -> str:
+    """Extracts text from file bytes based on content type."""
+    extracted_text = ""
+    if content_type == "text/plain":
+        extracted_text = content.decode('utf-8', errors='ignore')
+    elif content_type == "application/pdf":
+        if PdfReader is None:
+            raise ValueError("PyPDF2 not installed")
+        try:
+            with io.BytesIO(content) as pdf_file:
+                reader = PdfReader(pdf_file)
+                for page in reader.pages:
+                    text = page.extract_text()
+                    if text:
+                        extracted_text += text + "\n"
+        except Exception as pdf_err:
+            print(f"PDF Extraction Error: {pdf_err}")
+            raise ValueError("Failed to extract text from PDF")
+    elif content_type == DOCX_CONTENT_TYPE:
+        if Document is None:
+            raise ValueError("python-docx not installed")
+        try:
+            with io.BytesIO(content) as docx_file:
+                doc = Document(docx_file)
+                for para in doc.paragraphs:
+                    extracted_text += para.text + "\n"
+        except Exception as docx_err:
+            print(f"DOCX Extraction Error: {docx_err}")
+            raise ValueError("Failed to extract text from DOCX")
+    else:
+        # Fallback for other text types or error
+        pass
+
+    return extracted_text
+
+
+# Built once instead of on every call
+_PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+_TOKEN_RE = re.compile(r'\S+')
+# Chunks are only cut at ASCII whitespace, which every normalization step preserves
+_CHUNK_BREAK_RE = re.compile(r'[ \t\n\r]')
+# Words for NormalizedDocument's tokenization, also delimited by ASCII whitespace only:
+# some Unicode spaces (e.g. U+0085) transliterate to nothing and must not split a word
+_RAW_WORD_RE = re.compile(r'[^ \t\n\r\x0b\x0c]+')
+# unidecode maps characters independently, so only non-ASCII runs need to go through it
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7f]+')
+NORMALIZE_CHUNK_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=1 << 14)
+def _transliterate_run(run: str) -> str:
+    return unidecode(run)
+
+
+def _transliterate(match) -> str:
+    # Non-ASCII runs (accented letters, typographic quotes, CJK words) repeat heavily
+    return _transliterate_run(match.group())
+
+
+def iter_normalized_tokens(text: str, chunk_size: int = NORMALIZE_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Streams the tokens of normalize_text(text) without building the normalized
+    string: the text is processed in chunks of about chunk_size characters, each
+    lowercased, transliterated (non-ASCII runs only) and stripped of punctuation
+    with a prebuilt table, then split by one regex.
+    """
+    pos, length = 0, len(text)
+    while pos < length:
+        end = pos + chunk_size
+        if end < length:
+            match = _CHUNK_BREAK_RE.search(text, end)
+            end = match.end() if match else length
+        chunk = text[pos:end].lower()
+        if not chunk.isascii():
+            chunk = _NON_ASCII_RE.sub(_transliterate, chunk)
+        chunk = chunk.translate(_PUNCTUATION_TABLE)
+        yield from _TOKEN_RE.findall(chunk)
+        pos = end
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(iter_normalized_tokens(text))
+
+
+_SENTENCE_RE = re.compile(r'[^.!?]+(?:[.!?]+|$)')
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Splits raw text into sentences, returned as (start, end) character offsets with surrounding whitespace trimmed."""
+    spans = []
+    for match in _SENTENCE_RE.finditer(text):
+        start, end = match.span()
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            spans.append((start, end))
+    return spans
+
+
+# --- Interned Normalized Documents ---
+# A request's text is tokenized exactly once into a NormalizedDocument: tokens
+# are interned into a process-wide vocabulary and stored as an array('I') of
+# ids plus the character offset of the raw word each token came from. Word
+# counts, n-gram hashes, fingerprints, term counts and chunk boundaries are all
+# derived lazily from that one representation.
+
+# Interned tokens before the shared vocabulary is replaced by a fresh one
+VOCABULARY_MAX_TOKENS = 1 << 20
+# Memoized raw word forms before the memo is cleared (casing and punctuation
+# variants make it grow much faster than the tokens themselves)
+VOCABULARY_MAX_FORMS = 1 << 18
+
+
+class Vocabulary:
+    """Token <-> integer id table with each token's stable 64-bit hash."""
+
+    __slots__ = ("ids", "tokens", "hashes", "forms")
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.tokens: List[str] = []
+        self.hashes = array("Q")
+        # Raw word -> ids of the tokens it normalizes to (usually one, possibly none)
+        self.forms: Dict[str, Tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def intern(self, token: str) -> int:
+        token_id = self.ids.get(token)
+        if token_id is None:
+            token_id = self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+            self.hashes.append(token_hash(token))
+        return token_id
+
+    def intern_word(self, word: str) -> Tuple[int, ...]:
+        """Ids of the normalized tokens of one raw whitespace-delimited word."""
+        word_ids = self.forms.get(word)
+        if word_ids is None:
+            if len(self.forms) >= VOCABULARY_MAX_FORMS:
+                # Only a memo: ids stay valid, the forms are simply normalized again
+                self.forms.clear()
+            word_ids = self.forms[word] = tuple(self.intern(token) for token in iter_normalized_tokens(word))
+        return word_ids
+
+
+_shared_vocabulary = Vocabulary()
+
+
+def shared_vocabulary() -> Vocabulary:
+    """The process-wide vocabulary; swapped for an empty one once it grows past VOCABULARY_MAX_TOKENS."""
+    global _shared_vocabulary
+    if len(_shared_vocabulary) >= VOCABULARY_MAX_TOKENS:
+        # Documents keep a reference to the vocabulary their ids belong to
+        _shared_vocabulary = Vocabulary()
+    return _shared_vocabulary
+
+
+class NormalizedDocument:
+    """Normalized tokens of one text as interned ids, with lazily derived views."""
+
+    __slots__ = ("source", "vocab", "ids", "offsets", "raw_word_count", "_text", "_ngrams", "_fingerprints", "_counts")
+
+    def __init__(self, source: str, vocab: Vocabulary, ids: array, offsets: array, raw_word_count: int):
+        self.source = source
+        self.vocab = vocab
+        self.ids = ids
+        self.offsets = offsets
+        self.raw_word_count = raw_word_count
+        self._text: Optional[str] = None
+        self._ngrams: Dict[int, array] = {}
+        self._fingerprints: Dict[Tuple[int, int], Tuple[array, array]] = {}
+        self._counts: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_text(cls, text: str, vocab: Optional[Vocabulary] = None) -> "NormalizedDocument":
+        """Tokenizes raw text; tokens match normalize_text(text).split()."""
+        vocab = vocab or shared_vocabulary()
+        ids, offsets = array("I"), array("I")
+        for match in _RAW_WORD_RE.finditer(text):
+            word_ids = vocab.intern_word(match.group())
+            if word_ids:
+                ids.extend(word_ids)
+                offsets.extend([match.start()] * len(word_ids))
+        # Billed word count: split on any whitespace (NBSP, U+3000, ...) as billing always has
+        return cls(text, vocab, ids, offsets, len(text.split()))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def word_count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def tokens(self) -> List[str]:
+        tokens = self.vocab.tokens
+        return [tokens[i] for i in self.ids]
+
+    @property
+    def text(self) -> str:
+        """The normalized text, identical to normalize_text(source)."""
+        if self._text is None:
+            self._text = " ".join(self.tokens)
+        return self._text
+
+    def token_hashes(self) -> array:
+        hashes = self.vocab.hashes
+        return array("Q", (hashes[i] for i in self.ids))
+
+    def ngram_hashes(self, n: int) -> array:
+        """Rolling hashes of every word n-gram (see fingerprint.py), cached per n."""
+        hashes = self._ngrams.get(n)
+        if hashes is None:
+            hashes = self._ngrams[n] = rolling_hashes(self.token_hashes(), n)
+        return hashes
+
+    def fingerprints(self, n: int, window: int = DEFAULT_WINNOW_WINDOW) -> Tuple[array, array]:
+        """Winnowed n-gram fingerprints as (hashes, n-gram positions), cached."""
+        key = (n, window)
+        result = self._fingerprints.get(key)
+        if result is None:
+            result = self._fingerprints[key] = winnow(self.ngram_hashes(n), window)
+        return result
+
+    def term_counts(self) -> Dict[str, int]:
+        """Term frequency vector as {token: count}."""
+        if self._counts is None:
+            tokens = self.vocab.tokens
+            self._counts = {tokens[i]: count for i, count in Counter(self.ids).items()}
+        return self._counts
+
+    def chunk_bounds(self, max_words: int) -> List[Tuple[int, int]]:
+        """Token ranges [start, end) of consecutive chunks of at most max_words tokens."""
+        return [(i, min(i + max_words, len(self.ids))) for i in range(0, len(self.ids), max_words)]
+
+    def source_span(self, start: int, end: int) -> Tuple[int, int]:
+        """Character range of the raw text covering tokens [start, end)."""
+        char_start = self.offsets[start] if start < len(self.offsets) else len(self.source)
+        char_end = self.offsets[end] if end < len(self.offsets) else len(self.source)
+        return char_start, char_end
+
+    def source_text(self, start: int, end: int) -> str:
+        """Raw text (original casing and punctuation) covering tokens [start, end)."""
+        char_start, char_end = self.source_span(start, end)
+        return self.source[char_start:char_end].strip()
+
+    def prefix(self, n_words: int) -> str:
+        """The first n_words normalized tokens joined as text."""
+        tokens = self.vocab.tokens
+        return " ".join(tokens[i] for i in self.ids[:n_words])
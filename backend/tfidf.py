@@ -0,0 +1,283 @@
+import math
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Optional, List, Dict, Any, Sequence, Mapping, Union
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+    print("WARNING: numpy/scipy libraries not found. TF-IDF scoring will fall back to pure Python.")
+
+# --- Corpus-wide TF-IDF Model ---
+# Documents are stored as rows of a CSR matrix of raw term counts over a
+# corpus-level vocabulary. IDF weights and row norms are derived from the
+# document frequencies on demand, so new documents can be appended (and new
+# terms added to the vocabulary) without rebuilding the existing rows. A query
+# is scored with one sparse matrix-vector product, either against every row or
+# only against the candidate rows retrieval already selected.
+
+
+# CSR row pointers and column indices are int32 so scipy can wrap memory-mapped
+# arrays without copying them; this caps a single index at 2**31 - 1 stored terms.
+MAX_NNZ = (1 << 31) - 1
+
+
+def smooth_idf(df, n_docs: int):
+    """Smoothed IDF: log((1 + N) / (1 + df)) + 1."""
+    if np is not None:
+        df = np.frombuffer(df, dtype=np.uint32) if len(df) else np.zeros(0, dtype=np.uint32)
+        return (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+    return [math.log((1.0 + n_docs) / (1.0 + d)) + 1.0 for d in df]
+
+
+def csr_matrix(indptr, indices, data, n_terms: int):
+    """Wraps CSR arrays (array, memoryview or mmap-backed) as a scipy matrix without copying."""
+    return sparse.csr_matrix(
+        (np.frombuffer(data, dtype=np.float32), np.frombuffer(indices, dtype=np.int32), np.frombuffer(indptr, dtype=np.int32)),
+        shape=(len(indptr) - 1, n_terms), copy=False
+    )
+
+
+def row_norms(indptr, indices, data, idf, n_terms: int):
+    """Euclidean norm of each row's TF-IDF vector (raw counts scaled by idf)."""
+    if len(indptr) <= 1:
+        return np.zeros(0, dtype=np.float32) if np is not None else []
+    if np is not None:
+        matrix = csr_matrix(indptr, indices, data, n_terms)
+        return np.sqrt(matrix.multiply(matrix) @ (idf * idf)).astype(np.float32)
+    return [
+        math.sqrt(sum((data[k] * idf[indices[k]]) ** 2 for k in range(indptr[r], indptr[r + 1])))
+        for r in range(len(indptr) - 1)
+    ]
+
+
+def float32_array(values) -> array:
+    return array("f", values.tobytes() if np is not None else values)
+
+
+class TermTable:
+    """Sorted utf-8 terms stored as one blob plus offsets; term -> id by binary search."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+    def find(self, term: bytes) -> int:
+        i = bisect_left(self, term)
+        if i < len(self) and self[i] == term:
+            return i
+        return -1
+
+
+class TfidfModel:
+    """TF-IDF vectors for a corpus, backed by a (possibly memory-mapped) CSR matrix."""
+
+    def __init__(self, sections: Optional[Dict[str, Any]] = None):
+        self._idf = None
+        self._norms = None
+        self._matrices = None
+        if sections:
+            self.base_terms = TermTable(sections["vocab"], sections["vocab_of"])
+            self.base_df = sections["df"]
+            self.indptr = sections["tf_ptr"]
+            self.indices = sections["tf_idx"]
+            self.data = sections["tf_val"]
+            # Precomputed at build time so workers never materialize per-corpus arrays
+            if "idf" in sections and "norms" in sections:
+                self._idf = np.frombuffer(sections["idf"], dtype=np.float32) if np is not None else sections["idf"]
+                self._norms = np.frombuffer(sections["norms"], dtype=np.float32) if np is not None else sections["norms"]
+        else:
+            self.base_terms = TermTable(b"", array("Q", [0]))
+            self.base_df = array("I")
+            self.indptr, self.indices, self.data = array("i", [0]), array("i"), array("f")
+
+        # Incremental additions live beside the base arrays until the next save
+        self.new_terms: Dict[str, int] = {}
+        self.new_term_list: List[str] = []
+        self.df = self.base_df
+        self.pending_ptr, self.pending_idx, self.pending_val = array("i", [0]), array("i"), array("f")
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.base_terms) + len(self.new_term_list)
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.indptr) - 1 + len(self.pending_ptr) - 1
+
+    def term_id(self, term: str) -> int:
+        term_id = self.new_terms.get(term)
+        if term_id is not None:
+            return term_id
+        return self.base_terms.find(term.encode("utf-8"))
+
+    def add_document(self, tokens: Sequence[str]) -> int:
+        """Appends one document (as normalized tokens) without touching existing rows."""
+        if not isinstance(self.df, array):
+            self.df = array("I", self.df)  # copy-on-write of a memory-mapped base
+        counts = Counter(tokens)
+        row = []
+        for term, count in counts.items():
+            term_id = self.term_id(term)
+            if term_id < 0:
+                term_id = self.n_terms
+                self.new_terms[term] = term_id
+                self.new_term_list.append(term)
+                self.df.append(0)
+            self.df[term_id] += 1
+            row.append((term_id, count))
+        row.sort()
+        for term_id, count in row:
+            self.pending_idx.append(term_id)
+            self.pending_val.append(count)
+        self.pending_ptr.append(len(self.pending_idx))
+
+        self._idf = self._norms = self._matrices = None
+        return self.n_docs - 1
+
+    def _csr_parts(self):
+        return ((self.indptr, self.indices, self.data), (self.pending_ptr, self.pending_idx, self.pending_val))
+
+    def idf(self):
+        if self._idf is None:
+            self._idf = smooth_idf(self.df, self.n_docs)
+        return self._idf
+
+    def norms(self):
+        """Euclidean norm of every row's TF-IDF vector, in document order."""
+        if self._norms is None:
+            idf = self.idf()
+            parts = [row_norms(indptr, indices, data, idf, self.n_terms) for indptr, indices, data in self._csr_parts()]
+            self._norms = np.concatenate(parts) if np is not None else parts[0] + parts[1]
+        return self._norms
+
+    def _csr_segments(self):
+        if self._matrices is None:
+            self._matrices = [
+                csr_matrix(indptr, indices, data, self.n_terms)
+                for indptr, indices, data in self._csr_parts() if len(indptr) > 1
+            ]
+        return self._matrices
+
+    def _iter_rows(self, rows: Optional[Sequence[int]] = None):
+        base_docs = len(self.indptr) - 1
+        if rows is None:
+            rows = range(self.n_docs)
+        for doc_id in rows:
+            indptr, indices, data = self._csr_parts()[0 if doc_id < base_docs else 1]
+            r = doc_id if doc_id < base_docs else doc_id - base_docs
+            yield [(indices[k], data[k]) for k in range(indptr[r], indptr[r + 1])]
+
+    def _row_dots(self, vector, rows: Optional[Sequence[int]]):
+        if rows is None:
+            return np.concatenate([m @ vector for m in self._csr_segments()])
+        # Only the selected rows are sliced out of each segment and multiplied
+        rows = np.asarray(rows, dtype=np.int64)
+        dots = np.zeros(len(rows), dtype=np.float32)
+        offset = 0
+        for m in self._csr_segments():
+            mask = (rows >= offset) & (rows < offset + m.shape[0])
+            if mask.any():
+                dots[mask] = m[rows[mask] - offset] @ vector
+            offset += m.shape[0]
+        return dots
+
+    def cosine_scores(self, tokens: Union[Sequence[str], Mapping[str, int]], rows: Optional[Sequence[int]] = None):
+        """
+        TF-IDF cosine similarity of the query (tokens, or precomputed {term: count})
+        against every document in document order, or only against the given rows
+        (document ids) in the order given.
+        """
+        n_scores = self.n_docs if rows is None else len(rows)
+        if not tokens or not n_scores:
+            return np.zeros(n_scores, dtype=np.float32) if np is not None else [0.0] * n_scores
+
+        idf = self.idf()
+        unseen_idf = math.log(1.0 + self.n_docs) + 1.0
+        query = {}
+        q_norm_sq = 0.0
+        counts = tokens if isinstance(tokens, Mapping) else Counter(tokens)
+        for term, count in counts.items():
+            term_id = self.term_id(term)
+            if term_id < 0:
+                q_norm_sq += (count * unseen_idf) ** 2
+                continue
+            weight = count * float(idf[term_id])
+            query[term_id] = weight
+            q_norm_sq += weight * weight
+        if not query or not q_norm_sq:
+            return np.zeros(n_scores, dtype=np.float32) if np is not None else [0.0] * n_scores
+        q_norm = math.sqrt(q_norm_sq)
+        norms = self.norms()
+        if rows is not None:
+            norms = norms[np.asarray(rows, dtype=np.int64)] if np is not None else [norms[r] for r in rows]
+
+        if np is not None:
+            # Fold the document-side IDF into the query so the matrix can stay raw counts
+            vector = np.zeros(self.n_terms, dtype=np.float32)
+            ids = np.fromiter(query.keys(), dtype=np.int64, count=len(query))
+            vector[ids] = np.fromiter(query.values(), dtype=np.float32, count=len(query)) * idf[ids]
+            dots = self._row_dots(vector, rows)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = np.where(norms > 0, dots / (norms * q_norm), 0.0)
+            return scores
+
+        scores = []
+        for row, norm in zip(self._iter_rows(rows), norms):
+            dot = sum(val * idf[idx] * query[idx] for idx, val in row if idx in query)
+            scores.append(dot / (norm * q_norm) if norm else 0.0)
+        return scores
+
+    def max_cosine(self, tokens: Union[Sequence[str], Mapping[str, int]], rows: Optional[Sequence[int]] = None) -> float:
+        """Highest cosine_scores value (0.0 when there is nothing to score)."""
+        scores = self.cosine_scores(tokens, rows)
+        if not len(scores):
+            return 0.0
+        return float(scores.max()) if np is not None else max(scores)
+
+    def to_sections(self) -> Dict[str, Any]:
+        """Consolidates base and pending rows into sorted-vocabulary CSR sections."""
+        all_terms = [self.base_terms[i] for i in range(len(self.base_terms))] + [t.encode("utf-8") for t in self.new_term_list]
+        order = sorted(range(len(all_terms)), key=all_terms.__getitem__)
+        remap = array("i", [0]) * len(order)
+        for new_id, old_id in enumerate(order):
+            remap[old_id] = new_id
+
+        vocab_of = array("Q", [0])
+        for old_id in order:
+            vocab_of.append(vocab_of[-1] + len(all_terms[old_id]))
+        df = array("I", (self.df[old_id] for old_id in order))
+
+        base_nnz = self.indptr[-1]
+        if base_nnz + len(self.pending_idx) > MAX_NNZ:
+            raise ValueError("TF-IDF matrix exceeds the int32 CSR capacity of a single index.")
+        indptr = array("i", self.indptr)
+        indptr.extend(base_nnz + p for p in self.pending_ptr[1:])
+        # Rows keep their column order up to the remap; CSR mat-vec does not require sorted columns
+        indices, data = array("i"), array("f")
+        for source_idx, source_val in ((self.indices, self.data), (self.pending_idx, self.pending_val)):
+            indices.extend(remap[i] for i in source_idx)
+            data.extend(source_val)
+
+        idf = smooth_idf(df, len(indptr) - 1)
+        norms = row_norms(indptr, indices, data, idf, len(order))
+        return {
+            "vocab": b"".join(all_terms[old_id] for old_id in order),
+            "vocab_of": vocab_of,
+            "df": df,
+            "tf_ptr": indptr,
+            "tf_idx": indices,
+            "tf_val": data,
+            "idf": float32_array(idf),
+            "norms": float32_array(norms),
+        }
@@ -0,0 +1,177 @@
+import time
+import asyncio
+import hashlib
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from config import config
+from cache_store import MemoryLRU
+import repositories as db
+
+try:
+    from jose import jwt, JWTError
+except ImportError:
+    jwt = None
+    JWTError = Exception
+    print("WARNING: python-jose library not found. Access tokens will be checked with Supabase Auth instead.")
+
+# --- Local Token Verification ---
+# Supabase access tokens are JWTs signed by the project, so they can be checked
+# here instead of with an Auth round-trip per request: HS256 tokens against the
+# project's JWT secret, RS256/ES256 tokens against its published JWKS (re-read
+# when an unknown key id shows up after a key rotation). Without a usable key
+# the token is checked with Supabase Auth as before. Either way the outcome is
+# cached for a short TTL, never past the token's own expiry. A locally verified
+# token stays valid until it expires even if the session is signed out
+# elsewhere; keep AUTH_TOKEN_CACHE_TTL and the project's JWT expiry short if
+# that matters.
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
+
+class TokenUser:
+    """The fields of Supabase's User that endpoints read, taken from verified claims."""
+
+    __slots__ = ("id", "email", "role", "claims")
+
+    def __init__(self, claims: Dict[str, Any]):
+        self.id = claims["sub"]
+        self.email = claims.get("email")
+        self.role = claims.get("role")
+        self.claims = claims
+
+
+class VerifiedToken:
+    """Same shape as supabase.auth.get_user()'s response: the user is under .user."""
+
+    __slots__ = ("user",)
+
+    def __init__(self, user: Any):
+        self.user = user
+
+
+class TokenVerifier:
+    """Verifies bearer tokens locally where possible and caches the results per worker."""
+
+    def __init__(self, secret: str = "", jwks_url: str = "", audience: str = "authenticated",
+                 cache_ttl: float = 60, cache_max_entries: int = 10000, jwks_ttl: float = 600):
+        self.secret = secret
+        self.jwks_url = jwks_url
+        self.audience = audience
+        self.cache_ttl = cache_ttl
+        self.jwks_ttl = jwks_ttl
+        self._cache = MemoryLRU(cache_max_entries, cache_max_entries)
+        self._jwks: Dict[str, Dict[str, Any]] = {}
+        self._jwks_fetched = 0.0
+        self._jwks_lock: Optional[asyncio.Lock] = None
+        self.verified_locally = 0
+        self.verified_remotely = 0
+        self.rejected = 0
+
+    async def verify(self, token: str) -> Optional[VerifiedToken]:
+        """The verified token (user under .user), or None if it is invalid or expired."""
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        now = time.time()
+        entry = self._cache.get(key)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        result, expires_at = await self._verify_uncached(token)
+        if result is None:
+            self.rejected += 1
+            self._cache.delete(key)
+            return None
+        if self.cache_ttl > 0:
+            self._cache.set(key, (result, min(now + self.cache_ttl, expires_at)), 1)
+        return result
+
+    def forget(self, token: str):
+        self._cache.delete(hashlib.sha256(token.encode("utf-8")).hexdigest())
+
+    async def _verify_uncached(self, token: str) -> Tuple[Optional[Any], float]:
+        claims = None
+        if jwt is not None:
+            try:
+                header = jwt.get_unverified_header(token)
+                claims = jwt.get_unverified_claims(token)
+            except JWTError as e:
+                print(f'Auth Error: {e}')
+                return None, 0.0
+            signing_key = await self._signing_key(header)
+            if signing_key is not None:
+                try:
+                    # Project keys such as anon and service_role are signed too but carry no
+                    # user: only user sessions (with sub and aud) count as signed in
+                    claims = jwt.decode(token, signing_key, algorithms=[header["alg"]], audience=self.audience,
+                                        options={"require_aud": True, "require_sub": True})
+                    user = TokenUser(claims)
+                except (JWTError, KeyError) as e:
+                    print(f'Auth Error: {e}')
+                    return None, 0.0
+                self.verified_locally += 1
+                return VerifiedToken(user), float(claims.get("exp") or time.time() + self.cache_ttl)
+
+        # No usable key: let Supabase Auth decide, as before
+        response = await db.auth.get_user(token)
+        if not response or not response.user:
+            return None, 0.0
+        self.verified_remotely += 1
+        expires_at = (claims or {}).get("exp")
+        return response, float(expires_at) if isinstance(expires_at, (int, float)) else time.time() + self.cache_ttl
+
+    async def _signing_key(self, header: Dict[str, Any]) -> Optional[Any]:
+        """Key for the token's algorithm; None when it cannot be verified locally."""
+        alg = header.get("alg")
+        if alg == "HS256":
+            return self.secret or None
+        if alg not in ASYMMETRIC_ALGORITHMS or not self.jwks_url:
+            return None
+        kid = header.get("kid")
+        if time.time() - self._jwks_fetched > self.jwks_ttl:
+            await self._load_jwks()
+        key = self._jwks.get(kid)
+        # An unknown key id usually means the keys were rotated; re-read them at most once a minute
+        if key is None and time.time() - self._jwks_fetched > 60:
+            await self._load_jwks()
+            key = self._jwks.get(kid)
+        if key is not None and key.get("alg", alg) != alg:
+            return None
+        return key
+
+    async def _load_jwks(self):
+        if self._jwks_lock is None:
+            self._jwks_lock = asyncio.Lock()
+        fetched = self._jwks_fetched
+        async with self._jwks_lock:
+            if self._jwks_fetched != fetched:
+                return  # another request refreshed the keys while this one waited
+            try:
+                async with httpx.AsyncClient(timeout=5.0) as client:
+                    response = await client.get(self.jwks_url, headers={"apikey": config.SUPABASE_SERVICE_ROLE_KEY})
+                    response.raise_for_status()
+                keys = response.json().get("keys", [])
+                self._jwks = {key.get("kid"): key for key in keys if key.get("alg") in ASYMMETRIC_ALGORITHMS}
+            except Exception as e:
+                # Keep the previous keys; tokens without a known key go to Supabase Auth
+                print(f"WARNING: Could not load Supabase JWKS from {self.jwks_url}: {e}")
+            self._jwks_fetched = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self._cache.stats(),
+            "verified_locally": self.verified_locally,
+            "verified_remotely": self.verified_remotely,
+            "rejected": self.rejected,
+            "jwks_keys": len(self._jwks),
+        }
+
+
+TOKEN_VERIFIER = TokenVerifier(
+    secret=config.SUPABASE_JWT_SECRET,
+    jwks_url=config.SUPABASE_JWKS_URL,
+    audience=config.SUPABASE_JWT_AUDIENCE,
+    cache_ttl=config.AUTH_TOKEN_CACHE_TTL,
+    cache_max_entries=config.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+    jwks_ttl=config.SUPABASE_JWKS_TTL
+)
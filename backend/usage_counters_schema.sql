@@ -0,0 +1,75 @@
+-- Run this in your Supabase SQL Editor to create the monthly usage counters
+-- read by check_user_limits (one row per user, month and action)
+
+CREATE TABLE IF NOT EXISTS public.usage_counters (
+    user_id UUID NOT NULL,
+    period DATE NOT NULL,          -- first day of the month
+    action TEXT NOT NULL,          -- 'plagiarism' or 'humanize'
+    words BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL,
+    PRIMARY KEY (user_id, period, action)
+);
+
+ALTER TABLE public.usage_counters ENABLE ROW LEVEL SECURITY;
+
+-- Users may read their own counters; only the backend (service role) writes them
+CREATE POLICY "Users can read their own usage counters"
+ON public.usage_counters
+FOR SELECT
+USING (auth.uid() = user_id);
+
+-- Atomic increment: concurrent calls from several workers never lose an update
+CREATE OR REPLACE FUNCTION public.increment_usage(p_user_id UUID, p_action TEXT, p_period DATE, p_words BIGINT)
+RETURNS BIGINT
+LANGUAGE sql
+AS $$
+    INSERT INTO public.usage_counters AS c (user_id, period, action, words)
+    VALUES (p_user_id, p_period, p_action, p_words)
+    ON CONFLICT (user_id, period, action)
+    DO UPDATE SET words = c.words + EXCLUDED.words, updated_at = timezone('utc'::text, now())
+    RETURNING c.words;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.increment_usage(UUID, TEXT, DATE, BIGINT) FROM PUBLIC, anon, authenticated;
+
+-- Conditional increment used for quota reservations near the limit: adds the
+-- words only if the total stays within p_limit (the row lock serializes
+-- concurrent callers) and returns the new total, or NULL if they do not fit
+CREATE OR REPLACE FUNCTION public.try_reserve_usage(p_user_id UUID, p_action TEXT, p_period DATE, p_words BIGINT, p_limit BIGINT)
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    new_total BIGINT;
+BEGIN
+    INSERT INTO public.usage_counters (user_id, period, action, words)
+    VALUES (p_user_id, p_period, p_action, 0)
+    ON CONFLICT (user_id, period, action) DO NOTHING;
+
+    UPDATE public.usage_counters
+    SET words = words + p_words, updated_at = timezone('utc'::text, now())
+    WHERE user_id = p_user_id AND period = p_period AND action = p_action AND words + p_words <= p_limit
+    RETURNING words INTO new_total;
+
+    RETURN new_total;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.try_reserve_usage(UUID, TEXT, DATE, BIGINT, BIGINT) FROM PUBLIC, anon, authenticated;
+
+-- One-off backfill of the current month from the existing rows (safe to re-run).
+-- Months are UTC, matching the period keys the backend writes
+INSERT INTO public.usage_counters (user_id, period, action, words)
+SELECT user_id, date_trunc('month', now() AT TIME ZONE 'utc')::date, 'plagiarism', COALESCE(SUM(words_count), 0)
+FROM public.checks
+WHERE user_id IS NOT NULL AND created_at >= date_trunc('month', now() AT TIME ZONE 'utc') AT TIME ZONE 'utc'
+GROUP BY user_id
+ON CONFLICT (user_id, period, action) DO UPDATE SET words = EXCLUDED.words;
+
+INSERT INTO public.usage_counters (user_id, period, action, words)
+SELECT user_id, date_trunc('month', now() AT TIME ZONE 'utc')::date, 'humanize',
+       COALESCE(SUM(COALESCE(array_length(regexp_split_to_array(btrim(input_text), '\s+'), 1), 0)), 0)
+FROM public.humanize_requests
+WHERE user_id IS NOT NULL AND created_at >= date_trunc('month', now() AT TIME ZONE 'utc') AT TIME ZONE 'utc' AND btrim(COALESCE(input_text, '')) <> ''
+GROUP BY user_id
+ON CONFLICT (user_id, period, action) DO UPDATE SET words = EXCLUDED.words;
@@ -0,0 +1,267 @@
+import time
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from config import config
+from singleflight import SingleFlight
+import repositories as db
+
+# --- Monthly Usage Counters ---
+# Quota checks read one counter row per (user, month, action) instead of
+# summing every check or humanizer request of the month. Writes are
+# write-behind: recorded words count immediately in this worker's view and
+# are pushed to the atomic increment_usage RPC in batches every few seconds
+# (and on shutdown). Cached totals are re-read after a short TTL so usage
+# from other workers shows up. If the counter table is not deployed yet, reads
+# fall back to the old full-month scan.
+#
+# Endpoints reserve a request's words before doing the work, then commit them
+# (counted) on success or release them on failure. Well within the limit the
+# hold is taken in this worker's memory: checking and holding happen without
+# yielding to the event loop, so concurrent requests cannot both pass on the
+# same remaining words. Near the limit, where usage from other workers matters,
+# the hold is taken in the database with the conditional try_reserve_usage RPC.
+
+Key = Tuple[str, str, str]  # (user_id, action, period)
+
+# Tables the legacy scan reads per action
+LEGACY_USAGE = {"plagiarism": db.checks, "humanize": db.humanize_requests}
+
+
+class QuotaExceeded(Exception):
+    """Raised by reserve when the words do not fit in the remaining quota."""
+
+    def __init__(self, used: int, limit: int):
+        super().__init__(f"{used} of {limit} words used")
+        self.used = used
+        self.limit = limit
+
+
+class Reservation:
+    """Words held against a user's quota until committed (counted) or released (returned)."""
+
+    __slots__ = ("meter", "key", "words", "used", "stored", "settled")
+
+    def __init__(self, meter: Optional["UsageMeter"], key: Optional["Key"], words: int, used: int, stored: bool = False):
+        self.meter = meter
+        self.key = key
+        self.words = words
+        self.used = used  # usage, including other open reservations, when this one was made
+        self.stored = stored  # already added to the database counter
+        self.settled = meter is None
+
+    def commit(self, words: Optional[int] = None):
+        """Counts the reserved words (or the given actual amount); later calls are no-ops."""
+        if self.settled:
+            return
+        self.settled = True
+        words = self.words if words is None else words
+        if self.stored:
+            self.meter._record(self.key, words - self.words)
+        else:
+            self.meter._unreserve(self.key, self.words)
+            self.meter._record(self.key, words)
+
+    def release(self):
+        """Returns the words to the quota unless already committed; safe to call in finally."""
+        if self.settled:
+            return
+        self.settled = True
+        if self.stored:
+            self.meter._record(self.key, -self.words)
+        else:
+            self.meter._unreserve(self.key, self.words)
+
+
+# Stands in for anonymous users, who have no quota
+NO_RESERVATION = Reservation(None, None, 0, 0)
+
+
+def current_period() -> str:
+    """First day of the current month in UTC, the counters' period key (the database's months are UTC too)."""
+    return datetime.now(timezone.utc).date().replace(day=1).isoformat()
+
+
+class UsageMeter:
+    """Per-worker view of monthly usage counters with batched, atomic write-behind."""
+
+    def __init__(self, cache_ttl: float = 30, flush_interval: float = 2, sync_threshold: float = 0.9):
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self.sync_threshold = sync_threshold
+        self._totals: Dict[Key, Tuple[int, float]] = {}  # last stored total and when it was read
+        self._pending: Dict[Key, int] = {}
+        self._flushing: Dict[Key, int] = {}
+        self._reserved: Dict[Key, int] = {}
+        self._reads = SingleFlight()
+        self._task: Optional[asyncio.Task] = None
+        self._counters_available = True
+        self._probed_at = 0.0
+        self.flushes = 0
+        self.flush_failures = 0
+
+    async def _refresh(self, key: Key, max_age: float) -> Optional[int]:
+        """
+        Re-reads the stored total if it is older than max_age. Returns the legacy
+        scan total when there is no counters table, otherwise None (the total is
+        then in _totals).
+        """
+        cached = self._totals.get(key)
+        if cached is not None and (time.monotonic() - cached[1] <= max_age or key in self._flushing):
+            return None
+        read_started = time.monotonic()
+        stored = await self._read(key)
+        if stored is None:
+            # No counters table: the legacy scan already includes every stored row
+            user_id, action, period = key
+            return await LEGACY_USAGE[action].words_since(user_id, period)
+        cached = self._totals.get(key)
+        # A flush that finished while this read was in flight has the newer total
+        if cached is None or cached[1] < read_started:
+            self._totals[key] = (stored, time.monotonic())
+        return None
+
+    def _current(self, key: Key, legacy_total: Optional[int]) -> int:
+        base = legacy_total if legacy_total is not None else self._totals.get(key, (0, 0.0))[0]
+        return base + self._pending.get(key, 0) + self._flushing.get(key, 0)
+
+    async def used(self, user_id: str, action: str) -> int:
+        """Words used this month, including increments not yet written."""
+        key = (user_id, action, current_period())
+        return self._current(key, await self._refresh(key, self.cache_ttl))
+
+    async def reserve(self, user_id: str, action: str, words: int, limit: int) -> Reservation:
+        """Holds words against the monthly limit; raises QuotaExceeded if they do not fit."""
+        key = (user_id, action, current_period())
+        legacy_total = await self._refresh(key, self.cache_ttl)
+        used = self._current(key, legacy_total) + self._reserved.get(key, 0)
+        if used + words > limit * self.sync_threshold and legacy_total is None:
+            stored = await self._reserve_stored(key, words, limit)
+            if stored is not None:
+                return stored
+            used = self._current(key, None) + self._reserved.get(key, 0)
+        return self._reserve_local(key, words, limit, used)
+
+    def _reserve_local(self, key: Key, words: int, limit: int, used: int) -> Reservation:
+        # No await in here: the check and the hold are atomic within this worker
+        if used + words > limit:
+            raise QuotaExceeded(used, limit)
+        self._reserved[key] = self._reserved.get(key, 0) + words
+        return Reservation(self, key, words, used)
+
+    async def _reserve_stored(self, key: Key, words: int, limit: int) -> Optional[Reservation]:
+        """Takes the hold in the database; None if that is unavailable (decide locally)."""
+        user_id, action, period = key
+        # Words this worker has counted but not written yet still come off the limit
+        unwritten = self._pending.get(key, 0) + self._flushing.get(key, 0) + self._reserved.get(key, 0)
+        try:
+            total = await db.usage_counters.try_reserve(user_id, action, period, words, limit - unwritten)
+        except Exception as e:
+            print(f"WARNING: Could not reserve usage in the database ({e}). Deciding locally.")
+            return None
+        if total is None:
+            self._totals.pop(key, None)  # re-read next time; the stored total is evidently higher
+            raise QuotaExceeded(limit, limit)
+        self._totals[key] = (total, time.monotonic())
+        return Reservation(self, key, words, total - words + unwritten, stored=True)
+
+    def _unreserve(self, key: Key, words: int):
+        remaining = self._reserved.get(key, 0) - words
+        if remaining > 0:
+            self._reserved[key] = remaining
+        else:
+            self._reserved.pop(key, None)
+
+    def _record(self, key: Key, words: int):
+        """Counts words; they are written to the database on the next flush."""
+        if not words or not self._counters_available:
+            return  # without the counters table the monthly scan sees the new row anyway
+        self._pending[key] = self._pending.get(key, 0) + words
+
+    async def _read(self, key: Key) -> Optional[int]:
+        user_id, action, period = key
+        # While the table is missing, probe for it once a minute rather than on every read
+        if not self._counters_available and time.monotonic() - self._probed_at < 60:
+            return None
+        self._probed_at = time.monotonic()
+        try:
+            # Concurrent misses for the same counter share one read
+            total = await self._reads.do("|".join(key), lambda: db.usage_counters.get(user_id, action, period))
+        except Exception as e:
+            if self._counters_available:
+                print(f"WARNING: Usage counters unavailable ({e}). Falling back to monthly scans; run usage_counters_schema.sql.")
+                self._counters_available = False
+            return None
+        self._counters_available = True
+        return total
+
+    async def flush(self):
+        """Pushes pending increments; failed ones stay pending for the next flush."""
+        if not self._pending:
+            return
+        batch = {key: words for key, words in self._pending.items() if words}
+        self._pending = {}
+        if not batch:
+            return
+        self._flushing.update(batch)
+
+        async def push(key: Key, words: int):
+            user_id, action, period = key
+            try:
+                total = await db.usage_counters.increment(user_id, action, period, words)
+                self._totals[key] = (total, time.monotonic())
+            except Exception as e:
+                self.flush_failures += 1
+                print(f"Error flushing usage counter for {user_id}/{action}: {e}")
+                self._pending[key] = self._pending.get(key, 0) + words
+            finally:
+                self._flushing.pop(key, None)
+
+        await asyncio.gather(*(push(key, words) for key, words in batch.items()))
+        self.flushes += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                self._prune()
+            except Exception as e:
+                print(f"Error in usage flush loop: {e}")
+
+    def _prune(self):
+        """Forgets totals that are due for a re-read anyway, so the map stays bounded by active users."""
+        cutoff = time.monotonic() - self.cache_ttl
+        for key in [key for key, (_, read_at) in self._totals.items() if read_at < cutoff]:
+            if key not in self._pending and key not in self._flushing and key not in self._reserved:
+                del self._totals[key]
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stops the flush loop and writes whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached_counters": len(self._totals),
+            "pending_counters": len(self._pending),
+            "pending_words": sum(self._pending.values()),
+            "reserved_words": sum(self._reserved.values()),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "counters_available": self._counters_available,
+        }
+
+
+USAGE_METER = UsageMeter(config.USAGE_CACHE_TTL, config.USAGE_FLUSH_INTERVAL, config.USAGE_SYNC_THRESHOLD)